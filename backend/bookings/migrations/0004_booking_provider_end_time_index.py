@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-17 04:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_list_ordering_indexes'),
+        ('services', '0006_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['provider', 'end_time'], name='bookings_bo_provide_bfc73d_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 6.0 on 2026-10-17 04:31
+
+from datetime import datetime, timedelta, timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+OVERLAP_CONSTRAINT = 'bookings_booking_no_provider_overlap'
+BLOCKING_STATUSES = ['pending', 'confirmed']
+# Copied from bookings.models as of this migration; the buckets must not move under it
+SLOT_MINUTES = 5
+SLOT_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def slot_starts(start_time, end_time):
+    step = timedelta(minutes=SLOT_MINUTES)
+    slot_start = start_time - (start_time - SLOT_EPOCH) % step
+    starts = []
+    while slot_start < end_time:
+        starts.append(slot_start)
+        slot_start += step
+    return starts
+
+
+def check_no_overlaps(Booking):
+    # The exclusion constraint can't be added while overlapping bookings exist
+    earlier = Booking.objects.filter(
+        status__in=BLOCKING_STATUSES, provider_id=models.OuterRef('provider_id'), pk__lt=models.OuterRef('pk'),
+        start_time__lt=models.OuterRef('end_time'), end_time__gt=models.OuterRef('start_time'),
+    )
+    conflicts = list(
+        Booking.objects.filter(status__in=BLOCKING_STATUSES).filter(models.Exists(earlier))
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    if conflicts:
+        listed = ', '.join(str(pk) for pk in conflicts[:50])
+        more = f' and {len(conflicts) - 50} more' if len(conflicts) > 50 else ''
+        raise RuntimeError(
+            f'{len(conflicts)} pending or confirmed bookings overlap an earlier booking of the same provider: '
+            f'{listed}{more}. Cancel or reschedule them, then run the migration again.'
+        )
+
+
+def protect_overlaps(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    if schema_editor.connection.vendor == 'postgresql':
+        check_no_overlaps(Booking)
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        schema_editor.execute(
+            f"ALTER TABLE bookings_booking ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+            f"EXCLUDE USING gist (provider_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&) "
+            f"WHERE (status IN ('pending', 'confirmed'))"
+        )
+        return
+
+    # Claim the buckets of existing active bookings; pre-existing overlaps keep
+    # whichever booking claimed a bucket first
+    BookingSlot = apps.get_model('bookings', 'BookingSlot')
+    bookings = Booking.objects.filter(status__in=BLOCKING_STATUSES).values_list(
+        'id', 'provider_id', 'start_time', 'end_time'
+    )
+    slots = []
+    for booking_id, provider_id, start_time, end_time in bookings.iterator():
+        for slot_start in slot_starts(start_time, end_time):
+            slots.append(BookingSlot(booking_id=booking_id, provider_id=provider_id, slot_start=slot_start))
+        if len(slots) >= 5000:
+            BookingSlot.objects.bulk_create(slots, ignore_conflicts=True)
+            slots = []
+    BookingSlot.objects.bulk_create(slots, ignore_conflicts=True)
+
+
+def unprotect_overlaps(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'ALTER TABLE bookings_booking DROP CONSTRAINT IF EXISTS {OVERLAP_CONSTRAINT}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_provider_end_time_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_start', models.DateTimeField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='bookings.booking')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'slot_start'), name='bookings_slot_unique_provider_start')],
+            },
+        ),
+        migrations.RunPython(protect_overlaps, unprotect_overlaps),
+    ]
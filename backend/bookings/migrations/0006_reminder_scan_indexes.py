@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_booking_overlap_protection'),
+        ('services', '0007_category_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'start_time'], name='bookings_bo_status_3c2736_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['updated_at'], name='bookings_bo_updated_e5c31b_idx'),
+        ),
+    ]
@@ -1,7 +1,15 @@
-from django.db import models
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, connection, models, transaction
 from users.models import User
 from services.models import Service
 
+# Minutes per bucket in the BookingSlot claim table
+SLOT_MINUTES = 5
+SLOT_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+# Name of the PostgreSQL exclusion constraint created in migration 0005
+OVERLAP_CONSTRAINT = 'bookings_booking_no_provider_overlap'
+
 class BookingStatus(models.TextChoices):
     PENDING = 'pending', 'Pending'
     CONFIRMED = 'confirmed', 'Confirmed'
@@ -10,6 +18,15 @@ class BookingStatus(models.TextChoices):
     REJECTED = 'rejected', 'Rejected'
     NO_SHOW = 'no_show', 'No Show'
 
+# Statuses that hold the provider's time and may not overlap
+BLOCKING_STATUSES = [BookingStatus.PENDING, BookingStatus.CONFIRMED]
+
+
+class BookingConflict(Exception):
+    """
+    Raised when a booking overlaps another active booking of the same provider
+    """
+
 class PaymentStatus(models.TextChoices):
     PENDING = 'pending', 'Pending'
     PAID = 'paid', 'Paid'
@@ -56,6 +73,55 @@ class Booking(models.Model):
     def __str__(self):
         return f'Booking {self.id} - {self.service.title}'
 
+    def save(self, *args, **kwargs):
+        """
+        Save the booking and claim its time atomically
+
+        Raises BookingConflict, leaving nothing written, if an active booking
+        of the same provider overlaps this one.
+        """
+        update_fields = kwargs.get('update_fields')
+        claims_changed = update_fields is None or bool(
+            {'provider', 'provider_id', 'status', 'start_time', 'end_time'} & set(update_fields)
+        )
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if claims_changed:
+                    self.claim_slots()
+        except IntegrityError as exc:
+            if OVERLAP_CONSTRAINT in str(exc):
+                raise BookingConflict('The provider already has a booking at this time') from exc
+            raise
+
+    def claim_slots(self):
+        """
+        Replace this booking's rows in the BookingSlot claim table, then check for overlaps
+
+        The buckets only serialize writers: a booking inserting a bucket row
+        that another transaction holds waits for it to finish. Adjacent
+        bookings may share an edge bucket, so the verdict comes from comparing
+        the real intervals once the buckets are held. PostgreSQL enforces
+        non-overlap with an exclusion constraint instead, so there is nothing
+        to claim there.
+        """
+        if connection.vendor == 'postgresql':
+            return
+        BookingSlot.objects.filter(booking=self).delete()
+        if self.status not in BLOCKING_STATUSES:
+            return
+        # Buckets already held by a neighbour stay theirs
+        BookingSlot.objects.bulk_create([
+            BookingSlot(booking=self, provider_id=self.provider_id, slot_start=slot_start)
+            for slot_start in BookingSlot.slot_starts(self.start_time, self.end_time)
+        ], ignore_conflicts=True)
+        overlapping = Booking.objects.filter(
+            provider_id=self.provider_id, status__in=BLOCKING_STATUSES,
+            start_time__lt=self.end_time, end_time__gt=self.start_time,
+        ).exclude(pk=self.pk)
+        if overlapping.exists():
+            raise BookingConflict('The provider already has a booking at this time')
+
     class Meta:
         ordering = ['-start_time']
         indexes = [
@@ -63,6 +129,12 @@ class Booking(models.Model):
             models.Index(fields=['provider']),
             models.Index(fields=['start_time']),
             models.Index(fields=['status']),
+            models.Index(fields=['client', '-start_time']),
+            models.Index(fields=['provider', '-start_time']),
+            models.Index(fields=['provider', 'end_time']),
+            # Range scans of the reminder scheduler (notifications.reminders)
+            models.Index(fields=['status', 'start_time']),
+            models.Index(fields=['updated_at']),
         ]
 
 class BookingChangeLog(models.Model):
@@ -80,4 +152,39 @@ class BookingChangeLog(models.Model):
         return f'{self.booking.id} - {self.previous_status} → {self.new_status}'
 
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+
+class BookingSlot(models.Model):
+    """
+    Fixed-size time buckets claimed by a provider's active bookings
+
+    On databases without exclusion constraints the unique (provider,
+    slot_start) constraint is the per-provider lock around the overlap check
+    in Booking.claim_slots: writers whose bookings could overlap share a
+    bucket and queue on its row, while the rest never contend. A bucket
+    belongs to the first booking claiming it.
+    """
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='slots')
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    slot_start = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.provider_id} @ {self.slot_start}'
+
+    @staticmethod
+    def slot_starts(start_time, end_time):
+        """
+        Return the starts of every bucket overlapping [start_time, end_time)
+        """
+        step = timedelta(minutes=SLOT_MINUTES)
+        slot_start = start_time - (start_time - SLOT_EPOCH) % step
+        starts = []
+        while slot_start < end_time:
+            starts.append(slot_start)
+            slot_start += step
+        return starts
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'slot_start'], name='bookings_slot_unique_provider_start'),
+        ]
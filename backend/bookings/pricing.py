@@ -0,0 +1,69 @@
+"""
+Server-side booking terms.
+
+Price, duration, end time and provider of a booking come from its service,
+never from the client. Services are looked up through a per-request cache so
+a bulk or recurring request for N bookings runs one service query.
+"""
+from datetime import timedelta
+
+from services.models import Service
+
+
+class ServiceCache:
+    """
+    Per-request cache of the services bookings are priced from
+    """
+    fields = ('id', 'provider', 'title', 'price', 'duration', 'is_available')
+
+    def __init__(self):
+        self._services = {}
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        Return the cache attached to a request, creating it on first use
+        """
+        cache = getattr(request, '_service_cache', None)
+        if cache is None:
+            cache = request._service_cache = cls()
+        return cache
+
+    def prefetch(self, service_ids):
+        """
+        Load every service not cached yet in a single query
+        """
+        missing = set()
+        for service_id in service_ids:
+            try:
+                missing.add(int(service_id))
+            except (TypeError, ValueError):
+                continue
+        missing -= set(self._services)
+        if not missing:
+            return
+        services = Service.objects.select_related('provider').only(
+            *self.fields, 'provider__first_name', 'provider__last_name'
+        ).filter(pk__in=missing)
+        for service in services:
+            self._services[service.pk] = service
+        for service_id in missing:
+            # Remember misses too so unknown ids are not queried again
+            self._services.setdefault(service_id, None)
+
+    def get(self, service_id):
+        if service_id not in self._services:
+            self.prefetch([service_id])
+        return self._services.get(service_id)
+
+
+def booking_terms(service, start_time):
+    """
+    Return the provider, duration, end time and price of a booking of service
+    """
+    return {
+        'provider': service.provider,
+        'duration': service.duration,
+        'end_time': start_time + timedelta(minutes=service.duration),
+        'price': service.price,
+    }
@@ -1,5 +1,9 @@
+from datetime import timedelta
 from rest_framework import serializers
+from levi_backend.query_shaping import EagerLoadingMixin
+from services.models import Service
 from .models import Booking, BookingChangeLog
+from .pricing import ServiceCache, booking_terms
 
 class BookingChangeLogSerializer(serializers.ModelSerializer):
     """
@@ -15,10 +19,37 @@ class BookingChangeLogSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'timestamp']
 
-class BookingSerializer(serializers.ModelSerializer):
+class CachedServiceField(serializers.PrimaryKeyRelatedField):
+    """
+    Service reference resolved through the per-request ServiceCache
+    """
+
+    def to_internal_value(self, data):
+        request = self.context.get('request')
+        if request is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            service_id = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        service = ServiceCache.for_request(request).get(service_id)
+        if service is None:
+            self.fail('does_not_exist', pk_value=data)
+        return service
+
+class BookingSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Booking model
+
+    Provider, duration, end_time and price are derived from the service.
     """
+    select_related_fields = ('client', 'provider', 'service')
+    prefetch_related_fields = ('change_logs__changed_by',)
+    expandable_fields = ('change_logs',)
+
+    service = CachedServiceField(queryset=Service.objects.all())
     client_name = serializers.CharField(source='client.get_full_name', read_only=True)
     provider_name = serializers.CharField(source='provider.get_full_name', read_only=True)
     service_title = serializers.CharField(source='service.title', read_only=True)
@@ -33,4 +64,55 @@ class BookingSerializer(serializers.ModelSerializer):
             'meeting_link', 'address', 'special_requests', 'cancellation_reason',
             'created_at', 'updated_at', 'cancelled_at', 'change_logs'
         ]
-        read_only_fields = ['id', 'client_name', 'provider_name', 'service_title', 'created_at', 'updated_at', 'cancelled_at', 'change_logs']
\ No newline at end of file
+        read_only_fields = [
+            'id', 'client', 'client_name', 'provider', 'provider_name', 'service_title',
+            'end_time', 'duration', 'price', 'created_at', 'updated_at', 'cancelled_at', 'change_logs'
+        ]
+    
+    def validate(self, data):
+        """
+        Derive provider, duration, end_time and price from the service
+        """
+        if self.instance is None or 'service' in data:
+            service = data['service']
+            if not service.is_available:
+                raise serializers.ValidationError({'service': 'This service is not currently available.'})
+            data.update(booking_terms(service, data.get('start_time', getattr(self.instance, 'start_time', None))))
+        elif 'start_time' in data:
+            # Rescheduling keeps the quoted price and duration
+            data['end_time'] = data['start_time'] + timedelta(minutes=self.instance.duration)
+        return data
+
+class RecurringBookingSerializer(serializers.Serializer):
+    """
+    Serializer expanding a recurring booking request into its occurrences
+    """
+    service = serializers.IntegerField()
+    start_time = serializers.DateTimeField()
+    occurrences = serializers.IntegerField(min_value=1, max_value=52)
+    interval_days = serializers.IntegerField(min_value=1, max_value=28, default=7)
+    location_type = serializers.ChoiceField(choices=Booking._meta.get_field('location_type').choices)
+    meeting_link = serializers.URLField(required=False, allow_blank=True)
+    address = serializers.CharField(required=False, allow_blank=True)
+    special_requests = serializers.CharField(required=False, allow_blank=True)
+
+    def occurrences_data(self):
+        """
+        Return one BookingSerializer payload per occurrence
+        """
+        data = dict(self.validated_data)
+        occurrences = data.pop('occurrences')
+        interval = timedelta(days=data.pop('interval_days'))
+        start_time = data.pop('start_time')
+        return [
+            {**data, 'start_time': start_time + index * interval}
+            for index in range(occurrences)
+        ]
+
+class SlotQuerySerializer(serializers.Serializer):
+    """
+    Query parameters for the bookable slot endpoint
+    """
+    start = serializers.DateField(required=False)
+    days = serializers.IntegerField(min_value=1, max_value=60, default=14)
+    step = serializers.IntegerField(min_value=5, max_value=24 * 60, required=False)
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from events.outbox import emit
+from levi_backend.realtime import publish
+from .models import Booking, BookingChangeLog
+
+
+@receiver(pre_save, sender=Booking)
+def remember_status(sender, instance, **kwargs):
+    # Snapshot the stored status, to tell status changes apart from other edits
+    instance._stored_status = None
+    if instance.pk:
+        instance._stored_status = Booking.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Booking)
+def emit_status_change(sender, instance, created, raw=False, **kwargs):
+    # Runs inside Booking.save's transaction, so the event commits with the change
+    previous = getattr(instance, '_stored_status', None)
+    if raw or (not created and previous == instance.status):
+        return
+    emit('booking.status_changed', instance.pk, {
+        'booking': instance.pk,
+        'client': instance.client_id,
+        'provider': instance.provider_id,
+        'service': instance.service_id,
+        'previous_status': previous,
+        'status': instance.status,
+        'start_time': instance.start_time.isoformat(),
+    })
+    instance._stored_status = instance.status
+
+
+@receiver(post_save, sender=BookingChangeLog)
+def push_booking_status_change(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    booking = instance.booking
+    event = {
+        'type': 'booking_status',
+        'booking': booking.pk,
+        'previous_status': instance.previous_status,
+        'new_status': instance.new_status,
+        'changed_by': instance.changed_by_id,
+        'reason': instance.reason,
+        'timestamp': instance.timestamp,
+    }
+    transaction.on_commit(lambda: publish([booking.client_id, booking.provider_id], event))
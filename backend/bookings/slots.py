@@ -0,0 +1,128 @@
+"""
+Bookable slot computation.
+
+Free time for a service is its weekly Availability rules expanded over a
+date window, minus the provider's pending and confirmed bookings. Busy
+intervals are sorted and merged once, then swept against the (also
+sorted) availability windows in a single pass, so the cost is
+O((windows + bookings) log(windows + bookings)) and the whole calendar is
+served from two queries: one for the rules and one for the bookings.
+"""
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from services.models import Availability, Service
+from .models import BLOCKING_STATUSES, Booking
+
+
+def expand_availability(rules, start_date, days, tz):
+    """
+    Turn weekly (day_of_week, start_time, end_time) rules into dated windows
+    """
+    rules_by_day = {}
+    for day_of_week, start_time, end_time in rules:
+        rules_by_day.setdefault(day_of_week, []).append((start_time, end_time))
+
+    windows = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for start_time, end_time in rules_by_day.get(day.weekday(), []):
+            if end_time <= start_time:
+                continue
+            windows.append((
+                timezone.make_aware(datetime.combine(day, start_time), tz),
+                timezone.make_aware(datetime.combine(day, end_time), tz),
+            ))
+    windows.sort()
+    return windows
+
+
+def merge_intervals(intervals):
+    """
+    Merge overlapping or touching intervals into a sorted disjoint list
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(windows, busy):
+    """
+    Remove busy intervals from availability windows in a single sweep
+    """
+    busy = merge_intervals(busy)
+    windows = merge_intervals(windows)
+    free = []
+    index = 0
+    for start, end in windows:
+        # Skip busy intervals that ended before this window starts
+        while index < len(busy) and busy[index][1] <= start:
+            index += 1
+        cursor = start
+        scan = index
+        while scan < len(busy) and busy[scan][0] < end:
+            busy_start, busy_end = busy[scan]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            scan += 1
+        if cursor < end:
+            free.append((cursor, end))
+    return free
+
+
+def slice_slots(free, duration, step=None, not_before=None):
+    """
+    Cut free intervals into slots of ``duration``, starting every ``step``
+    """
+    step = step or duration
+    slots = []
+    for start, end in free:
+        slot_start = start
+        if not_before and slot_start < not_before:
+            # Keep slots aligned to the window start while skipping the past
+            skipped = (not_before - slot_start + step - timedelta(microseconds=1)) // step
+            slot_start += skipped * step
+        while slot_start + duration <= end:
+            slots.append((slot_start, slot_start + duration))
+            slot_start += step
+    return slots
+
+
+def bookable_slots(service_id, start_date, days, step_minutes=None, now=None):
+    """
+    Return (duration in minutes, [(start, end), ...]) of free slots for a service
+
+    Raises Service.DoesNotExist for an unknown service.
+    """
+    tz = timezone.get_current_timezone()
+    rows = list(
+        Availability.objects.filter(service_id=service_id, is_available=True)
+        .values_list('day_of_week', 'start_time', 'end_time', 'service__duration', 'service__provider_id')
+    )
+    if not rows:
+        # Distinguish "no availability" from "no such service"
+        service = Service.objects.only('duration').get(pk=service_id)
+        return service.duration, []
+
+    duration_minutes, provider_id = rows[0][3], rows[0][4]
+    windows = expand_availability([row[:3] for row in rows], start_date, days, tz)
+    if not windows:
+        return duration_minutes, []
+
+    busy = Booking.objects.filter(
+        provider_id=provider_id,
+        status__in=BLOCKING_STATUSES,
+        end_time__gt=windows[0][0],
+        start_time__lt=max(end for _, end in windows),
+    ).values_list('start_time', 'end_time')
+
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=step_minutes) if step_minutes else duration
+    free = subtract_intervals(windows, list(busy))
+    return duration_minutes, slice_slots(free, duration, step, not_before=now or timezone.now())
@@ -1,3 +1,326 @@
-from django.test import TestCase
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from importlib import import_module
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from services.models import Availability, Category, Service
+from users.models import User
+from .models import Booking, BookingConflict, BookingSlot, BookingStatus
+
+
+def utc(day, hour, minute=0):
+    return datetime.combine(day, time(hour, minute), tzinfo=dt_timezone.utc)
+
+
+class ServiceSlotTests(APITestCase):
+    """
+    Bookable slots computed from availability minus bookings
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.client.force_authenticate(self.client_user)
+        category = Category.objects.create(name='Plumbing')
+        self.service = Service.objects.create(
+            provider=self.provider, category=category, title='Pipe Repair', description='Description',
+            price='80.00', duration=60,
+        )
+        # A Monday far enough ahead that no slot is in the past
+        self.monday = date.today() + timedelta(days=7 - date.today().weekday() + 7)
+        Availability.objects.create(service=self.service, day_of_week=0, start_time=time(9), end_time=time(13))
+
+    def book(self, start, end, status=BookingStatus.CONFIRMED):
+        return Booking.objects.create(
+            client=self.client_user, provider=self.provider, service=self.service, status=status,
+            start_time=start, end_time=end, duration=60, price='80.00', location_type='in_person',
+        )
+
+    def get_slots(self, **params):
+        url = reverse('service-slot-list', kwargs={'service_id': self.service.pk})
+        response = self.client.get(url, {'start': self.monday.isoformat(), 'days': 1, **params})
+        self.assertEqual(response.status_code, 200)
+        return [slot['start'][11:16] for slot in response.json()['slots']]
+
+    def test_slots_exclude_blocking_bookings(self):
+        self.book(utc(self.monday, 10, 30), utc(self.monday, 11, 30))
+        self.book(utc(self.monday, 9), utc(self.monday, 10), status=BookingStatus.CANCELLED)
+
+        self.assertEqual(self.get_slots(), ['09:00', '11:30'])
+        self.assertEqual(self.get_slots(step=30), ['09:00', '09:30', '11:30', '12:00'])
+
+    def test_slots_use_two_queries(self):
+        self.book(utc(self.monday, 10), utc(self.monday, 11))
+        url = reverse('service-slot-list', kwargs={'service_id': self.service.pk})
+        with self.assertNumQueries(2):
+            self.client.get(url, {'start': self.monday.isoformat(), 'days': 14})
+
+    def test_unknown_service(self):
+        url = reverse('service-slot-list', kwargs={'service_id': self.service.pk + 1})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class DoubleBookingStressTests(TransactionTestCase):
+    """
+    Many concurrent writers racing for the same provider's time
+    """
+    threads = 16
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.clients = [
+            User.objects.create_user(username=f'client{index}', email=f'client{index}@example.com', password='pass')
+            for index in range(self.threads)
+        ]
+        category = Category.objects.create(name='Plumbing')
+        self.service = Service.objects.create(
+            provider=self.provider, category=category, title='Pipe Repair', description='Description',
+            price='80.00', duration=60,
+        )
+        self.day = date.today() + timedelta(days=30)
+
+    def attempt(self, client, start, barrier, outcomes):
+        barrier.wait()
+        try:
+            for _ in range(50):
+                try:
+                    Booking.objects.create(
+                        client=client, provider=self.provider, service=self.service,
+                        start_time=start, end_time=start + timedelta(hours=1),
+                        duration=60, price='80.00', location_type='in_person',
+                    )
+                    outcomes.append('booked')
+                    return
+                except BookingConflict:
+                    outcomes.append('conflict')
+                    return
+                except OperationalError:
+                    # SQLite reports lock contention instead of blocking; retry
+                    clock.sleep(0.01)
+            outcomes.append('gave up')
+        finally:
+            connection.close()
+
+    def test_only_one_overlapping_booking_wins(self):
+        # Every writer targets 10:00, 10:15, 10:30 or 10:45, all overlapping
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+        workers = [
+            threading.Thread(
+                target=self.attempt,
+                args=(client, utc(self.day, 10, 15 * (index % 4)), barrier, outcomes),
+            )
+            for index, client in enumerate(self.clients)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(outcomes.count('booked'), 1, outcomes)
+        self.assertEqual(outcomes.count('conflict'), self.threads - 1, outcomes)
+        self.assertEqual(Booking.objects.filter(provider=self.provider).count(), 1)
+
+    def book(self, client, start, end):
+        return Booking.objects.create(
+            client=client, provider=self.provider, service=self.service, start_time=start, end_time=end,
+            duration=int((end - start).total_seconds() // 60), price='80.00', location_type='in_person',
+        )
+
+    def test_adjacent_bookings_off_the_bucket_grid(self):
+        # Each pair shares the bucket its boundary falls in without overlapping
+        first = self.book(self.clients[0], utc(self.day, 10, 2), utc(self.day, 11, 2))
+        self.book(self.clients[1], utc(self.day, 11, 2), utc(self.day, 12, 2))
+        self.book(self.clients[2], utc(self.day, 12, 3), utc(self.day, 13, 3))
+        with self.assertRaises(BookingConflict):
+            self.book(self.clients[3], utc(self.day, 11, 1), utc(self.day, 11, 30))
+        with self.assertRaises(BookingConflict):
+            self.book(self.clients[3], utc(self.day, 13, 2), utc(self.day, 13, 4))
+        self.assertEqual(Booking.objects.filter(provider=self.provider).count(), 3)
+
+        # Cancelling the booking holding a shared bucket leaves its neighbour protected
+        first.status = BookingStatus.CANCELLED
+        first.save()
+        with self.assertRaises(BookingConflict):
+            self.book(self.clients[3], utc(self.day, 10, 55), utc(self.day, 11, 5))
+        self.book(self.clients[3], utc(self.day, 10, 55), utc(self.day, 11, 2))
+
+    def test_cancelling_releases_the_slot(self):
+        start = utc(self.day, 10)
+        booking = Booking.objects.create(
+            client=self.clients[0], provider=self.provider, service=self.service,
+            start_time=start, end_time=start + timedelta(hours=1),
+            duration=60, price='80.00', location_type='in_person',
+        )
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+        rebooked = Booking.objects.create(
+            client=self.clients[1], provider=self.provider, service=self.service,
+            start_time=start + timedelta(minutes=30), end_time=start + timedelta(hours=1, minutes=30),
+            duration=60, price='80.00', location_type='in_person',
+        )
+        self.assertEqual(
+            list(Booking.objects.filter(provider=self.provider, status=BookingStatus.PENDING)), [rebooked],
+        )
+        self.assertFalse(BookingSlot.objects.filter(booking=booking).exists())
+        self.assertEqual(BookingSlot.objects.filter(booking=rebooked).count(), 12)
+
+    def test_migration_finds_existing_overlaps(self):
+        migration = import_module('bookings.migrations.0005_booking_overlap_protection')
+        start = utc(self.day, 10)
+        # bulk_create claims no slots, like rows written before the protection existed
+        _, overlapping, _ = Booking.objects.bulk_create([
+            Booking(
+                client=client, provider=self.provider, service=self.service, start_time=start + offset,
+                end_time=start + offset + timedelta(hours=1), duration=60, price='80.00',
+                location_type='in_person', status=status,
+            )
+            for client, offset, status in [
+                (self.clients[0], timedelta(), BookingStatus.CONFIRMED),
+                (self.clients[1], timedelta(minutes=30), BookingStatus.PENDING),
+                (self.clients[2], timedelta(minutes=15), BookingStatus.CANCELLED),
+            ]
+        ])
+        with self.assertRaisesMessage(RuntimeError, f'1 pending or confirmed bookings overlap an earlier booking '
+                                                    f'of the same provider: {overlapping.pk}.'):
+            migration.check_no_overlaps(Booking)
+
+        overlapping.status = BookingStatus.CANCELLED
+        overlapping.save()
+        migration.check_no_overlaps(Booking)
+
+
+class BookingTermsTests(APITestCase):
+    """
+    Booking terms derived from the service instead of the client
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.client.force_authenticate(self.client_user)
+        category = Category.objects.create(name='Plumbing')
+        self.service = Service.objects.create(
+            provider=self.provider, category=category, title='Pipe Repair', description='Description',
+            price='80.00', duration=90,
+        )
+        self.start = utc(date.today() + timedelta(days=10), 9)
+
+    def test_client_supplied_terms_are_ignored(self):
+        response = self.client.post(reverse('booking-list'), {
+            'service': self.service.pk, 'provider': self.client_user.pk, 'start_time': self.start.isoformat(),
+            'end_time': self.start.isoformat(), 'duration': 1, 'price': '0.00', 'location_type': 'in_person',
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.provider, self.provider)
+        self.assertEqual(booking.client, self.client_user)
+        self.assertEqual(booking.duration, 90)
+        self.assertEqual(str(booking.price), '80.00')
+        self.assertEqual(booking.end_time, self.start + timedelta(minutes=90))
+
+    def test_recurring_booking_looks_up_the_service_once(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('recurring-booking-create'), {
+                'service': self.service.pk, 'start_time': self.start.isoformat(),
+                'occurrences': 6, 'location_type': 'in_person',
+            })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Booking.objects.count(), 6)
+        service_queries = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "services_service"' in query['sql']
+        ]
+        self.assertEqual(len(service_queries), 1)
+
+    def test_bulk_booking_is_all_or_nothing(self):
+        payload = [
+            {'service': self.service.pk, 'start_time': (self.start + timedelta(days=offset)).isoformat(),
+             'location_type': 'in_person'}
+            for offset in (0, 1, 0)
+        ]
+        response = self.client.post(reverse('booking-list'), payload, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_status_change_is_logged_in_the_update_response(self):
+        booking = Booking.objects.create(
+            client=self.client_user, provider=self.provider, service=self.service, start_time=self.start,
+            end_time=self.start + timedelta(minutes=90), duration=90, price='80.00', location_type='in_person',
+        )
+        url = reverse('booking-detail', kwargs={'pk': booking.pk})
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(url, {'status': 'cancelled', 'reason': 'Away'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            [(log['new_status'], log['reason']) for log in response.data['change_logs']], [('cancelled', 'Away')]
+        )
+        self.assertEqual(self.client.patch(url, {'status': 'confirmed'}, HTTP_IF_MATCH=etag).status_code, 412)
+
+    def test_booking_lists_leave_out_change_logs_unless_expanded(self):
+        for offset in range(3):
+            start = self.start + timedelta(days=offset)
+            booking = Booking.objects.create(
+                client=self.client_user, provider=self.provider, service=self.service, start_time=start,
+                end_time=start + timedelta(minutes=90), duration=90, price='80.00', location_type='in_person',
+            )
+            booking.change_logs.create(previous_status='pending', new_status='confirmed', changed_by=self.provider)
+
+        url = reverse('booking-list')
+        self.assertNotIn('change_logs', self.client.get(url).json()['results'][0])
+        with self.assertNumQueries(3):
+            bookings = self.client.get(url, {'expand': 'change_logs'}).json()['results']
+        self.assertEqual([len(booking['change_logs']) for booking in bookings], [1, 1, 1])
+        self.assertEqual(bookings[0]['change_logs'][0]['changed_by_name'], '')
+
+
+class BookingPaginationTests(APITestCase):
+    """
+    Cursor pagination of the booking list on start_time
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.client.force_authenticate(self.client_user)
+        category = Category.objects.create(name='Plumbing')
+        self.services = []
+        for index in range(3):
+            provider = User.objects.create_user(
+                username=f'provider{index}', email=f'provider{index}@example.com', password='pass',
+            )
+            self.services.append(Service.objects.create(
+                provider=provider, category=category, title=f'Service {index}', description='Description',
+                price='80.00', duration=60,
+            ))
+        self.start = utc(date.today() + timedelta(days=10), 9)
+
+    def book(self, service, days):
+        start = self.start + timedelta(days=days)
+        return Booking.objects.create(
+            client=self.client_user, provider=service.provider, service=service, start_time=start,
+            end_time=start + timedelta(hours=1), duration=60, price='80.00', location_type='in_person',
+        )
+
+    def test_pages_follow_start_time_with_ties_broken_by_id(self):
+        latest = self.book(self.services[0], 2)
+        # Three bookings share a start time at different providers
+        tied = [self.book(service, 1) for service in self.services]
+        earliest = self.book(self.services[0], 0)
+
+        first_page = self.client.get(reverse('booking-list'), {'page_size': 2}).json()
+        self.assertEqual([booking['id'] for booking in first_page['results']], [latest.pk, tied[2].pk])
+
+        # Bookings sorting ahead of the cursor, tied or not, must not shift the next pages
+        self.book(self.services[1], 3)
+        self.book(self.services[1], 2)
+        second_page = self.client.get(first_page['next']).json()
+        self.assertEqual([booking['id'] for booking in second_page['results']], [tied[1].pk, tied[0].pk])
+        last_page = self.client.get(second_page['next']).json()
+        self.assertEqual([booking['id'] for booking in last_page['results']], [earliest.pk])
+        self.assertIsNone(last_page['next'])
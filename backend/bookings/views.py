@@ -1,12 +1,42 @@
+from datetime import timedelta
 from rest_framework import generics, permissions, status
-from django.db import models
+from django.db import models, transaction
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
-from .models import Booking, BookingChangeLog
-from .serializers import BookingSerializer, BookingChangeLogSerializer
+from rest_framework.views import APIView
+from levi_backend.conditional import ConditionalRequestMixin
+from levi_backend.query_shaping import EagerLoadingViewMixin
+from services.models import Service
+from .models import Booking, BookingChangeLog, BookingConflict
+from .pricing import ServiceCache
+from .serializers import BookingSerializer, BookingChangeLogSerializer, RecurringBookingSerializer, SlotQuerySerializer
+from .slots import bookable_slots
 
-class BookingListView(generics.ListCreateAPIView):
+class SlotUnavailable(APIException):
     """
-    View for listing all bookings or creating a new booking
+    Conflict raised when a booking overlaps another active booking
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The provider already has a booking at this time.'
+    default_code = 'slot_unavailable'
+
+def save_bookings(serializer, client):
+    """
+    Save one or many validated bookings for a client, all or nothing
+    """
+    try:
+        with transaction.atomic():
+            serializer.save(client=client)
+    except BookingConflict:
+        raise SlotUnavailable()
+
+class BookingListView(EagerLoadingViewMixin, generics.ListCreateAPIView):
+    """
+    View for listing all bookings or creating new bookings
+
+    POSTing a list creates several bookings at once, all or nothing.
     """
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -22,39 +52,68 @@ class BookingListView(generics.ListCreateAPIView):
             models.Q(client=self.request.user) | models.Q(provider=self.request.user)
         )
     
+    def get_serializer(self, *args, **kwargs):
+        # Accept a list of bookings for bulk creation
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+    
+    def create(self, request, *args, **kwargs):
+        # Load every referenced service in one query before validation
+        if isinstance(request.data, list):
+            ServiceCache.for_request(request).prefetch(
+                item.get('service') for item in request.data if isinstance(item, dict)
+            )
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         # Set client to current user when creating a booking
-        serializer.save(client=self.request.user)
+        save_bookings(serializer, self.request.user)
+
+class RecurringBookingCreateView(APIView):
+    """
+    View for booking a service repeatedly, e.g. weekly for N weeks
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
+    def post(self, request):
+        recurrence = RecurringBookingSerializer(data=request.data)
+        recurrence.is_valid(raise_exception=True)
+
+        serializer = BookingSerializer(
+            data=recurrence.occurrences_data(), many=True, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        save_bookings(serializer, request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class BookingDetailView(ConditionalRequestMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View for retrieving, updating or deleting a specific booking
     """
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    validator_fields = ('updated_at', 'client__updated_at', 'provider__updated_at', 'service__updated_at')
     
-    def update(self, request, *args, **kwargs):
-        # Get the existing booking instance
-        instance = self.get_object()
-        old_status = instance.status
-        
-        # Perform the update
-        response = super().update(request, *args, **kwargs)
+    def perform_update(self, serializer):
+        old_status = serializer.instance.status
+        try:
+            booking = serializer.save()
+        except BookingConflict:
+            raise SlotUnavailable()
         
-        # Create a change log if status was updated
-        if 'status' in request.data and request.data['status'] != old_status:
+        # Log status changes in the same transaction, so the response includes the entry
+        if booking.status != old_status:
             BookingChangeLog.objects.create(
-                booking=instance,
+                booking=booking,
                 previous_status=old_status,
-                new_status=request.data['status'],
-                changed_by=request.user,
-                reason=request.data.get('reason', '')
+                new_status=booking.status,
+                changed_by=self.request.user,
+                reason=self.request.data.get('reason', '')
             )
-        
-        return response
 
-class ClientBookingListView(generics.ListAPIView):
+class ClientBookingListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     View for listing all bookings for the current client
     """
@@ -65,7 +124,7 @@ class ClientBookingListView(generics.ListAPIView):
         # Return bookings where the current user is the client
         return Booking.objects.filter(client=self.request.user)
 
-class ProviderBookingListView(generics.ListAPIView):
+class ProviderBookingListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     View for listing all bookings for the current provider
     """
@@ -86,4 +145,38 @@ class BookingChangeLogListView(generics.ListAPIView):
     def get_queryset(self):
         # Filter change logs by booking ID from URL parameters
         booking_id = self.kwargs['booking_id']
-        return BookingChangeLog.objects.filter(booking_id=booking_id)
\ No newline at end of file
+        return BookingChangeLog.objects.filter(booking_id=booking_id)
+
+class ServiceSlotListView(APIView):
+    """
+    View for listing the bookable slots of a service
+
+    Expands the service's weekly availability over ?start=YYYY-MM-DD (default
+    today) for ?days= days (default 14) and removes the provider's pending
+    and confirmed bookings. ?step= sets the minutes between slot starts
+    (defaults to the service duration).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, service_id):
+        query = SlotQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start_date = query.validated_data.get('start') or timezone.localdate()
+
+        try:
+            duration, slots = bookable_slots(
+                service_id,
+                start_date,
+                query.validated_data['days'],
+                step_minutes=query.validated_data.get('step'),
+            )
+        except Service.DoesNotExist:
+            raise Http404
+
+        return Response({
+            'service': service_id,
+            'duration': duration,
+            'start': start_date,
+            'end': start_date + timedelta(days=query.validated_data['days']),
+            'slots': [{'start': start, 'end': end} for start, end in slots],
+        })
@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from events.outbox import Relay
+
+
+class Command(BaseCommand):
+    help = 'Deliver outbox events to the registered consumers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Bring every consumer up to date and exit instead of polling')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Events per consumer transaction (default OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls for new events')
+
+    def handle(self, *args, **options):
+        relay = Relay(batch_size=options['batch_size'])
+        if options['once']:
+            relay.run_once()
+        else:
+            stopping = []
+            signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+            try:
+                relay.run(poll_interval=options['poll_interval'], stop=lambda: stopping)
+            except KeyboardInterrupt:
+                pass
+        stats = relay.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Handled {stats["handled"]} events, {stats["failed"]} failures to retry, {stats["skipped"]} skipped'
+        ))
@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    A domain event, written in the same transaction as the change it describes
+    """
+    # Relay order; ids only ever grow
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=100)
+    aggregate_id = models.CharField(max_length=64, help_text="Primary key of the changed object")
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.topic} #{self.id}'
+
+    class Meta:
+        ordering = ['id']
+
+
+class ConsumerOffset(models.Model):
+    """
+    How far a registered consumer has processed the outbox
+    """
+    consumer = models.CharField(max_length=100, primary_key=True)
+    position = models.BigIntegerField(default=0, help_text="Id of the last event handled or skipped")
+    # Failed attempts at the event after position, and the latest error
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.consumer} at {self.position}'
@@ -0,0 +1,164 @@
+"""
+Transactional outbox for domain events.
+
+Models emit events with ``emit`` from their signal handlers. The event row
+is written in the same transaction as the change, so an event exists if and
+only if the change committed. Side effects that are slow or may fail, such
+as notifying users, run in consumers off the request path.
+
+Consumers register with ``@consumer(name, topics)``. The relay
+(``manage.py relay_outbox``) feeds each consumer the outbox in id order,
+from the position stored in its ``ConsumerOffset`` row. For each batch it:
+
+- locks that row;
+- runs the handler for every matching event, each in a savepoint;
+- advances the position in the same transaction.
+
+A handler's database writes commit together with the offset that records
+them. Delivery is at least once: a crash before the commit replays the
+batch. Handlers with effects outside the database must therefore tolerate
+repeats.
+
+A failing event stops its consumer, which keeps the order, and is retried
+on the next pass. After OUTBOX_MAX_ATTEMPTS failures it is skipped, and the
+error stays on the offset row.
+
+Ids are allocated when an event is inserted, not when it commits. An event
+with a lower id can therefore become visible after a higher one. The relay
+stops at a gap in the ids until the events after it are
+OUTBOX_SETTLE_SECONDS old. A gap that remains after that long is taken to
+be an id spent by a rolled-back transaction and skipped with a warning. The
+window has to outlast the longest transaction that emits events: an event
+committing after its gap was skipped is never relayed.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import ConsumerOffset, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+SETTLE_SECONDS = getattr(settings, 'OUTBOX_SETTLE_SECONDS', 5 * 60)
+# Seconds handled events are kept before the relay prunes them
+RETENTION_SECONDS = getattr(settings, 'OUTBOX_RETENTION_SECONDS', 7 * 24 * 60 * 60)
+
+# name -> (topics, handler)
+consumers = {}
+
+
+def emit(topic, aggregate_id, payload):
+    """
+    Record an event; call it inside the transaction making the change
+    """
+    return OutboxEvent.objects.create(topic=topic, aggregate_id=str(aggregate_id), payload=payload)
+
+
+def consumer(name, topics):
+    """
+    Register the decorated function as the handler of a consumer
+    """
+    def register(handler):
+        consumers[name] = (frozenset(topics), handler)
+        return handler
+    return register
+
+
+def visible_events(position, limit, now):
+    """
+    The next events after position that are safe to hand out in id order
+    """
+    settled = now - timedelta(seconds=SETTLE_SECONDS)
+    events = []
+    # A new consumer starts at the oldest event, wherever the ids begin
+    expected = position + 1 if position else None
+    for event in OutboxEvent.objects.filter(pk__gt=position).order_by('pk')[:limit]:
+        if expected is not None and event.pk != expected:
+            if event.created_at > settled:
+                # An event with a lower id may still commit
+                break
+            logger.warning(
+                'Outbox ids %s to %s did not commit within %s seconds; relaying past them',
+                expected, event.pk - 1, SETTLE_SECONDS,
+            )
+        events.append(event)
+        expected = event.pk + 1
+    return events
+
+
+class Relay:
+    """
+    Feeds outbox events to the registered consumers
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or BATCH_SIZE
+        self.stats = {'handled': 0, 'failed': 0, 'skipped': 0}
+
+    def relay_batch(self, name):
+        """
+        Run one batch for a consumer, returning whether it should be called again right away
+        """
+        topics, handler = consumers[name]
+        with transaction.atomic():
+            offset, _ = ConsumerOffset.objects.select_for_update().get_or_create(consumer=name)
+            events = visible_events(offset.position, self.batch_size, timezone.now())
+            if not events:
+                return False
+            for event in events:
+                if event.topic in topics:
+                    try:
+                        with transaction.atomic():
+                            handler(event)
+                    except Exception as error:
+                        offset.attempts += 1
+                        offset.last_error = f'Event {event.pk}: {type(error).__name__}: {error}'
+                        if offset.attempts < MAX_ATTEMPTS:
+                            self.stats['failed'] += 1
+                            offset.save()
+                            return False
+                        logger.exception('Consumer %s skipped outbox event %s', name, event.pk)
+                        self.stats['skipped'] += 1
+                    else:
+                        self.stats['handled'] += 1
+                offset.position = event.pk
+                offset.attempts = 0
+            offset.save()
+        return len(events) == self.batch_size
+
+    def run_once(self):
+        """
+        Bring every consumer up to date, as far as it can get
+        """
+        for name in sorted(consumers):
+            while self.relay_batch(name):
+                pass
+
+    def prune(self):
+        """
+        Delete events every consumer has handled that are past the retention period
+        """
+        offsets = ConsumerOffset.objects.filter(consumer__in=consumers)
+        # A consumer without an offset row hasn't handled anything yet
+        if not consumers or offsets.count() < len(consumers):
+            return 0
+        handled = offsets.aggregate(position=Min('position'))['position']
+        cutoff = timezone.now() - timedelta(seconds=RETENTION_SECONDS)
+        deleted, _ = OutboxEvent.objects.filter(pk__lte=handled, created_at__lt=cutoff).delete()
+        return deleted
+
+    def run(self, poll_interval=1.0, stop=None):
+        """
+        Relay until stop() returns True, pruning between polls
+        """
+        while not (stop is not None and stop()):
+            self.run_once()
+            self.prune()
+            time.sleep(poll_interval)
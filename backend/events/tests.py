@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from bookings.models import Booking, BookingStatus
+from notifications.models import Notification
+from services.models import Category, Service
+from users.models import User
+from . import outbox
+from .models import ConsumerOffset, OutboxEvent
+
+
+class OutboxTests(TestCase):
+    """
+    Outbox events written with their changes and relayed to consumers
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.service = Service.objects.create(
+            provider=self.provider, category=Category.objects.create(name='Plumbing'), title='Pipe Repair',
+            description='Description', price='80.00', duration=60,
+        )
+
+    def book(self, hours=7 * 24):
+        start = timezone.now() + timedelta(hours=hours)
+        return Booking.objects.create(
+            client=self.client_user, provider=self.provider, service=self.service, start_time=start,
+            end_time=start + timedelta(hours=1), duration=60, price='80.00', location_type='in_person',
+        )
+
+    def test_events_commit_and_roll_back_with_the_change(self):
+        booking = self.book()
+        booking.special_requests = 'Bring a ladder'
+        booking.save()
+        booking.status = BookingStatus.CONFIRMED
+        booking.save()
+        self.assertEqual(
+            [(event.payload['previous_status'], event.payload['status']) for event in OutboxEvent.objects.all()],
+            [(None, 'pending'), ('pending', 'confirmed')],
+        )
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            booking.status = BookingStatus.CANCELLED
+            booking.save()
+            raise RuntimeError
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_relay_delivers_in_order_and_retries_failures(self):
+        seen = []
+        failures = {'remaining': 1}
+
+        def handler(event):
+            if event.payload['n'] == 2 and failures['remaining']:
+                failures['remaining'] -= 1
+                raise ConnectionError('Downstream unavailable')
+            seen.append(event.payload['n'])
+
+        for n in range(1, 5):
+            outbox.emit('test.other' if n == 3 else 'test.event', n, {'n': n})
+        with mock.patch.dict(outbox.consumers, clear=True):
+            outbox.consumer('test', topics=['test.event'])(handler)
+            relay = outbox.Relay(batch_size=2)
+            relay.run_once()
+            self.assertEqual(seen, [1])
+            offset = ConsumerOffset.objects.get(consumer='test')
+            self.assertEqual((offset.attempts, offset.last_error.split(': ')[1]), (1, 'ConnectionError'))
+
+            relay.run_once()
+        self.assertEqual(seen, [1, 2, 4])
+        self.assertEqual(relay.stats, {'handled': 3, 'failed': 1, 'skipped': 0})
+        offset = ConsumerOffset.objects.get(consumer='test')
+        self.assertEqual((offset.position, offset.attempts), (OutboxEvent.objects.last().pk, 0))
+
+    def test_relay_waits_at_a_gap_until_it_settles(self):
+        first, missing, last = (outbox.emit('test.event', n, {'n': n}) for n in range(3))
+        missing.delete()
+        seen = []
+        with mock.patch.dict(outbox.consumers, clear=True):
+            outbox.consumer('test', topics=['test.event'])(lambda event: seen.append(event.pk))
+            outbox.Relay().run_once()
+            self.assertEqual(seen, [first.pk])
+            OutboxEvent.objects.filter(pk=last.pk).update(created_at=timezone.now() - timedelta(minutes=1))
+            outbox.Relay().run_once()
+            self.assertEqual(seen, [first.pk])
+
+            OutboxEvent.objects.filter(pk=last.pk).update(
+                created_at=timezone.now() - timedelta(seconds=outbox.SETTLE_SECONDS + 1),
+            )
+            with self.assertLogs('events.outbox', 'WARNING') as logs:
+                outbox.Relay().run_once()
+        self.assertIn(f'Outbox ids {first.pk + 1} to {last.pk - 1} did not commit', logs.output[0])
+        self.assertEqual(seen, [first.pk, last.pk])
+
+    def test_booking_notifications_survive_redelivery(self):
+        booking = self.book()
+        booking.status = BookingStatus.CONFIRMED
+        booking.save()
+        outbox.Relay().run_once()
+        confirmed = Notification.objects.filter(type='booking_confirmed')
+        self.assertEqual({notification.recipient_id for notification in confirmed}, {self.client_user.pk})
+        self.assertEqual(confirmed.count(), 3)
+
+        # Replaying the whole outbox, as after a crash before the offsets committed, adds nothing
+        ConsumerOffset.objects.update(position=0)
+        outbox.Relay().run_once()
+        self.assertEqual(confirmed.count(), 3)
@@ -2,6 +2,8 @@
 ASGI config for levi_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; websockets go to the realtime event stream
+(``levi_backend.realtime``).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'levi_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from levi_backend.realtime import websocket_application  # noqa: E402  (needs Django set up first)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,112 @@
+"""
+Conditional requests for the detail endpoints.
+
+Views using ``ConditionalRequestMixin`` derive an ETag and Last-Modified
+from ``updated_at`` columns read with a single values() query, without
+loading or serializing the object. ``validator_fields`` lists the
+timestamps the representation depends on. That covers the object itself
+and related rows joined into it, such as a provider's name.
+
+A child collection nested in a representation, such as a service's images,
+has no column to join. Its writes call ``touch`` to bump the parent's
+updated_at instead.
+
+GET answers 304 to a matching If-None-Match or If-Modified-Since. PUT,
+PATCH and DELETE honour If-Match and If-Unmodified-Since. The check locks
+the row in the same transaction as the write, so two clients updating
+from the same ETag can't both succeed. The precedence rules are Django's
+own, from ``django.utils.cache.get_conditional_response``.
+"""
+import hashlib
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def touch(model, pk):
+    """
+    Bump updated_at on a row whose representation includes a changed child
+    """
+    model.objects.filter(pk=pk).update(updated_at=timezone.now())
+
+
+class ConditionalRequestMixin:
+    """
+    View mixin answering conditional GETs and checking preconditions on writes
+    """
+    validator_fields = ('updated_at',)
+
+    def get_validator_queryset(self):
+        """
+        The object's row, found the way get_object finds it
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.get_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+
+    def get_loaded_timestamps(self):
+        """
+        Timestamps the representation depends on that are already in memory
+        """
+        return ()
+
+    def get_validators(self, lock=False):
+        """
+        Return (etag, last modified unix time) for the object, or None if it doesn't exist
+        """
+        queryset = self.get_validator_queryset()
+        if lock:
+            queryset = queryset.select_for_update(of=('self',))
+        row = queryset.values_list('pk', *self.validator_fields).first()
+        if row is None:
+            return None
+        pk, *timestamps = row
+        timestamps = [
+            timestamp for timestamp in (*timestamps, *self.get_loaded_timestamps()) if timestamp is not None
+        ]
+        source = ':'.join([queryset.model._meta.label, str(pk), *(t.isoformat() for t in timestamps)])
+        return quote_etag(hashlib.sha256(source.encode()).hexdigest()[:32]), int(max(timestamps).timestamp())
+
+    def with_validators(self, response, validators):
+        if validators is not None and (200 <= response.status_code < 300 or response.status_code == 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is not None:
+            etag, last_modified = validators
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return self.with_validators(response, validators)
+        return self.with_validators(super().retrieve(request, *args, **kwargs), validators)
+
+    def check_preconditions(self, request):
+        """
+        Return a 412 response if If-Match or If-Unmodified-Since fails, locking the row
+        """
+        validators = self.get_validators(lock=True)
+        if validators is None:
+            return None
+        etag, last_modified = validators
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = self.check_preconditions(request)
+            if response is None:
+                response = super().update(request, *args, **kwargs)
+        if 200 <= response.status_code < 300:
+            # The new validators, for the client's next conditional request
+            response = self.with_validators(response, self.get_validators())
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = self.check_preconditions(request)
+            if response is None:
+                response = super().destroy(request, *args, **kwargs)
+        return response
@@ -0,0 +1,120 @@
+"""
+Keyset pagination for the DRF list endpoints.
+"""
+import json
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class ModelOrderingCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the queryset's ordering
+
+    Uses the view's ordering filter or the ordering already applied to the
+    queryset, falling back to the model's Meta.ordering, and appends the
+    primary key as a tie-breaker so rows sharing a timestamp keep a
+    deterministic position.
+
+    DRF's cursor holds only the leading field and counts tied rows with an
+    offset, which inserts at the tied value shift. Here the cursor holds the
+    value of every ordering field instead, so each row has a unique position
+    and a page is always the rows strictly after the last one seen: inserts
+    ahead of the cursor never shift later pages and deep pages cost the same
+    as the first.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            # Defer to an ordering filter (e.g. ?ordering=) when the view has one
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or queryset.query.order_by or queryset.model._meta.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        return self.with_tie_breaker(tuple(ordering) or ('-pk',))
+
+    @staticmethod
+    def with_tie_breaker(ordering):
+        """
+        Append the primary key in the same direction as the leading field
+        """
+        if ordering[-1].lstrip('-') in ('pk', 'id'):
+            return ordering
+        return ordering + ('-pk' if ordering[0].startswith('-') else 'pk',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset with the filter on the leading
+        # field replaced by a comparison of the whole position
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.after(ordering, current_position))
+
+        # One extra row tells whether there is a page beyond this one
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, ordering, position):
+        """
+        Q for the rows that come after position in ordering
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # (a, b, pk) > (x, y, z) is a > x, or a = x and b > y, or a = x and b = y and pk > z
+        branches, equal = [], Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            branches.append(equal & Q(**{f'{name}__{lookup}': value}))
+            equal &= Q(**{name: value})
+        return reduce(operator.or_, branches)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(str(value))
+        return json.dumps(values)
@@ -0,0 +1,281 @@
+"""
+Sampled per-request profiling.
+
+``ProfilingMiddleware`` profiles a PROFILING_SAMPLE_RATE fraction of
+requests. For each sampled request it records:
+
+- the view name;
+- SQL count and time;
+- queries repeated with the same shape, which is the usual sign of an N+1;
+- time spent producing serializer ``.data`` and the queries run while doing it;
+- the response size.
+
+Samples go into an in-process ring buffer of the last PROFILING_BUFFER_SIZE
+requests and into per-view totals. ``metrics`` serves the totals in the
+Prometheus text format and ``recent_requests`` serves the buffer as JSON.
+Both are per process; Prometheus aggregates across workers when it scrapes.
+"""
+import contextvars
+import functools
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+
+DEFAULT_SAMPLE_RATE = 0.0
+DEFAULT_BUFFER_SIZE = 500
+# Upper bounds in seconds of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# How many repeated query shapes to keep per sample
+DUPLICATES_KEPT = 5
+
+_current = contextvars.ContextVar('levi_profile', default=None)
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(sql):
+    """
+    Reduce a SQL statement to its shape, ignoring parameters and IN list lengths
+    """
+    return _LITERAL.sub('?', _IN_LIST.sub('(...)', sql))
+
+
+class RequestProfile:
+    """
+    Measurements of one sampled request
+    """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.fingerprints = Counter()
+        self.serializer_time = 0.0
+        self.serializer_sql_count = 0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+            if self.serializer_depth:
+                self.serializer_sql_count += 1
+
+    def duplicate_count(self):
+        """
+        Queries repeating the shape of an earlier one, over every shape seen
+        """
+        return sum(count - 1 for count in self.fingerprints.values())
+
+    def duplicates(self):
+        # Only the most repeated shapes are kept in the sample
+        return [
+            {'sql': sql[:500], 'count': count}
+            for sql, count in self.fingerprints.most_common(DUPLICATES_KEPT) if count > 1
+        ]
+
+
+class ProfileStore:
+    """
+    Ring buffer of recent samples plus per-view totals for the metrics endpoint
+    """
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=size)
+        self.totals = {}
+
+    def record(self, sample):
+        key = (sample['view'], sample['method'], str(sample['status']))
+        with self.lock:
+            self.recent.append(sample)
+            totals = self.totals.get(key)
+            if totals is None:
+                totals = self.totals[key] = {
+                    'requests': 0, 'duration': 0.0, 'sql_queries': 0, 'sql_duration': 0.0,
+                    'duplicate_queries': 0, 'serializer_duration': 0.0, 'serializer_queries': 0,
+                    'response_bytes': 0, 'buckets': [0] * len(DURATION_BUCKETS),
+                }
+            totals['requests'] += 1
+            totals['duration'] += sample['duration']
+            totals['sql_queries'] += sample['sql_count']
+            totals['sql_duration'] += sample['sql_time']
+            totals['duplicate_queries'] += sample['duplicate_count']
+            totals['serializer_duration'] += sample['serializer_time']
+            totals['serializer_queries'] += sample['serializer_sql_count']
+            totals['response_bytes'] += sample['response_bytes'] or 0
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if sample['duration'] <= bound:
+                    totals['buckets'][index] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.recent), {
+                key: dict(value, buckets=list(value['buckets'])) for key, value in self.totals.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.recent.clear()
+            self.totals.clear()
+
+
+store = ProfileStore(getattr(settings, 'PROFILING_BUFFER_SIZE', DEFAULT_BUFFER_SIZE))
+
+
+def _timed_data(data_property):
+    """
+    Wrap a serializer ``data`` property to time the outermost evaluation
+    """
+    @functools.wraps(data_property.fget)
+    def data(serializer):
+        profile = _current.get()
+        if profile is None:
+            return data_property.fget(serializer)
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data_property.fget(serializer)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.serializer_time += time.perf_counter() - started
+    return property(data)
+
+
+@functools.lru_cache(maxsize=None)
+def instrument_serializers():
+    """
+    Time ``.data`` on DRF serializers; a no-op outside sampled requests
+    """
+    from rest_framework import serializers
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        cls.data = _timed_data(cls.data)
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests into the module's ProfileStore
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_serializers()
+
+    def __call__(self, request):
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        wrappers = [connection.execute_wrapper(profile) for connection in connections.all()]
+        started = time.perf_counter()
+        try:
+            for wrapper in wrappers:
+                wrapper.__enter__()
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        if match and match.func in (metrics, recent_requests):
+            # Scrapes would otherwise dominate the samples they report on
+            return response
+        store.record({
+            'view': (match.view_name or match._func_path) if match else '<unresolved>',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'started_at': time.time() - duration,
+            'duration': duration,
+            'sql_count': profile.sql_count,
+            'sql_time': profile.sql_time,
+            'duplicate_count': profile.duplicate_count(),
+            'duplicates': profile.duplicates(),
+            'serializer_time': profile.serializer_time,
+            'serializer_sql_count': profile.serializer_sql_count,
+            'response_bytes': None if response.streaming else len(response.content),
+        })
+        return response
+
+
+def _authorized(request):
+    # Scrapers send PROFILING_METRICS_TOKEN; staff can also look from the admin session
+    token = getattr(settings, 'PROFILING_METRICS_TOKEN', '')
+    if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+def _labels(view, method, status):
+    escape = lambda value: value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')  # noqa: E731
+    return f'view="{escape(view)}",method="{escape(method)}",status="{escape(status)}"'
+
+
+METRICS = [
+    ('levi_sampled_requests_total', 'counter', 'Profiled requests', 'requests'),
+    ('levi_sql_queries_total', 'counter', 'SQL queries run by profiled requests', 'sql_queries'),
+    ('levi_sql_duration_seconds_total', 'counter', 'Time spent in SQL by profiled requests', 'sql_duration'),
+    ('levi_sql_duplicate_queries_total', 'counter',
+     'Queries repeating the shape of an earlier query in the same request', 'duplicate_queries'),
+    ('levi_serializer_duration_seconds_total', 'counter',
+     'Time spent producing serializer data in profiled requests', 'serializer_duration'),
+    ('levi_serializer_queries_total', 'counter', 'SQL queries run while producing serializer data',
+     'serializer_queries'),
+    ('levi_response_bytes_total', 'counter', 'Response bytes of profiled requests', 'response_bytes'),
+]
+
+
+def metrics(request):
+    """
+    Per-view profiling totals in the Prometheus text exposition format
+    """
+    if not _authorized(request):
+        return HttpResponseForbidden()
+    _, totals = store.snapshot()
+    lines = [
+        '# HELP levi_profiling_sample_rate Fraction of requests profiled',
+        '# TYPE levi_profiling_sample_rate gauge',
+        f'levi_profiling_sample_rate {getattr(settings, "PROFILING_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)}',
+        '# HELP levi_request_duration_seconds Duration of profiled requests',
+        '# TYPE levi_request_duration_seconds histogram',
+    ]
+    for key, value in sorted(totals.items()):
+        labels = _labels(*key)
+        for bound, count in zip(DURATION_BUCKETS, value['buckets']):
+            lines.append(f'levi_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'levi_request_duration_seconds_bucket{{{labels},le="+Inf"}} {value["requests"]}')
+        lines.append(f'levi_request_duration_seconds_sum{{{labels}}} {value["duration"]}')
+        lines.append(f'levi_request_duration_seconds_count{{{labels}}} {value["requests"]}')
+    for name, kind, help_text, field in METRICS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(totals.items()):
+            lines.append(f'{name}{{{_labels(*key)}}} {value[field]}')
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def recent_requests(request):
+    """
+    The ring buffer of recent profiled requests as JSON, newest first
+    """
+    if not _authorized(request):
+        return HttpResponseForbidden()
+    recent, _ = store.snapshot()
+    return JsonResponse({'requests': recent[::-1]}, json_dumps_params={'default': str})
@@ -0,0 +1,182 @@
+"""
+Query shaping for the DRF endpoints.
+
+Serializers declare the relations they read through ``EagerLoadingMixin`` and
+views using ``EagerLoadingViewMixin`` apply those declarations to every
+queryset they evaluate, so list endpoints issue a fixed number of queries no
+matter how many rows they return.
+
+GET requests can also ask for a sparse fieldset with ``?fields=a,b``. Nested
+fields a serializer lists in ``expandable_fields`` are left out of list
+responses unless ``?expand=`` names them. Only the rendered fields are
+serialized. Relations none of them read are neither joined nor prefetched,
+and columns none of them read are deferred.
+"""
+import functools
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.mixins import ListModelMixin
+
+
+def parse_field_list(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+@functools.lru_cache(maxsize=None)
+def field_sources(serializer_class):
+    """
+    Map each top-level field of a serializer to the attribute paths it reads
+
+    Returns None for a field whose reads can't be known, such as a method
+    field without an entry in the serializer's ``field_dependencies``.
+    """
+    dependencies = getattr(serializer_class, 'field_dependencies', {})
+    sources = {}
+    for name, field in serializer_class().fields.items():
+        if name in dependencies:
+            sources[name] = tuple(path.replace('.', '__') for path in dependencies[name])
+        elif field.source == '*':
+            sources[name] = None
+        else:
+            sources[name] = (field.source.replace('.', '__'),)
+    return sources
+
+
+def rendered_paths(serializer_class, queryset, fields):
+    """
+    The attribute paths the given fields read, or None if that can't be known
+
+    Paths must start at a model field, a relation or an annotation already on
+    the queryset. Anything else may be a property reading arbitrary columns.
+    """
+    sources = field_sources(serializer_class)
+    if any(sources[name] is None for name in fields):
+        return None
+    paths = {path for name in fields for path in sources[name]}
+    known = {field.name for field in queryset.model._meta.get_fields()} | set(queryset.query.annotations)
+    if any(path.split('__')[0] not in known for path in paths):
+        return None
+    return paths
+
+
+def needed_lookup(paths, lookup):
+    """
+    The part of a relation lookup the rendered attribute paths need, or None
+
+    A path ending at or inside the lookup needs all of it, since a nested
+    serializer may read the deeper relations. A path that only passes
+    through its first relations needs just those.
+    """
+    if any(lookup == path or lookup.startswith(f'{path}__') for path in paths):
+        return lookup
+    parts = lookup.split('__')
+    for depth in range(len(parts), 0, -1):
+        prefix = '__'.join(parts[:depth])
+        if any(path.startswith(f'{prefix}__') for path in paths):
+            return prefix
+    return None
+
+
+class EagerLoadingMixin:
+    """
+    Serializer mixin declaring the relations a serializer needs loaded up front
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    # Nested fields list endpoints leave out unless ?expand= names them
+    expandable_fields = ()
+    # Attribute paths read by fields whose source doesn't say, e.g. method fields
+    field_dependencies = {}
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, keep=()):
+        """
+        Apply this serializer's select_related/prefetch_related to a queryset
+
+        fields names the fields being rendered; relations none of them read
+        are skipped and unread columns deferred, except those named in keep.
+        """
+        select_related = cls.select_related_fields
+        prefetch_related = cls.prefetch_related_fields
+        deferred = ()
+        paths = rendered_paths(cls, queryset, fields) if fields is not None else None
+        if paths is not None:
+            select_related = {needed_lookup(paths, lookup) for lookup in select_related} - {None}
+            prefetch_related = [
+                lookup for lookup in prefetch_related
+                if needed_lookup(paths, lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup) is not None
+            ]
+            needed = {path.split('__')[0] for path in (*paths, *select_related, *keep)}
+            deferred = [
+                field.name for field in queryset.model._meta.concrete_fields
+                if not field.primary_key and field.name not in needed and field.attname not in needed
+            ]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+    def get_fields(self):
+        fields = super().get_fields()
+        rendered = self.context.get('rendered_fields')
+        # Only the serializer of the response's own objects, not nested ones
+        parent = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if rendered is not None and parent is None:
+            fields = {name: field for name, field in fields.items() if name in rendered}
+        return fields
+
+
+class EagerLoadingViewMixin:
+    """
+    View mixin shaping the queryset for the view's serializer
+
+    Hooks into filter_queryset so it also covers views that override
+    get_queryset, and applies to both list and detail lookups.
+    """
+
+    def get_rendered_fields(self):
+        """
+        Names of the top-level fields a GET renders, or None for all of them
+        """
+        if hasattr(self, '_rendered_fields'):
+            return self._rendered_fields
+        self._rendered_fields = None
+        serializer_class = self.get_serializer_class()
+        if self.request.method != 'GET' or not issubclass(serializer_class, EagerLoadingMixin):
+            return None
+        available = field_sources(serializer_class).keys()
+        requested = parse_field_list(self.request.query_params.get('fields', ''))
+        expand = parse_field_list(self.request.query_params.get('expand', ''))
+        unknown = (requested | expand) - available
+        if unknown:
+            raise ValidationError({'fields': f'Unknown fields: {", ".join(sorted(unknown))}.'})
+        if requested:
+            self._rendered_fields = requested | expand
+        elif isinstance(self, ListModelMixin) and set(serializer_class.expandable_fields) - expand:
+            self._rendered_fields = set(available) - (set(serializer_class.expandable_fields) - expand)
+        return self._rendered_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['rendered_fields'] = self.get_rendered_fields()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        setup_eager_loading = getattr(self.get_serializer_class(), 'setup_eager_loading', None)
+        if setup_eager_loading is not None:
+            fields = self.get_rendered_fields()
+            keep = ()
+            if fields is not None:
+                # The cursor paginator reads its ordering fields off the last row
+                ordering = [*queryset.query.order_by, *queryset.model._meta.ordering]
+                if hasattr(self.paginator, 'get_ordering'):
+                    ordering += self.paginator.get_ordering(self.request, queryset, self)
+                keep = [name.lstrip('-') for name in ordering if isinstance(name, str)]
+            queryset = setup_eager_loading(queryset, fields=fields, keep=keep)
+        return queryset
@@ -0,0 +1,192 @@
+"""
+Realtime events over websockets.
+
+Clients connect to REALTIME_WEBSOCKET_PATH on the ASGI application. They
+authenticate with an access token, passed in the Authorization header or,
+for browsers that can't set headers on websockets, as ``?token=``. The
+connection then receives a JSON text frame for each event published to its
+user, such as new notifications or booking status changes, so clients no
+longer poll the list endpoints.
+
+``publish`` hands events to the backend named by REALTIME_BACKEND. The
+backend carries them to every process and passes them to that process's
+``Hub``, which fans them out to the local connections of each user.
+``LocalBackend`` only reaches the publishing process, which is enough for a
+single ASGI worker. Deployments with several workers plug in a broker-backed
+backend with the same two methods.
+
+Every connection has a bounded queue (REALTIME_QUEUE_SIZE). When a client
+reads too slowly and its queue fills, the queued events are dropped and
+replaced by one ``{"type": "resync"}`` event. The client reloads its lists
+over HTTP once, and the slow connection costs the server a fixed amount of
+memory.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+WEBSOCKET_PATH = getattr(settings, 'REALTIME_WEBSOCKET_PATH', '/ws/events/')
+QUEUE_SIZE = getattr(settings, 'REALTIME_QUEUE_SIZE', 100)
+RESYNC = json.dumps({'type': 'resync'})
+# Close codes: the 4000 range is free for applications, mirroring HTTP 401 and 404
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+
+
+class Subscription:
+    """
+    One connection's bounded queue of encoded events
+    """
+
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, message):
+        # Runs on the connection's event loop
+        if self.queue.full():
+            while not self.queue.empty():
+                if self.queue.get_nowait() != RESYNC:
+                    self.dropped += 1
+            self.queue.put_nowait(RESYNC)
+        self.queue.put_nowait(message)
+
+
+class Hub:
+    """
+    The connections of this process, by user
+    """
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id, maxsize=QUEUE_SIZE):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), maxsize)
+        with self.lock:
+            self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions[subscription.user_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.user_id]
+
+    def deliver(self, user_ids, message):
+        """
+        Queue an encoded event for the local connections of user_ids, from any thread
+        """
+        with self.lock:
+            targets = [subscription for user_id in user_ids for subscription in self.subscriptions.get(user_id, ())]
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The connection's loop has closed; it unsubscribes as it unwinds
+                pass
+
+
+hub = Hub()
+
+
+class LocalBackend:
+    """
+    Delivers events within this process only
+    """
+
+    def start(self, hub):
+        self.hub = hub
+
+    def publish(self, user_ids, message):
+        self.hub.deliver(user_ids, message)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend = import_string(getattr(settings, 'REALTIME_BACKEND', 'levi_backend.realtime.LocalBackend'))()
+            backend.start(hub)
+            _backend = backend
+    return _backend
+
+
+def publish(user_ids, event):
+    """
+    Send an event to every connection of the given users, in any process
+
+    Call it from transaction.on_commit so clients never hear of rows that
+    were rolled back.
+    """
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id is not None]
+    if user_ids:
+        get_backend().publish(user_ids, json.dumps(event, cls=DjangoJSONEncoder))
+
+
+def authenticate(scope):
+    """
+    Return the active user an ASGI scope's access token names, or None
+    """
+    from users import tokens
+    from users.authentication import user_for_token
+
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization' and value.lower().startswith(b'bearer '):
+            token = value[len(b'bearer '):].decode()
+    if not token:
+        return None
+    try:
+        return user_for_token(token, tokens.ACCESS)
+    except tokens.InvalidToken:
+        return None
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ASGI application streaming a user's events over a websocket
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'] != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    user = await sync_to_async(authenticate)(scope)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    subscription = hub.subscribe(user.pk)
+    try:
+        await send({'type': 'websocket.accept'})
+
+        async def forward():
+            while True:
+                await send({'type': 'websocket.send', 'text': await subscription.queue.get()})
+
+        forwarder = asyncio.ensure_future(forward())
+        try:
+            # Clients have nothing to say; read until they go away
+            while (await receive())['type'] != 'websocket.disconnect':
+                pass
+        finally:
+            forwarder.cancel()
+            await asyncio.gather(forwarder, return_exceptions=True)
+    finally:
+        hub.unsubscribe(subscription)
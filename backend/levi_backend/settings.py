@@ -44,10 +44,12 @@ INSTALLED_APPS = [
     'notifications',
     'payments',
     'media_files',
+    'events',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'levi_backend.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -125,3 +127,82 @@ STATIC_URL = 'static/'
 
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
+
+# Django REST Framework
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.BearerTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'levi_backend.pagination.ModelOrderingCursorPagination',
+    'PAGE_SIZE': 20,
+}
+
+# Signed API tokens (users.tokens); lifetimes in seconds
+AUTH_ACCESS_TOKEN_TTL = 15 * 60
+AUTH_REFRESH_TOKEN_TTL = 14 * 24 * 60 * 60
+AUTH_PRINCIPAL_CACHE_TTL = 60
+
+# Login password checks run in a process pool (users.passwords)
+LOGIN_HASH_WORKERS = 2
+LOGIN_HASH_QUEUE_DEPTH = 16
+LOGIN_HASH_TIMEOUT = 5
+LOGIN_THROTTLE_RATES = {
+    'email': '5/min',
+    'ip': '30/min',
+}
+
+# Seconds a rendered category tree (services.category_tree) stays cached
+CATEGORY_TREE_CACHE_TTL = 24 * 60 * 60
+
+# Seconds a user's unread notification count (notifications.counters) stays cached
+NOTIFICATION_UNREAD_CACHE_TTL = 5 * 60
+# Seconds a user's notification preference mask (notifications.fanout) stays cached
+NOTIFICATION_PREFERENCE_CACHE_TTL = 24 * 60 * 60
+
+# Notification dispatch (notifications.dispatch); backend classes per channel
+NOTIFICATION_BACKENDS = {
+    'email': 'notifications.backends.EmailBackend',
+    'sms': 'notifications.backends.ConsoleBackend',
+    'push': 'notifications.backends.ConsoleBackend',
+    'in_app': 'notifications.backends.InAppBackend',
+}
+# Sends in flight at once per channel
+NOTIFICATION_CHANNEL_CONCURRENCY = {'email': 10, 'sms': 5, 'push': 20, 'in_app': 100}
+NOTIFICATION_DISPATCH_BATCH_SIZE = 500
+# Seconds a dispatcher holds claimed notifications before others may take them over
+NOTIFICATION_LEASE_SECONDS = 120
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_SEND_TIMEOUT = 30
+# Where notifications.backends.FileBackend writes; defaults to BASE_DIR / 'sent_notifications'
+NOTIFICATION_FILE_DIR = ''
+
+# Booking reminders (notifications.reminders); seconds before start_time to remind at
+BOOKING_REMINDER_OFFSETS = [24 * 60 * 60, 60 * 60]
+# Seconds late a reminder may still go out, e.g. after the scheduler was down
+BOOKING_REMINDER_GRACE = 15 * 60
+# Seconds of upcoming bookings the scheduler loads ahead of each offset
+BOOKING_REMINDER_LOOKAHEAD = 10 * 60
+
+# Realtime events over websockets on the ASGI app (levi_backend.realtime)
+REALTIME_WEBSOCKET_PATH = '/ws/events/'
+# Carries events between processes; LocalBackend only reaches its own process
+REALTIME_BACKEND = 'levi_backend.realtime.LocalBackend'
+# Events queued per connection before a slow client is told to resync
+REALTIME_QUEUE_SIZE = 100
+
+# Transactional outbox relay (events.outbox)
+OUTBOX_BATCH_SIZE = 100
+# Failures of one event before its consumer skips it
+OUTBOX_MAX_ATTEMPTS = 5
+# Seconds after which a gap in outbox ids is taken to be a rolled-back transaction;
+# must be well above the longest transaction that emits events
+OUTBOX_SETTLE_SECONDS = 5 * 60
+# Seconds events every consumer has handled are kept
+OUTBOX_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+# Sampled request profiling (levi_backend.profiling), served at /metrics
+PROFILING_SAMPLE_RATE = 0.05
+PROFILING_BUFFER_SIZE = 500
+# Bearer token Prometheus scrapes /metrics with; staff sessions also have access
+PROFILING_METRICS_TOKEN = ''
@@ -0,0 +1,44 @@
+"""
+Test helpers shared by the app test suites.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin asserting that list endpoints do not issue N+1 queries
+    """
+
+    def count_queries(self, url, **params):
+        """
+        Return the number of queries run by a GET request and the captured SQL
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(context), [query['sql'] for query in context.captured_queries]
+
+    def assertQueriesDoNotScale(self, url, grow, sizes=(1, 10), **params):
+        """
+        Assert that GET ``url`` runs the same number of queries at every size
+
+        ``grow(n)`` must create ``n`` more rows visible to the endpoint; it is
+        called before each measurement so the endpoint serves ``sizes[i]`` rows.
+        """
+        created = 0
+        baseline = None
+        for size in sizes:
+            grow(size - created)
+            created = size
+            count, queries = self.count_queries(url, **params)
+            if baseline is None:
+                baseline = (size, count, queries)
+                continue
+            if count != baseline[1]:
+                self.fail(
+                    'Query count for %s grew with page size: %d queries for %d rows, '
+                    '%d queries for %d rows.\nQueries:\n%s' % (
+                        url, baseline[1], baseline[0], count, size, '\n'.join(queries)
+                    )
+                )
@@ -0,0 +1,223 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from bookings.models import Booking, BookingChangeLog
+from notifications.models import Notification
+from services.models import Category, Service, ServiceImage
+from users import tokens
+from users.models import User
+from .profiling import DUPLICATES_KEPT, RequestProfile, fingerprint, store
+from .realtime import CLOSE_UNAUTHORIZED, RESYNC, hub, websocket_application
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_METRICS_TOKEN='scrape-token')
+class ProfilingMiddlewareTests(APITestCase):
+    """
+    Sampled request profiling and the metrics endpoints
+    """
+
+    def setUp(self):
+        store.clear()
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.client.force_authenticate(self.client_user)
+        service = Service.objects.create(
+            provider=self.provider, category=Category.objects.create(name='Plumbing'), title='Pipe Repair',
+            description='Description', price='80.00', duration=60,
+        )
+        start = timezone.now() + timedelta(days=7)
+        for index in range(3):
+            booking = Booking.objects.create(
+                client=self.client_user, provider=self.provider, service=service,
+                start_time=start + timedelta(hours=2 * index), end_time=start + timedelta(hours=2 * index + 1),
+                duration=60, price='80.00', location_type='in_person',
+            )
+            BookingChangeLog.objects.create(
+                booking=booking, previous_status='pending', new_status='confirmed', changed_by=self.provider,
+            )
+        self.booking = booking
+
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'y' LIMIT 5"),
+        )
+
+    def test_sample_records_repeated_queries(self):
+        for _ in range(2):
+            BookingChangeLog.objects.create(
+                booking=self.booking, previous_status='confirmed', new_status='confirmed', changed_by=self.client_user,
+            )
+        self.client.get(reverse('booking-change-log-list', kwargs={'booking_id': self.booking.pk}))
+
+        recent, _ = store.snapshot()
+        sample = recent[-1]
+        self.assertEqual(sample['view'], 'booking-change-log-list')
+        self.assertEqual(sample['status'], 200)
+        self.assertGreater(sample['sql_count'], 0)
+        self.assertGreater(sample['serializer_sql_count'], 0)
+        self.assertGreater(sample['response_bytes'], 0)
+        # One changed_by query per log entry
+        self.assertTrue(any(item['count'] >= 3 for item in sample['duplicates']))
+
+    def test_duplicates_are_counted_beyond_the_kept_shapes(self):
+        profile = RequestProfile()
+        for index in range(DUPLICATES_KEPT + 2):
+            for _ in range(2):
+                profile(lambda *args: None, f'SELECT * FROM table_{"x" * index}', None, False, {})
+        self.assertEqual(len(profile.duplicates()), DUPLICATES_KEPT)
+        self.assertEqual(profile.duplicate_count(), DUPLICATES_KEPT + 2)
+
+    def test_metrics_require_token_or_staff(self):
+        self.client.get(reverse('booking-list'))
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics-recent-requests')).status_code, 403)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        body = response.content.decode()
+        labels = 'view="booking-list",method="GET",status="200"'
+        self.assertIn(f'levi_sampled_requests_total{{{labels}}} 1', body)
+        self.assertIn(f'levi_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', body)
+        self.assertIn(f'levi_sql_duplicate_queries_total{{{labels}}}', body)
+
+        # The metrics views are plain Django views, so staff sign in with a session
+        self.client.force_login(User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', is_staff=True,
+        ))
+        response = self.client.get(reverse('metrics-recent-requests'))
+        self.assertEqual(response.json()['requests'][0]['view'], 'booking-list')
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get(reverse('booking-list'))
+        self.assertEqual(store.snapshot(), ([], {}))
+
+
+class ConditionalRequestTests(APITestCase):
+    """
+    ETag and Last-Modified validators on the detail endpoints
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.client.force_authenticate(self.provider)
+        self.service = Service.objects.create(
+            provider=self.provider, category=Category.objects.create(name='Plumbing'), title='Pipe Repair',
+            description='Description', price='80.00', duration=60,
+        )
+        self.url = reverse('service-detail', kwargs={'pk': self.service.pk})
+
+    def test_matching_validators_get_304_without_serializing(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_nested_and_joined_changes_move_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        ServiceImage.objects.create(service=self.service, image='service_images/example.jpg')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(self.url)['ETag']
+        self.provider.first_name = 'Kofi'
+        self.provider.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_match_guards_updates(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'title': 'Leak Repair'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # A second writer still holding the old ETag must not overwrite the first
+        response = self.client.patch(self.url, {'title': 'Tap Repair'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.title, 'Leak Repair')
+        self.assertEqual(self.client.delete(self.url, HTTP_IF_MATCH=etag).status_code, 412)
+
+
+class RealtimeTests(TestCase):
+    """
+    The websocket event stream and its per-connection backpressure
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.service = Service.objects.create(
+            provider=self.provider, category=Category.objects.create(name='Plumbing'), title='Pipe Repair',
+            description='Description', price='80.00', duration=60,
+        )
+
+    def connect(self, query_string=b''):
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        inbox.put_nowait({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': '/ws/events/', 'query_string': query_string, 'headers': []}
+        task = asyncio.ensure_future(websocket_application(scope, inbox.get, outbox.put))
+        return task, inbox, outbox
+
+    def create_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(
+                recipient=self.user, type='system_alert', channel='in_app', title='Alert', message='Message',
+            )
+            Notification.objects.create(
+                recipient=self.provider, type='system_alert', channel='in_app', title='Other', message='Message',
+            )
+            start = timezone.now() + timedelta(days=7)
+            booking = Booking.objects.create(
+                client=self.user, provider=self.provider, service=self.service, start_time=start,
+                end_time=start + timedelta(hours=1), duration=60, price='80.00', location_type='in_person',
+            )
+            BookingChangeLog.objects.create(
+                booking=booking, previous_status='pending', new_status='confirmed', changed_by=self.provider,
+            )
+
+    async def test_streams_the_users_events(self):
+        token = await sync_to_async(tokens.issue)(self.user, tokens.ACCESS)
+        task, inbox, outbox = self.connect(f'token={token}'.encode())
+        self.assertEqual(await asyncio.wait_for(outbox.get(), 1), {'type': 'websocket.accept'})
+
+        await sync_to_async(self.create_events)()
+        first = json.loads((await asyncio.wait_for(outbox.get(), 1))['text'])
+        second = json.loads((await asyncio.wait_for(outbox.get(), 1))['text'])
+        self.assertEqual((first['type'], first['notification']['title']), ('notification', 'Alert'))
+        self.assertEqual((second['type'], second['new_status']), ('booking_status', 'confirmed'))
+        self.assertTrue(outbox.empty())
+
+        await inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(task, 1)
+        self.assertNotIn(self.user.pk, hub.subscriptions)
+
+    async def test_rejects_connections_without_a_valid_token(self):
+        for query_string in (b'', b'token=forged.token'):
+            task, _, outbox = self.connect(query_string)
+            await asyncio.wait_for(task, 1)
+            self.assertEqual(await outbox.get(), {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+
+    async def test_slow_connection_is_told_to_resync(self):
+        subscription = hub.subscribe(self.user.pk, maxsize=2)
+        try:
+            for message in ('a', 'b', 'c', 'd'):
+                subscription.offer(message)
+            queued = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+            self.assertEqual(queued, [RESYNC, 'd'])
+            self.assertEqual(subscription.dropped, 3)
+        finally:
+            hub.unsubscribe(subscription)
@@ -16,9 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
+from . import profiling
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', profiling.metrics, name='metrics'),
+    path('metrics/requests/', profiling.recent_requests, name='metrics-recent-requests'),
     path('api/users/', include('users.urls')),
     path('api/services/', include('services.urls')),
     path('api/bookings/', include('bookings.urls')),
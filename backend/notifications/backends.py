@@ -0,0 +1,126 @@
+"""
+Delivery backends for the notification dispatcher.
+
+The NOTIFICATION_BACKENDS setting maps each channel to a backend class.
+Backends receive plain ``Message`` values rather than model instances, so
+they never touch the database from the dispatcher's event loop. A backend
+signals failure by raising: ``PermanentFailure`` when retrying can't help,
+and any other exception for a failure worth retrying.
+
+Only email goes anywhere real, through Django's email framework, so
+EMAIL_BACKEND decides whether it reaches SMTP, the console or files. SMS
+and push use the console or file stand-ins until a provider is wired in.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKENDS = {
+    'email': 'notifications.backends.EmailBackend',
+    'sms': 'notifications.backends.ConsoleBackend',
+    'push': 'notifications.backends.ConsoleBackend',
+    'in_app': 'notifications.backends.InAppBackend',
+}
+
+
+class PermanentFailure(Exception):
+    """
+    A notification that can never be delivered, e.g. no address to send to
+    """
+
+
+@dataclass(frozen=True)
+class Message:
+    id: int
+    channel: str
+    recipient_id: int
+    email: str
+    phone_number: str
+    title: str
+    body: str
+    data: dict = field(default_factory=dict)
+
+
+class BaseBackend:
+    """
+    Sends messages for one channel
+    """
+    # Whether a successful send means the user has it (in-app) or only that it left us
+    delivers = False
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, message):
+        raise NotImplementedError
+
+
+class InAppBackend(BaseBackend):
+    """
+    In-app notifications are delivered by being stored; there is nothing to send
+    """
+    delivers = True
+
+    async def send(self, message):
+        return None
+
+
+class EmailBackend(BaseBackend):
+    """
+    Email through Django's EMAIL_BACKEND, run in a thread since it blocks
+    """
+
+    async def send(self, message):
+        if not message.email:
+            raise PermanentFailure('Recipient has no email address')
+        email = EmailMessage(subject=message.title, body=message.body, to=[message.email])
+        await asyncio.to_thread(email.send)
+
+
+class ConsoleBackend(BaseBackend):
+    """
+    Write each message as a line of JSON to stdout
+    """
+    lock = threading.Lock()
+
+    async def send(self, message):
+        line = json.dumps(asdict(message), default=str)
+        with self.lock:
+            sys.stdout.write(f'{line}\n')
+
+
+class FileBackend(BaseBackend):
+    """
+    Append each message as a line of JSON to <NOTIFICATION_FILE_DIR>/<channel>.jsonl
+    """
+    lock = threading.Lock()
+
+    def __init__(self, channel, directory=None):
+        super().__init__(channel)
+        directory = directory or getattr(settings, 'NOTIFICATION_FILE_DIR', None)
+        if not directory:
+            directory = os.path.join(settings.BASE_DIR, 'sent_notifications')
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{channel}.jsonl')
+
+    def write(self, line):
+        with self.lock, open(self.path, 'a') as handle:
+            handle.write(f'{line}\n')
+
+    async def send(self, message):
+        await asyncio.to_thread(self.write, json.dumps(asdict(message), default=str))
+
+
+def get_backend(channel):
+    """
+    Instantiate the backend configured for a channel
+    """
+    backends = {**DEFAULT_BACKENDS, **getattr(settings, 'NOTIFICATION_BACKENDS', {})}
+    return import_string(backends[channel])(channel)
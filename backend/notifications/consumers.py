@@ -0,0 +1,59 @@
+"""
+Outbox consumers creating notifications for domain events (events.outbox)
+
+They run in the outbox relay rather than the request that made the change.
+Each notification is keyed by the event, so a redelivered event adds nothing.
+"""
+from bookings.models import Booking, BookingStatus
+from events.outbox import consumer
+from payments.models import PaymentStatus
+from reviews.models import Review
+from services.models import Service
+from users.models import User
+from .fanout import notify
+from .models import NotificationType
+
+
+def notify_users(event, user_ids, notification_type, title, message, data):
+    for user in User.objects.filter(pk__in=user_ids, is_active=True):
+        notify(user, notification_type, title, message, data=data, idempotency_key=f'outbox:{event.pk}:{user.pk}')
+
+
+@consumer('notifications.bookings', topics=['booking.status_changed'])
+def notify_booking_status(event):
+    payload = event.payload
+    service = Service.objects.filter(pk=payload['service']).values_list('title', flat=True).first()
+    data = {'booking_id': payload['booking']}
+    if payload['status'] == BookingStatus.CONFIRMED:
+        notify_users(event, [payload['client']], NotificationType.BOOKING_CONFIRMED, 'Booking confirmed',
+                     f'Your booking for {service} has been confirmed.', data)
+    elif payload['status'] == BookingStatus.CANCELLED:
+        notify_users(event, [payload['client'], payload['provider']], NotificationType.BOOKING_CANCELLED,
+                     'Booking cancelled', f'The booking for {service} has been cancelled.', data)
+
+
+@consumer('notifications.payments', topics=['payment.status_changed'])
+def notify_payment_status(event):
+    payload = event.payload
+    if payload['status'] not in (PaymentStatus.COMPLETED, PaymentStatus.FAILED):
+        return
+    booking = Booking.objects.filter(pk=payload['booking']).values('client', 'service__title').first()
+    if booking is None:
+        return
+    data = {'payment_id': payload['payment'], 'booking_id': payload['booking']}
+    amount = f'{payload["amount"]} {payload["currency"]}'
+    if payload['status'] == PaymentStatus.COMPLETED:
+        notify_users(event, [booking['client']], NotificationType.PAYMENT_CONFIRMED, 'Payment received',
+                     f'Your payment of {amount} for {booking["service__title"]} went through.', data)
+    else:
+        notify_users(event, [booking['client']], NotificationType.PAYMENT_FAILED, 'Payment failed',
+                     f'Your payment of {amount} for {booking["service__title"]} failed.', data)
+
+
+@consumer('notifications.reviews', topics=['review.saved'])
+def notify_new_review(event):
+    payload = event.payload
+    if not payload['created'] or not Review.objects.filter(pk=payload['review']).exists():
+        return
+    notify_users(event, [payload['reviewee']], NotificationType.NEW_REVIEW, 'New review',
+                 f'You received a new {payload["rating"]}-star review.', {'review_id': payload['review']})
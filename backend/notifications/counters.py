@@ -0,0 +1,131 @@
+"""
+Maintenance of the per-user unread notification counter.
+
+``NotificationCounter.unread`` is the number of notifications with
+is_read=False for a user. Signals adjust it when notifications are created,
+saved or deleted, and bulk mark-as-read passes the rows its UPDATE touched.
+Every adjustment is a single F() UPDATE, so concurrent changes never lose
+a count. The current value is cached per user; each change drops the cached
+value once its transaction commits, so a badge poll is a cache hit between
+changes.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter
+
+# Seconds an unread count stays cached; bounds staleness on per-process caches
+UNREAD_CACHE_TTL = getattr(settings, 'NOTIFICATION_UNREAD_CACHE_TTL', 300)
+
+
+def unread_cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def count_unread(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def apply_unread_change(user_id, delta):
+    """
+    Add delta (negative for reads) to a user's unread counter
+    """
+    if not delta:
+        return
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(
+        unread=Greatest(F('unread') + delta, Value(0))
+    )
+    if not updated:
+        # No counter yet; start it from the table, which already includes this change
+        NotificationCounter.objects.get_or_create(user_id=user_id, defaults={'unread': count_unread(user_id)})
+    transaction.on_commit(lambda: cache.delete(unread_cache_key(user_id)))
+
+
+def apply_unread_changes(deltas):
+    """
+    Apply {user_id: delta} to many counters at once, with one UPDATE per distinct delta
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    existing = set(NotificationCounter.objects.filter(user_id__in=deltas).values_list('user_id', flat=True))
+    by_delta = defaultdict(list)
+    for user_id in existing:
+        by_delta[deltas[user_id]].append(user_id)
+    for delta, user_ids in by_delta.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread=Greatest(F('unread') + delta, Value(0))
+        )
+    missing = deltas.keys() - existing
+    if missing:
+        # No counters yet; start them from the table, which already includes these changes
+        counted = Notification.objects.filter(recipient_id__in=missing, is_read=False).order_by().values(
+            'recipient'
+        ).annotate(total=Count('pk')).values_list('recipient', 'total')
+        totals = dict(counted)
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id, unread=totals.get(user_id, 0)) for user_id in missing],
+            ignore_conflicts=True,
+        )
+    keys = [unread_cache_key(user_id) for user_id in deltas]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def unread_count(user_id):
+    """
+    Return the number of unread notifications for a user, from cache when possible
+    """
+    key = unread_cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first() or 0
+        cache.set(key, count, UNREAD_CACHE_TTL)
+    return count
+
+
+def rebuild_unread_counts(user_ids=None, batch_size=1000):
+    """
+    Recompute the unread counters from the notifications table, returning the number corrected
+    """
+    counted = Notification.objects.filter(is_read=False)
+    counters = NotificationCounter.objects.all()
+    if user_ids:
+        counted = counted.filter(recipient_id__in=user_ids)
+        counters = counters.filter(user_id__in=user_ids)
+    actual = dict(counted.order_by().values('recipient').annotate(total=Count('pk')).values_list('recipient', 'total'))
+    stored = dict(counters.values_list('user_id', 'unread'))
+
+    stale = [
+        NotificationCounter(user_id=user_id, unread=actual.get(user_id, 0))
+        for user_id in actual.keys() | stored.keys()
+        if actual.get(user_id, 0) != stored.get(user_id)
+    ]
+    NotificationCounter.objects.bulk_create(
+        stale, batch_size=batch_size, update_conflicts=True, unique_fields=['user'], update_fields=['unread'],
+    )
+    cache.delete_many([unread_cache_key(counter.user_id) for counter in stale])
+    return len(stale)
+
+
+def mark_read(user_id, ids=None, before=None):
+    """
+    Mark a user's unread notifications read with one UPDATE, by id or created before a time
+
+    Returns the number of notifications marked.
+    """
+    notifications = Notification.objects.filter(recipient_id=user_id, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    if before is not None:
+        notifications = notifications.filter(created_at__lte=before)
+    now = timezone.now()
+    with transaction.atomic():
+        marked = notifications.update(is_read=True, read_at=now, updated_at=now)
+        apply_unread_change(user_id, -marked)
+    return marked
@@ -0,0 +1,223 @@
+"""
+Dispatch of pending notifications.
+
+A ``Dispatcher`` repeatedly claims a batch of pending notifications, sends
+them through the channel backends and records the outcome.
+
+Claiming sets a lease: ``claimed_by`` is a token unique to the batch and
+``lease_expires_at`` is when other dispatchers may take the rows over. The
+claiming UPDATE re-checks that each row is still claimable, so concurrent
+dispatchers never share a row even on SQLite. On PostgreSQL the candidate
+rows are also selected with FOR UPDATE SKIP LOCKED, so dispatchers pass
+over each other's rows instead of waiting for them. A dispatcher that dies
+mid-batch only delays its rows until the lease runs out. While a batch is
+being sent its lease is renewed every third of NOTIFICATION_LEASE_SECONDS,
+so a slow batch keeps its rows however long the sends take.
+
+Each batch is sent from an asyncio event loop with a semaphore per channel,
+limiting how many sends run at once (NOTIFICATION_CHANNEL_CONCURRENCY).
+Outcomes are written back with one UPDATE per group of rows getting the same
+values, each limited to rows still claimed by the batch's token. Rows whose
+lease was taken over anyway are left to their new owner and counted as
+``lost``. Failed sends are retried with exponential backoff
+up to NOTIFICATION_MAX_ATTEMPTS, and ``PermanentFailure`` fails a row at once.
+"""
+import asyncio
+import time
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .backends import Message, PermanentFailure, get_backend
+from .models import Notification, NotificationStatus
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_SEND_TIMEOUT = 30
+DEFAULT_CONCURRENCY = 10
+# Seconds before the first retry; doubles with every further attempt
+RETRY_BASE_DELAY = 30
+
+
+def claimable(now):
+    return Q(status=NotificationStatus.PENDING) & (Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now))
+
+
+def to_message(notification):
+    recipient = notification.recipient
+    return Message(
+        id=notification.pk,
+        channel=notification.channel,
+        recipient_id=recipient.pk,
+        email=recipient.email,
+        phone_number=recipient.phone_number,
+        title=notification.title,
+        body=notification.message,
+        data=notification.data,
+    )
+
+
+class Dispatcher:
+    """
+    Claims, sends and records batches of pending notifications
+    """
+
+    def __init__(self, batch_size=None, lease_seconds=None, backends=None):
+        self.batch_size = batch_size or getattr(settings, 'NOTIFICATION_DISPATCH_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.lease = timedelta(seconds=lease_seconds or getattr(
+            settings, 'NOTIFICATION_LEASE_SECONDS', DEFAULT_LEASE_SECONDS
+        ))
+        self.max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+        self.send_timeout = getattr(settings, 'NOTIFICATION_SEND_TIMEOUT', DEFAULT_SEND_TIMEOUT)
+        self.concurrency = getattr(settings, 'NOTIFICATION_CHANNEL_CONCURRENCY', {})
+        # Backend instances per channel; channels not given use NOTIFICATION_BACKENDS
+        self.backends = dict(backends or {})
+        self.stats = {'sent': 0, 'delivered': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+
+    def backend(self, channel):
+        if channel not in self.backends:
+            self.backends[channel] = get_backend(channel)
+        return self.backends[channel]
+
+    def claim(self):
+        """
+        Lease up to batch_size pending notifications, returning (token, notifications)
+        """
+        token = uuid.uuid4().hex
+        now = timezone.now()
+        with transaction.atomic():
+            candidates = Notification.objects.filter(claimable(now)).order_by('created_at')
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return token, []
+            Notification.objects.filter(claimable(now), pk__in=ids).update(
+                claimed_by=token, lease_expires_at=now + self.lease,
+            )
+        claimed = Notification.objects.filter(pk__in=ids, claimed_by=token).select_related('recipient')
+        return token, list(claimed)
+
+    def renew(self, token):
+        """
+        Extend the lease on the rows still claimed by token, returning how many there are
+        """
+        return Notification.objects.filter(claimed_by=token, status=NotificationStatus.PENDING).update(
+            lease_expires_at=timezone.now() + self.lease,
+        )
+
+    async def send_leased(self, token, messages):
+        """
+        Send messages with send_all, renewing the batch's lease until they are done
+        """
+        async def keep_lease():
+            while True:
+                await asyncio.sleep(self.lease.total_seconds() / 3)
+                await sync_to_async(self.renew)(token)
+
+        renewal = asyncio.create_task(keep_lease())
+        try:
+            return await self.send_all(messages)
+        finally:
+            renewal.cancel()
+
+    async def send_all(self, messages):
+        """
+        Send messages with per-channel concurrency limits, returning {id: exception or None}
+        """
+        semaphores = {
+            channel: asyncio.Semaphore(self.concurrency.get(channel, DEFAULT_CONCURRENCY))
+            for channel in {message.channel for message in messages}
+        }
+
+        async def send(message):
+            async with semaphores[message.channel]:
+                try:
+                    await asyncio.wait_for(self.backend(message.channel).send(message), self.send_timeout)
+                except Exception as error:
+                    return message.id, error
+                return message.id, None
+
+        return dict(await asyncio.gather(*(send(message) for message in messages)))
+
+    def dispatch_batch(self):
+        """
+        Claim, send and record one batch, returning the number of notifications processed
+        """
+        token, notifications = self.claim()
+        if not notifications:
+            return 0
+        # Backends are created here, outside the event loop, since they may read settings or files
+        for channel in {notification.channel for notification in notifications}:
+            self.backend(channel)
+        outcomes = asyncio.run(self.send_leased(token, [to_message(notification) for notification in notifications]))
+        self.record(token, notifications, outcomes)
+        return len(notifications)
+
+    def record(self, token, notifications, outcomes):
+        """
+        Write the outcome of a batch back, only to the rows this batch still holds
+        """
+        now = timezone.now()
+        sent, delivered = [], []
+        # (status, attempts, failure_reason, failed_at, lease_expires_at) -> ids
+        failures = {}
+        for notification in notifications:
+            error = outcomes[notification.pk]
+            if error is None:
+                (delivered if self.backend(notification.channel).delivers else sent).append(notification.pk)
+                continue
+            attempts = notification.attempts + 1
+            reason = f'{type(error).__name__}: {error}'[:1000]
+            if isinstance(error, PermanentFailure) or attempts >= self.max_attempts:
+                outcome = (NotificationStatus.FAILED, attempts, reason, now, None)
+            else:
+                # Back to pending, claimable again once the backoff has passed
+                retry_at = now + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (attempts - 1))
+                outcome = (NotificationStatus.PENDING, attempts, reason, None, retry_at)
+            failures.setdefault(outcome, []).append(notification.pk)
+
+        recorded = 0
+        with transaction.atomic():
+            ours = Notification.objects.filter(claimed_by=token)
+            if sent:
+                updated = ours.filter(pk__in=sent).update(
+                    status=NotificationStatus.SENT, sent_at=now, claimed_by='', lease_expires_at=None, updated_at=now,
+                )
+                self.stats['sent'] += updated
+                recorded += updated
+            if delivered:
+                updated = ours.filter(pk__in=delivered).update(
+                    status=NotificationStatus.DELIVERED, sent_at=now, delivered_at=now, claimed_by='',
+                    lease_expires_at=None, updated_at=now,
+                )
+                self.stats['delivered'] += updated
+                recorded += updated
+            for (status, attempts, reason, failed_at, lease_expires_at), ids in failures.items():
+                updated = ours.filter(pk__in=ids).update(
+                    status=status, attempts=attempts, failure_reason=reason, failed_at=failed_at, claimed_by='',
+                    lease_expires_at=lease_expires_at, updated_at=now,
+                )
+                self.stats['failed' if status == NotificationStatus.FAILED else 'retried'] += updated
+                recorded += updated
+        # Rows another dispatcher took over after the lease ran out; their outcome is its to record
+        self.stats['lost'] += len(notifications) - recorded
+
+    def run(self, once=False, poll_interval=1.0, stop=None):
+        """
+        Dispatch batches until nothing is pending (once) or until stop() returns True
+        """
+        while True:
+            processed = self.dispatch_batch()
+            if stop is not None and stop():
+                return
+            if not processed:
+                if once:
+                    return
+                time.sleep(poll_interval)
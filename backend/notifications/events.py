@@ -0,0 +1,28 @@
+"""
+Realtime events for notifications, pushed to recipients' websockets (levi_backend.realtime)
+"""
+from levi_backend.realtime import publish
+
+
+def notification_event(notification):
+    return {
+        'type': 'notification',
+        'notification': {
+            'id': notification.pk,
+            'type': notification.type,
+            'channel': notification.channel,
+            'title': notification.title,
+            'message': notification.message,
+            'data': notification.data,
+            'is_read': notification.is_read,
+            'created_at': notification.created_at,
+        },
+    }
+
+
+def publish_notifications(notifications):
+    """
+    Push new notifications to their recipients' connections, as the notification list would show them
+    """
+    for notification in notifications:
+        publish([notification.recipient_id], notification_event(notification))
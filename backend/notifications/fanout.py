@@ -0,0 +1,171 @@
+"""
+Preference-aware creation of notifications.
+
+A user's ``UserNotificationPreference`` switches are packed into a bitmask:
+one bit per channel and one per notification category. Users without a
+preferences row get the model's field defaults. The same mask expression
+serves both paths here:
+
+- ``notify`` creates one user's notifications, reading that user's mask
+  from the cache (dropped whenever their preferences change).
+- ``fan_out`` creates a notification for every eligible user in an audience
+  queryset. The mask is computed in SQL over a join of users and
+  preferences, ineligible users are filtered out there, and only
+  (user id, mask) pairs reach Python. Recipients are walked in primary-key
+  order in chunks, each chunk bulk-created and committed on its own, so a
+  large campaign holds no long transaction and never loads user objects.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+
+from users.models import User
+from .counters import apply_unread_changes
+from .events import publish_notifications
+from .models import Notification, NotificationChannel, NotificationType, UserNotificationPreference
+
+# Seconds a user's preference mask stays cached
+PREFERENCE_CACHE_TTL = getattr(settings, 'NOTIFICATION_PREFERENCE_CACHE_TTL', 24 * 60 * 60)
+
+CHANNEL_FIELDS = {
+    NotificationChannel.EMAIL: 'email_notifications_enabled',
+    NotificationChannel.SMS: 'sms_notifications_enabled',
+    NotificationChannel.PUSH: 'push_notifications_enabled',
+    NotificationChannel.IN_APP: 'in_app_notifications_enabled',
+}
+# The category switch each type is subject to; types not listed can't be switched off
+TYPE_FIELDS = {
+    NotificationType.BOOKING_CONFIRMED: 'booking_notifications',
+    NotificationType.BOOKING_CANCELLED: 'booking_notifications',
+    NotificationType.BOOKING_REMINDER: 'booking_notifications',
+    NotificationType.PAYMENT_CONFIRMED: 'booking_notifications',
+    NotificationType.PAYMENT_FAILED: 'booking_notifications',
+    NotificationType.NEW_REVIEW: 'review_notifications',
+    NotificationType.PROMOTION: 'promotion_notifications',
+    NotificationType.SYSTEM_ALERT: 'system_notifications',
+}
+PREFERENCE_FIELDS = [*CHANNEL_FIELDS.values(), *dict.fromkeys(TYPE_FIELDS.values())]
+BITS = {name: 1 << index for index, name in enumerate(PREFERENCE_FIELDS)}
+DEFAULT_MASK = sum(BITS[name] for name in PREFERENCE_FIELDS if UserNotificationPreference._meta.get_field(name).default)
+
+
+def preference_cache_key(user_id):
+    return f'notifications:preferences:{user_id}'
+
+
+def mask_expression(prefix='notification_preferences'):
+    """
+    SQL expression for the preference mask of the user rows of a queryset
+    """
+    bits = [
+        Case(When(**{f'{prefix}__{name}': True}, then=Value(bit)), default=Value(0))
+        for name, bit in BITS.items()
+    ]
+    return Case(When(**{f'{prefix}__isnull': True}, then=Value(DEFAULT_MASK)), default=sum(bits[1:], bits[0]))
+
+
+def preference_mask(user_id):
+    """
+    Return a user's preference mask, from cache when possible
+    """
+    key = preference_cache_key(user_id)
+    mask = cache.get(key)
+    if mask is None:
+        mask = User.objects.filter(pk=user_id).annotate(mask=mask_expression()).values_list('mask', flat=True).first()
+        mask = DEFAULT_MASK if mask is None else mask
+        cache.set(key, mask, PREFERENCE_CACHE_TTL)
+    return mask
+
+
+def invalidate_preference_mask(user_id):
+    transaction.on_commit(lambda: cache.delete(preference_cache_key(user_id)))
+
+
+def type_bit(notification_type):
+    return BITS[TYPE_FIELDS[notification_type]] if notification_type in TYPE_FIELDS else 0
+
+
+def eligible_channels(mask, notification_type, channels):
+    """
+    The channels out of ``channels`` a user with this mask receives the type on
+    """
+    if mask & type_bit(notification_type) != type_bit(notification_type):
+        return []
+    return [channel for channel in channels if mask & BITS[CHANNEL_FIELDS[channel]]]
+
+
+def notify(user, notification_type, title, message, data=None, channels=None, idempotency_key=None):
+    """
+    Create a user's notifications on the channels their preferences allow, returning them
+
+    With an idempotency_key, channels already notified under that key are
+    skipped, so a repeated call creates nothing new, even one racing this one.
+    """
+    channels = eligible_channels(preference_mask(user.pk), notification_type, channels or NotificationChannel.values)
+    keys = {channel: f'{idempotency_key}:{channel}' if idempotency_key else None for channel in channels}
+    existing = set()
+    if idempotency_key:
+        existing = set(Notification.objects.filter(idempotency_key__in=keys.values()).values_list(
+            'idempotency_key', flat=True,
+        ))
+    created = []
+    for channel, key in keys.items():
+        if key in existing:
+            continue
+        try:
+            # A concurrent call with the same key only rolls back its own duplicate
+            with transaction.atomic():
+                created.append(Notification.objects.create(
+                    recipient=user, type=notification_type, channel=channel, title=title, message=message,
+                    data=data or {}, idempotency_key=key,
+                ))
+        except IntegrityError:
+            if key is None:
+                raise
+    return created
+
+
+def fan_out(audience, notification_type, title, message, data=None, channels=None, chunk_size=1000):
+    """
+    Notify every active user of an audience queryset on their allowed channels
+
+    Returns the number of notifications created. Each chunk commits on its
+    own, so an interrupted campaign keeps the chunks already written.
+    """
+    channels = channels or NotificationChannel.values
+    channel_bits = sum(BITS[CHANNEL_FIELDS[channel]] for channel in channels)
+    required = type_bit(notification_type)
+    recipients = User.objects.filter(pk__in=audience.values('pk'), is_active=True).alias(
+        preference_mask=mask_expression(),
+    ).alias(
+        channel_matches=F('preference_mask').bitand(channel_bits),
+        type_matches=F('preference_mask').bitand(required),
+    ).filter(channel_matches__gt=0, type_matches=required).order_by('pk')
+
+    created = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            recipients.filter(pk__gt=last_pk).annotate(mask=F('preference_mask')).values_list('pk', 'mask')[:chunk_size]
+        )
+        if not chunk:
+            return created
+        rows = [
+            Notification(
+                recipient_id=user_id, type=notification_type, channel=channel, title=title, message=message,
+                data=data or {},
+            )
+            for user_id, mask in chunk
+            for channel in eligible_channels(mask, notification_type, channels)
+        ]
+        deltas = {}
+        for row in rows:
+            deltas[row.recipient_id] = deltas.get(row.recipient_id, 0) + 1
+        # bulk_create skips the signals keeping unread counters and pushing events, so do both here
+        with transaction.atomic():
+            Notification.objects.bulk_create(rows, batch_size=chunk_size)
+            apply_unread_changes(deltas)
+            transaction.on_commit(lambda rows=rows: publish_notifications(rows))
+        created += len(rows)
+        last_pk = chunk[-1][0]
@@ -0,0 +1,80 @@
+import signal
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from notifications.backends import FileBackend, InAppBackend
+from notifications.dispatch import Dispatcher
+from notifications.models import Notification, NotificationChannel, NotificationStatus
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Send pending notifications through the channel backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Notifications claimed per batch (default NOTIFICATION_DISPATCH_BATCH_SIZE)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once nothing is left to claim instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when nothing is pending')
+        parser.add_argument('--benchmark', type=int, default=0, metavar='N',
+                            help='Create N synthetic notifications, send them to files and report throughput')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'], options['batch_size'])
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        dispatcher = Dispatcher(batch_size=options['batch_size'])
+        started = time.perf_counter()
+        try:
+            dispatcher.run(once=options['once'], poll_interval=options['poll_interval'], stop=lambda: stopping)
+        except KeyboardInterrupt:
+            pass
+        self.report(dispatcher, time.perf_counter() - started)
+
+    def benchmark(self, count, batch_size):
+        recipients = list(User.objects.order_by('pk')[:100])
+        if not recipients:
+            recipients = [User.objects.create_user(username='dispatch-benchmark', email='bench@example.com')]
+        channels = NotificationChannel.values
+        # Created read so they never touch the unread counters; bulk_create sends no signals
+        created = Notification.objects.bulk_create([
+            Notification(
+                recipient=recipients[index % len(recipients)], type='system_alert',
+                channel=channels[index % len(channels)], title=f'Benchmark {index}',
+                message='Dispatch benchmark notification', data={'benchmark': True}, is_read=True,
+            )
+            for index in range(count)
+        ], batch_size=1000)
+        ids = [notification.pk for notification in created]
+
+        with tempfile.TemporaryDirectory() as directory:
+            backends = {
+                channel: InAppBackend(channel) if channel == 'in_app' else FileBackend(channel, directory)
+                for channel in channels
+            }
+            dispatcher = Dispatcher(batch_size=batch_size, backends=backends)
+            started = time.perf_counter()
+            dispatcher.run(once=True)
+            elapsed = time.perf_counter() - started
+
+        left = Notification.objects.filter(pk__in=ids, status=NotificationStatus.PENDING).count()
+        Notification.objects.filter(pk__in=ids).delete()
+        self.report(dispatcher, elapsed)
+        if left:
+            self.stdout.write(self.style.WARNING(f'{left} benchmark notifications were not sent'))
+
+    def report(self, dispatcher, elapsed):
+        stats = dispatcher.stats
+        processed = sum(stats.values())
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} notifications in {elapsed:.2f}s ({rate:.0f} notifications/sec): '
+            f'{stats["sent"]} sent, {stats["delivered"]} delivered, '
+            f'{stats["retried"]} to retry, {stats["failed"]} failed, '
+            f'{stats["lost"]} lost to another dispatcher'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from notifications.counters import rebuild_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized unread notification counters from the notifications table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild the given user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_unread_counts(
+            user_ids=options['user_ids'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Corrected unread counts for {rebuilt} users'))
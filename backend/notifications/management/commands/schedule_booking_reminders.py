@@ -0,0 +1,30 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from notifications.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = 'Create booking reminder notifications as bookings approach their start time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Send the reminders due now and exit instead of running continuously')
+        parser.add_argument('--poll-interval', type=float, default=30.0,
+                            help='Most seconds between checks for new or changed bookings')
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler()
+        if options['once']:
+            scheduler.tick()
+        else:
+            stopping = []
+            signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+            try:
+                scheduler.run(poll_interval=options['poll_interval'], stop=lambda: stopping)
+            except KeyboardInterrupt:
+                pass
+        stats = scheduler.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {stats["sent"]} reminder notifications, skipped {stats["skipped"]} stale reminders'
+        ))
@@ -46,6 +46,12 @@ class Notification(models.Model):
     delivered_at = models.DateTimeField(null=True, blank=True)
     failed_at = models.DateTimeField(null=True, blank=True)
     failure_reason = models.TextField(blank=True)
+    # Dispatch bookkeeping (notifications.dispatch)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # Set by producers that must not create the same notification twice, e.g. reminders
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -60,8 +66,21 @@ class Notification(models.Model):
             models.Index(fields=['channel']),
             models.Index(fields=['status']),
             models.Index(fields=['is_read']),
+            models.Index(fields=['recipient', '-created_at']),
+            models.Index(fields=['recipient', 'is_read']),
+            models.Index(fields=['status', 'created_at']),
         ]
 
+class NotificationCounter(models.Model):
+    """
+    Denormalized number of unread notifications per user, maintained by notifications.counters
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.unread} unread for user {self.user_id}'
+
 class UserNotificationPreference(models.Model):
     """
     User notification preferences
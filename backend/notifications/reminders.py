@@ -0,0 +1,173 @@
+"""
+Booking reminders.
+
+``ReminderScheduler`` keeps the reminders coming due soon in a heap keyed by
+fire time, start_time minus one of BOOKING_REMINDER_OFFSETS. It never scans
+all future bookings. For each offset it remembers how far ahead, in
+start_time, bookings have been loaded, and tops that up with an indexed
+range scan of confirmed bookings as the clock advances. Memory then holds
+only about BOOKING_REMINDER_LOOKAHEAD of bookings per offset, however many
+are booked further out.
+
+Bookings confirmed or moved into an already loaded range are caught by a
+scan of recently updated bookings. A popped reminder is checked against the
+booking's current status and start time, so cancelled or moved bookings
+don't remind at the old time.
+
+Every reminder notification carries an idempotency key of booking, start
+time, offset, recipient and channel. A restarted scheduler reloads from BOOKING_REMINDER_GRACE
+in the past and catches up on reminders missed while it was down, without
+sending any twice.
+"""
+import heapq
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.timesince import timeuntil
+
+from bookings.models import Booking, BookingStatus
+from .fanout import eligible_channels, preference_mask
+from .models import Notification, NotificationChannel, NotificationType
+
+OFFSETS = getattr(settings, 'BOOKING_REMINDER_OFFSETS', [24 * 60 * 60, 60 * 60])
+GRACE = getattr(settings, 'BOOKING_REMINDER_GRACE', 15 * 60)
+LOOKAHEAD = getattr(settings, 'BOOKING_REMINDER_LOOKAHEAD', 10 * 60)
+# Overlap between scans of updated bookings, for saves that commit after the scan started
+CHANGE_SCAN_OVERLAP = timedelta(seconds=60)
+
+
+def reminder_key(booking, offset, user_id, channel):
+    # The start time is part of the key so a rescheduled booking is reminded of its new time
+    return (
+        f'booking-reminder:{booking.pk}:{int(booking.start_time.timestamp())}:'
+        f'{int(offset.total_seconds())}:{user_id}:{channel}'
+    )
+
+
+def upcoming_bookings():
+    return Booking.objects.filter(status=BookingStatus.CONFIRMED).order_by()
+
+
+class ReminderScheduler:
+    """
+    Emits booking reminder notifications from an incrementally loaded heap
+    """
+
+    def __init__(self, offsets=None, grace=None, lookahead=None, clock=timezone.now):
+        self.offsets = [timedelta(seconds=seconds) for seconds in sorted(offsets or OFFSETS)]
+        self.grace = timedelta(seconds=GRACE if grace is None else grace)
+        self.lookahead = timedelta(seconds=lookahead or LOOKAHEAD)
+        self.clock = clock
+        # (fire_at, booking_id, offset) entries, and the same entries as a set to skip re-queueing
+        self.heap = []
+        self.queued = set()
+        self.loaded_until = {}
+        self.changes_since = None
+        self.stats = {'sent': 0, 'skipped': 0}
+
+    def push(self, fire_at, booking_id, offset):
+        entry = (fire_at, booking_id, offset)
+        if entry not in self.queued:
+            self.queued.add(entry)
+            heapq.heappush(self.heap, entry)
+
+    def refill(self, now):
+        """
+        Load bookings whose reminders come due within the lookahead
+        """
+        if not self.loaded_until:
+            # Reload what may have come due while no scheduler was running
+            self.loaded_until = {offset: now + offset - self.grace for offset in self.offsets}
+            self.changes_since = now
+        for offset in self.offsets:
+            until = now + offset + self.lookahead
+            if until <= self.loaded_until[offset]:
+                continue
+            loaded = upcoming_bookings().filter(
+                start_time__gt=self.loaded_until[offset], start_time__lte=until,
+            ).values_list('pk', 'start_time')
+            for booking_id, start_time in loaded.iterator():
+                self.push(start_time - offset, booking_id, offset)
+            self.loaded_until[offset] = until
+
+        # Bookings confirmed or moved since the last scan, into ranges already loaded
+        changed = upcoming_bookings().filter(
+            updated_at__gte=self.changes_since - CHANGE_SCAN_OVERLAP,
+            start_time__lte=max(self.loaded_until.values()),
+        ).values_list('pk', 'start_time')
+        self.changes_since = now
+        for booking_id, start_time in changed.iterator():
+            for offset in self.offsets:
+                if start_time <= self.loaded_until[offset] and start_time - offset >= now - self.grace:
+                    self.push(start_time - offset, booking_id, offset)
+
+    def pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            self.queued.discard(entry)
+            due.append(entry)
+        return due
+
+    def fire(self, due, now):
+        """
+        Create the reminder notifications of due entries that still apply
+        """
+        if not due:
+            return
+        bookings = upcoming_bookings().select_related('service').in_bulk({booking_id for _, booking_id, _ in due})
+        reminders = []
+        for fire_at, booking_id, offset in due:
+            booking = bookings.get(booking_id)
+            # Cancelled, moved (the new time is queued separately) or too late to be useful
+            if booking is None or booking.start_time - offset != fire_at or now - fire_at > self.grace:
+                self.stats['skipped'] += 1
+                continue
+            for user_id in (booking.client_id, booking.provider_id):
+                channels = eligible_channels(
+                    preference_mask(user_id), NotificationType.BOOKING_REMINDER, NotificationChannel.values,
+                )
+                reminders.extend((booking, offset, user_id, channel) for channel in channels)
+
+        keys = [reminder_key(booking, offset, user_id, channel) for booking, offset, user_id, channel in reminders]
+        existing = set(Notification.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True))
+        for key, (booking, offset, user_id, channel) in zip(keys, reminders):
+            if key in existing:
+                continue
+            title = booking.service.title
+            try:
+                # Saved one by one so the unread counter signals run; a racing duplicate only rolls back itself
+                with transaction.atomic():
+                    Notification.objects.create(
+                        recipient_id=user_id, type=NotificationType.BOOKING_REMINDER, channel=channel,
+                        title=f'Reminder: {title}',
+                        message=f'Your booking for {title} starts in {timeuntil(booking.start_time, now)}.',
+                        data={'booking_id': booking.pk, 'start_time': booking.start_time.isoformat()},
+                        idempotency_key=key,
+                    )
+            except IntegrityError:
+                continue
+            self.stats['sent'] += 1
+
+    def tick(self):
+        """
+        Load, pop and fire once, returning the time of the next due reminder or None
+        """
+        now = self.clock()
+        self.refill(now)
+        self.fire(self.pop_due(now), now)
+        return self.heap[0][0] if self.heap else None
+
+    def run(self, poll_interval=30.0, stop=None):
+        """
+        Tick until stop() returns True, sleeping until the next reminder or poll
+        """
+        while not (stop is not None and stop()):
+            next_due = self.tick()
+            delay = poll_interval
+            if next_due is not None:
+                delay = min(delay, max((next_due - self.clock()).total_seconds(), 0))
+            time.sleep(delay)
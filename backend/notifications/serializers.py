@@ -31,4 +31,18 @@ class UserNotificationPreferenceSerializer(serializers.ModelSerializer):
             'review_notifications', 'promotion_notifications', 'system_notifications',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user_name', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'user_name', 'created_at', 'updated_at']
+
+class MarkNotificationsReadSerializer(serializers.Serializer):
+    """
+    Notifications to mark as read: a list of ids, or all created up to a time
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=1000
+    )
+    before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('before' in data):
+            raise serializers.ValidationError('Provide either ids or before.')
+        return data
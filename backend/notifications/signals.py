@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .counters import apply_unread_change
+from .events import publish_notifications
+from .fanout import invalidate_preference_mask
+from .models import Notification, UserNotificationPreference
+
+
+@receiver(pre_save, sender=Notification)
+def remember_counted_unread(sender, instance, **kwargs):
+    # Snapshot whose counter the stored row adds to, if it is unread
+    instance._counted_recipient = None
+    if instance.pk:
+        previous = Notification.objects.filter(pk=instance.pk).values('recipient_id', 'is_read').first()
+        if previous and not previous['is_read']:
+            instance._counted_recipient = previous['recipient_id']
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_counted_recipient', None)
+    current = None if instance.is_read else instance.recipient_id
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous:
+            apply_unread_change(previous, -1)
+        if current:
+            apply_unread_change(current, 1)
+    instance._counted_recipient = current
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: publish_notifications([instance]))
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        apply_unread_change(instance.recipient_id, -1)
+
+
+@receiver(post_save, sender=UserNotificationPreference)
+@receiver(post_delete, sender=UserNotificationPreference)
+def drop_cached_preference_mask(sender, instance, **kwargs):
+    invalidate_preference_mask(instance.user_id)
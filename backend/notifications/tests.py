@@ -1,3 +1,359 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from bookings.models import Booking, BookingStatus
+from services.models import Category, Service
+from users.models import User
+from .backends import BaseBackend
+from .counters import rebuild_unread_counts
+from .dispatch import Dispatcher
+from .fanout import fan_out, notify, preference_mask
+from .models import Notification, NotificationCounter, NotificationStatus, UserNotificationPreference
+from .reminders import ReminderScheduler
+
+
+class FlakyBackend(BaseBackend):
+    """
+    Fails every send with a retryable error
+    """
+
+    async def send(self, message):
+        raise ConnectionError('Provider unavailable')
+
+
+class UnreadNotificationTests(APITestCase):
+    """
+    Bulk mark-as-read and the cached unread counter
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        self.client.force_authenticate(self.user)
+        self.notifications = [self.notify(self.user, index) for index in range(4)]
+        self.notify(self.other, 0)
+
+    def notify(self, user, index):
+        return Notification.objects.create(
+            recipient=user, type='system_alert', channel='in_app', title=f'Alert {index}', message='Message',
+        )
+
+    def unread_count(self):
+        return self.client.get(reverse('unread-notification-count')).json()['unread_count']
+
+    def test_counter_follows_inserts_and_reads(self):
+        self.assertEqual(self.unread_count(), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notify(self.user, 4)
+        self.assertEqual(self.unread_count(), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('mark-notification-as-read', kwargs={'pk': self.notifications[0].pk})
+            )
+        self.assertTrue(response.json()['is_read'])
+        self.assertEqual(self.unread_count(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notifications[1].delete()
+        self.assertEqual(self.unread_count(), 3)
+
+    def test_bulk_mark_read_by_ids_and_before(self):
+        url = reverse('mark-notifications-as-read')
+        ids = [self.notifications[0].pk, self.notifications[1].pk, Notification.objects.get(recipient=self.other).pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'ids': ids}, format='json')
+        self.assertEqual(response.json(), {'marked': 2, 'unread_count': 2})
+        self.assertFalse(Notification.objects.get(recipient=self.other).is_read)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'before': timezone.now().isoformat()}, format='json')
+        self.assertEqual(response.json(), {'marked': 2, 'unread_count': 0})
+        self.assertFalse(Notification.objects.filter(recipient=self.user, read_at__isnull=True).exists())
+
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'ids': []}, format='json').status_code, 400)
+
+    def test_rebuild_corrects_drift(self):
+        NotificationCounter.objects.filter(user=self.user).update(unread=9)
+        NotificationCounter.objects.filter(user=self.other).delete()
+        self.assertEqual(rebuild_unread_counts(), 2)
+        self.assertEqual(dict(NotificationCounter.objects.values_list('user', 'unread')), {
+            self.user.pk: 4, self.other.pk: 1,
+        })
+
+
+class NotificationFanOutTests(TestCase):
+    """
+    Preference-aware fan-out and the cached preference mask
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.default = User.objects.create_user(username='default', email='default@example.com', password='pass')
+        self.sms = User.objects.create_user(username='sms', email='sms@example.com', password='pass')
+        UserNotificationPreference.objects.create(user=self.sms, sms_notifications_enabled=True,
+                                                  email_notifications_enabled=False)
+        self.opted_out = User.objects.create_user(username='optout', email='optout@example.com', password='pass')
+        UserNotificationPreference.objects.create(user=self.opted_out, promotion_notifications=False)
+        self.inactive = User.objects.create_user(username='inactive', email='inactive@example.com', password='pass',
+                                                 is_active=False)
+
+    def sent(self):
+        return set(Notification.objects.values_list('recipient__username', 'channel'))
+
+    def test_fan_out_follows_preferences_in_chunks(self):
+        with self.assertNumQueries(15):
+            created = fan_out(User.objects.all(), 'promotion', 'Sale', 'Half price', channels=['email', 'sms'],
+                              chunk_size=1)
+        self.assertEqual(created, 2)
+        self.assertEqual(self.sent(), {('default', 'email'), ('sms', 'sms')})
+        # Types without a category switch reach users who opted out of promotions
+        fan_out(User.objects.filter(username='optout'), 'new_message', 'Hello', 'Hi', channels=['in_app'])
+        self.assertIn(('optout', 'in_app'), self.sent())
+        self.assertEqual(dict(NotificationCounter.objects.values_list('user__username', 'unread')), {
+            'default': 1, 'sms': 1, 'optout': 1,
+        })
+
+    def test_notify_uses_cached_mask(self):
+        self.assertEqual([row.channel for row in notify(self.sms, 'system_alert', 'Alert', 'Message')],
+                         ['sms', 'push', 'in_app'])
+        with self.assertNumQueries(0):
+            preference_mask(self.sms.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserNotificationPreference.objects.filter(user=self.sms).first().delete()
+        self.assertEqual([row.channel for row in notify(self.sms, 'system_alert', 'Alert', 'Message')],
+                         ['email', 'push', 'in_app'])
+        self.assertEqual(notify(self.opted_out, 'promotion', 'Sale', 'Half price'), [])
+
+    def test_racing_duplicate_key_is_treated_as_sent(self):
+        created = notify(self.sms, 'system_alert', 'Alert', 'Message', idempotency_key='alert:1')
+        self.assertEqual(len(created), 3)
+        # The other call's lookup ran before these rows existed
+        with mock.patch.object(Notification.objects, 'filter', return_value=Notification.objects.none()):
+            self.assertEqual(notify(self.sms, 'system_alert', 'Alert', 'Message', idempotency_key='alert:1'), [])
+        self.assertEqual(Notification.objects.filter(recipient=self.sms).count(), 3)
+
+
+class BookingReminderTests(TestCase):
+    """
+    Reminder scheduling from the incrementally loaded heap
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        for user in (self.client_user, self.provider):
+            UserNotificationPreference.objects.create(
+                user=user, email_notifications_enabled=False, push_notifications_enabled=False,
+            )
+        category = Category.objects.create(name='Plumbing')
+        self.service = Service.objects.create(
+            provider=self.provider, category=category, title='Pipe Repair', description='Description',
+            price='80.00', duration=5,
+        )
+        # On the 5-minute booking slot grid, so bookings a few minutes apart don't conflict
+        start = timezone.now().replace(second=0, microsecond=0) + timedelta(days=30)
+        self.start = start - timedelta(minutes=start.minute % 5)
+        self.now = self.start
+
+    def book(self, minutes, status=BookingStatus.CONFIRMED):
+        start = self.start + timedelta(minutes=minutes)
+        return Booking.objects.create(
+            client=self.client_user, provider=self.provider, service=self.service, status=status,
+            start_time=start, end_time=start + timedelta(minutes=2), duration=2, price='80.00',
+            location_type='in_person',
+        )
+
+    def scheduler(self):
+        return ReminderScheduler(offsets=[24 * 60 * 60, 60 * 60], grace=15 * 60, lookahead=10 * 60,
+                                 clock=lambda: self.now)
+
+    def at(self, minutes):
+        self.now = self.start + timedelta(minutes=minutes)
+
+    def test_reminders_fire_once_at_each_offset(self):
+        moved = self.book(65)
+        cancelled = self.book(70)
+        self.book(24 * 60 + 5)
+        self.book(3 * 24 * 60)
+
+        scheduler = self.scheduler()
+        scheduler.tick()
+        # Only bookings due within the lookahead are held: two 1h reminders and one 24h reminder
+        self.assertEqual(len(scheduler.heap), 3)
+        cancelled.status = BookingStatus.CANCELLED
+        cancelled.save()
+
+        self.at(16)
+        scheduler.tick()
+        self.assertEqual(scheduler.stats, {'sent': 4, 'skipped': 1})
+        self.assertEqual(Notification.objects.filter(type='booking_reminder', channel='in_app').count(), 4)
+        self.assertEqual(NotificationCounter.objects.get(user=self.client_user).unread, 2)
+
+        # A restarted scheduler catches up on the grace period without sending twice
+        self.at(17)
+        restarted = self.scheduler()
+        restarted.tick()
+        self.assertEqual(restarted.stats['sent'], 0)
+
+        moved.start_time += timedelta(minutes=25)
+        moved.end_time += timedelta(minutes=25)
+        moved.save()
+        self.at(31)
+        restarted.tick()
+        self.assertEqual(restarted.stats['sent'], 2)
+        self.assertEqual(Notification.objects.count(), 6)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    NOTIFICATION_BACKENDS={
+        'email': 'notifications.backends.EmailBackend',
+        'sms': 'notifications.backends.FileBackend',
+        'push': 'notifications.tests.FlakyBackend',
+        'in_app': 'notifications.backends.InAppBackend',
+    },
+    NOTIFICATION_MAX_ATTEMPTS=2,
+)
+class NotificationDispatchTests(TestCase):
+    """
+    Leased batch claiming and status transitions of the dispatcher
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(NOTIFICATION_FILE_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.no_email = User.objects.create_user(username='noemail', email='', password='pass')
+
+    def notify(self, user, channel, index=0):
+        return Notification.objects.create(
+            recipient=user, type='system_alert', channel=channel, title=f'Alert {index}', message='Message',
+        )
+
+    def test_batch_records_each_outcome(self):
+        email = self.notify(self.user, 'email')
+        unreachable = self.notify(self.no_email, 'email')
+        sms = self.notify(self.user, 'sms')
+        push = self.notify(self.user, 'push')
+        in_app = self.notify(self.user, 'in_app')
+
+        dispatcher = Dispatcher()
+        self.assertEqual(dispatcher.dispatch_batch(), 5)
+        self.assertEqual(dispatcher.stats, {'sent': 2, 'delivered': 1, 'retried': 1, 'failed': 1, 'lost': 0})
+        for notification in (email, unreachable, sms, push, in_app):
+            notification.refresh_from_db()
+            self.assertEqual(notification.claimed_by, '')
+
+        self.assertEqual(email.status, NotificationStatus.SENT)
+        self.assertEqual([message.to for message in mail.outbox], [['client@example.com']])
+        self.assertEqual(sms.status, NotificationStatus.SENT)
+        with open(os.path.join(self.directory, 'sms.jsonl')) as handle:
+            self.assertEqual(json.loads(handle.read())['id'], sms.pk)
+        self.assertEqual(in_app.status, NotificationStatus.DELIVERED)
+        self.assertIsNotNone(in_app.delivered_at)
+        self.assertEqual(unreachable.status, NotificationStatus.FAILED)
+        self.assertEqual(unreachable.attempts, 1)
+
+        # The retryable failure waits out its backoff, then fails for good at the attempt limit
+        self.assertEqual(push.status, NotificationStatus.PENDING)
+        self.assertEqual((push.attempts, push.failure_reason), (1, 'ConnectionError: Provider unavailable'))
+        self.assertEqual(dispatcher.dispatch_batch(), 0)
+        Notification.objects.filter(pk=push.pk).update(lease_expires_at=timezone.now())
+        self.assertEqual(dispatcher.dispatch_batch(), 1)
+        push.refresh_from_db()
+        self.assertEqual((push.status, push.attempts), (NotificationStatus.FAILED, 2))
+
+    def test_leased_rows_are_not_claimed_twice(self):
+        for index in range(5):
+            self.notify(self.user, 'in_app', index)
+        first, second = Dispatcher(batch_size=3), Dispatcher(batch_size=3)
+        token, claimed = first.claim()
+        _, rest = second.claim()
+        self.assertEqual(len(claimed), 3)
+        self.assertEqual(len(rest), 2)
+        self.assertFalse({row.pk for row in claimed} & {row.pk for row in rest})
+        self.assertEqual(second.claim()[1], [])
+
+        # An expired lease is up for grabs again
+        Notification.objects.filter(claimed_by=token).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        _, reclaimed = second.claim()
+        self.assertEqual({row.pk for row in reclaimed}, {row.pk for row in claimed})
+
+    def test_outcomes_skip_rows_taken_over_after_the_lease(self):
+        kept, taken = self.notify(self.user, 'in_app'), self.notify(self.user, 'push', 1)
+        first, second = Dispatcher(), Dispatcher()
+        token, claimed = first.claim()
+        self.assertEqual(first.renew(token), 2)
+
+        Notification.objects.filter(pk=taken.pk).update(lease_expires_at=timezone.now())
+        second_token, reclaimed = second.claim()
+        self.assertEqual(reclaimed, [taken])
+        first.record(token, claimed, {kept.pk: None, taken.pk: ConnectionError('Provider unavailable')})
+        self.assertEqual(first.stats, {'sent': 0, 'delivered': 1, 'retried': 0, 'failed': 0, 'lost': 1})
+        taken.refresh_from_db()
+        self.assertEqual((taken.claimed_by, taken.attempts), (second_token, 0))
+
+
+class NotificationPaginationTests(APITestCase):
+    """
+    Cursor pagination of the notification list on created_at
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.client.force_authenticate(self.user)
+
+    def notify(self, created_at):
+        notification = Notification.objects.create(
+            recipient=self.user, type='system_alert', channel='in_app', title='Alert', message='Message',
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+        return notification
+
+    def ids(self, page):
+        return [notification['id'] for notification in page['results']]
+
+    def test_pages_follow_created_at_with_ties_broken_by_id(self):
+        now = timezone.now()
+        older = self.notify(now - timedelta(hours=2))
+        # Notifications created by the same fan-out chunk share a timestamp
+        tied = [self.notify(now - timedelta(hours=1)) for _ in range(3)]
+
+        first_page = self.client.get(reverse('notification-list'), {'page_size': 2}).json()
+        self.assertEqual(self.ids(first_page), [tied[2].pk, tied[1].pk])
+
+        self.notify(now)
+        self.notify(now - timedelta(hours=1))
+        second_page = self.client.get(first_page['next']).json()
+        self.assertEqual(self.ids(second_page), [tied[0].pk, older.pk])
+        self.assertIsNone(second_page['next'])
+
+        # Paging back returns the first page as it was
+        self.assertEqual(self.ids(self.client.get(second_page['previous']).json()), [tied[2].pk, tied[1].pk])
+
+    def test_malformed_cursor_is_not_found(self):
+        cursor = base64.b64encode(b'p=%5B%22not-a-position%22%5D').decode()
+        response = self.client.get(reverse('notification-list'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('notifications/', views.NotificationListView.as_view(), name='notification-list'),
     path('notifications/unread/', views.UnreadNotificationListView.as_view(), name='unread-notification-list'),
+    path('notifications/unread/count/', views.UnreadNotificationCountView.as_view(), name='unread-notification-count'),
+    path('notifications/mark-read/', views.MarkNotificationsAsReadView.as_view(), name='mark-notifications-as-read'),
     path('notifications/<int:pk>/mark-read/', views.MarkNotificationAsReadView.as_view(), name='mark-notification-as-read'),
     path('notifications/preferences/', views.UserNotificationPreferenceView.as_view(), name='user-notification-preferences'),
 ]
\ No newline at end of file
@@ -1,6 +1,11 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .counters import mark_read, unread_count
 from .models import Notification, UserNotificationPreference
-from .serializers import NotificationSerializer, UserNotificationPreferenceSerializer
+from .serializers import (
+    MarkNotificationsReadSerializer, NotificationSerializer, UserNotificationPreferenceSerializer,
+)
 
 class NotificationListView(generics.ListAPIView):
     """
@@ -29,6 +34,15 @@ class UnreadNotificationListView(generics.ListAPIView):
             is_read=False
         ).order_by('-created_at')
 
+class UnreadNotificationCountView(APIView):
+    """
+    View for the current user's number of unread notifications, e.g. for a badge
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread_count': unread_count(request.user.pk)})
+
 class MarkNotificationAsReadView(generics.UpdateAPIView):
     """
     View for marking a notification as read
@@ -42,22 +56,37 @@ class MarkNotificationAsReadView(generics.UpdateAPIView):
         instance = self.get_object()
         
         # Check if the notification belongs to the current user
-        if instance.recipient != request.user:
+        if instance.recipient_id != request.user.pk:
             return Response(
                 {'error': 'You do not have permission to mark this notification as read'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Mark as read and set read_at timestamp
-        instance.is_read = True
-        if not instance.read_at:
-            instance.read_at = timezone.now()
-        instance.save()
+        # Mark as read with a single UPDATE that also adjusts the unread counter
+        if not instance.is_read:
+            mark_read(request.user.pk, ids=[instance.pk])
+            instance.refresh_from_db(fields=['is_read', 'read_at', 'updated_at'])
         
         # Return updated notification data
+        instance.recipient = request.user
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+class MarkNotificationsAsReadView(APIView):
+    """
+    View for marking several notifications as read at once
+
+    Takes {"ids": [...]} or {"before": <timestamp>} and answers with the
+    number marked and the new unread count.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkNotificationsReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        marked = mark_read(request.user.pk, **serializer.validated_data)
+        return Response({'marked': marked, 'unread_count': unread_count(request.user.pk)})
+
 class UserNotificationPreferenceView(generics.RetrieveUpdateAPIView):
     """
     View for retrieving or updating the current user's notification preferences
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from users.models import User
 from bookings.models import Booking
 
@@ -68,6 +68,11 @@ class Payment(models.Model):
     def __str__(self):
         return f'Payment {self.id} - {self.amount} {self.currency}'
 
+    def save(self, *args, **kwargs):
+        # Commit together with the outbox event post_save writes
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
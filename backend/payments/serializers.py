@@ -1,4 +1,9 @@
+from decimal import Decimal
+
+from django.db import models
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
+from levi_backend.query_shaping import EagerLoadingMixin
 from .models import Payment, Refund
 
 class RefundSerializer(serializers.ModelSerializer):
@@ -17,10 +22,16 @@ class RefundSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'payment_amount', 'payment_currency', 'status', 'processed_at', 'created_at', 'updated_at']
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Payment model
     """
+    select_related_fields = ('booking__client', 'booking__provider', 'booking__service')
+    prefetch_related_fields = ('refunds',)
+    expandable_fields = ('refunds',)
+    # total_refunded reads the annotation added in setup_eager_loading
+    field_dependencies = {'total_refunded': (), 'balance_remaining': ('amount',)}
+
     booking_client_name = serializers.CharField(source='booking.client.get_full_name', read_only=True)
     booking_provider_name = serializers.CharField(source='booking.provider.get_full_name', read_only=True)
     booking_service_title = serializers.CharField(source='booking.service.title', read_only=True)
@@ -48,10 +59,31 @@ class PaymentSerializer(serializers.ModelSerializer):
             'total_refunded', 'balance_remaining'
         ]
     
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, keep=()):
+        """
+        Load the booking graph in one join and annotate the refund total
+        """
+        queryset = super().setup_eager_loading(queryset, fields=fields, keep=keep)
+        if fields is not None and not {'total_refunded', 'balance_remaining'} & set(fields):
+            return queryset
+        refunded = Refund.objects.filter(payment=models.OuterRef('pk')).order_by().values('payment').annotate(
+            total=models.Sum('amount')
+        ).values('total')
+        return queryset.annotate(
+            total_refunded=Coalesce(
+                models.Subquery(refunded), models.Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+    
     def get_total_refunded(self, obj):
         """
         Calculate total amount refunded for this payment
         """
+        if hasattr(obj, 'total_refunded'):
+            return obj.total_refunded
+        # Instances not loaded through setup_eager_loading, e.g. after create
         return obj.refunds.aggregate(
             total=models.Sum('amount')
         )['total'] or 0
@@ -60,4 +92,4 @@ class PaymentSerializer(serializers.ModelSerializer):
         """
         Calculate remaining balance after refunds
         """
-        return obj.amount - self.get_total_refunded(obj)
\ No newline at end of file
+        return obj.amount - self.get_total_refunded(obj)
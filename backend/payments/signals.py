@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from events.outbox import emit
+from .models import Payment
+
+
+@receiver(pre_save, sender=Payment)
+def remember_status(sender, instance, **kwargs):
+    # Snapshot the stored status, to tell status changes apart from other edits
+    instance._stored_status = None
+    if instance.pk:
+        instance._stored_status = Payment.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Payment)
+def emit_status_change(sender, instance, created, raw=False, **kwargs):
+    # Runs inside Payment.save's transaction, so the event commits with the change
+    previous = getattr(instance, '_stored_status', None)
+    if raw or (not created and previous == instance.status):
+        return
+    emit('payment.status_changed', instance.pk, {
+        'payment': instance.pk,
+        'booking': instance.booking_id,
+        'amount': str(instance.amount),
+        'currency': instance.currency,
+        'previous_status': previous,
+        'status': instance.status,
+    })
+    instance._stored_status = instance.status
@@ -1,3 +1,95 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from bookings.models import Booking
+from levi_backend.testing import QueryCountAssertionsMixin
+from services.models import Category, Service
+from users.models import User
+from .models import Payment, Refund
+
+# Queries allowed for a page of payments: the page itself and the refunds
+PAYMENT_PAGE_QUERY_LIMIT = 2
+
+
+class PaymentQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+    """
+    Query budgets and refund totals of the payment endpoints
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', is_staff=True,
+        )
+        self.client.force_authenticate(self.admin)
+        self.category = Category.objects.create(name='Plumbing')
+        self.payments = 0
+
+    def create_payments(self, count):
+        for _ in range(count):
+            self.payments += 1
+            client = User.objects.create_user(
+                username=f'client{self.payments}', email=f'client{self.payments}@example.com', password='pass',
+            )
+            provider = User.objects.create_user(
+                username=f'provider{self.payments}', email=f'provider{self.payments}@example.com', password='pass',
+            )
+            service = Service.objects.create(
+                provider=provider, category=self.category, title='Pipe Repair', description='Description',
+                price='100.00', duration=60,
+            )
+            start = timezone.now() + timedelta(days=self.payments)
+            booking = Booking.objects.create(
+                client=client, provider=provider, service=service, start_time=start,
+                end_time=start + timedelta(hours=1), duration=60, price='100.00', location_type='in_person',
+            )
+            payment = Payment.objects.create(
+                booking=booking, amount='100.00', total_amount='100.00', payment_method='stripe',
+                customer_email=client.email, customer_name='Client',
+            )
+            Refund.objects.create(payment=payment, amount='10.00', reason='Late')
+            Refund.objects.create(payment=payment, amount='15.50', reason='Partial')
+
+    def test_payment_list_queries_are_capped(self):
+        url = reverse('payment-list')
+        self.assertQueriesDoNotScale(url, self.create_payments, sizes=(1, 20))
+        count, queries = self.count_queries(url)
+        self.assertLessEqual(count, PAYMENT_PAGE_QUERY_LIMIT, '\n'.join(queries))
+
+    def test_refund_totals(self):
+        self.create_payments(1)
+        self.create_payments(1)
+        Refund.objects.filter(payment__booking__client__username='client2').delete()
+
+        payments = self.client.get(reverse('payment-list')).json()['results']
+        totals = {
+            payment['customer_email']: (
+                Decimal(str(payment['total_refunded'])), Decimal(str(payment['balance_remaining']))
+            )
+            for payment in payments
+        }
+        self.assertEqual(totals['client1@example.com'], (Decimal('25.50'), Decimal('74.50')))
+        self.assertEqual(totals['client2@example.com'], (Decimal('0'), Decimal('100.00')))
+
+    def test_sparse_fieldsets_narrow_the_sql(self):
+        self.create_payments(2)
+        url = reverse('payment-list')
+        self.assertNotIn('refunds', self.client.get(url).json()['results'][0])
+        payment = self.client.get(url, {'expand': 'refunds'}).json()['results'][0]
+        self.assertEqual(len(payment['refunds']), 2)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'fields': 'id,amount,booking_start_time'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'amount', 'booking_start_time'})
+        [query] = [query['sql'] for query in context.captured_queries]
+        self.assertIn('"bookings_booking"."start_time"', query)
+        for skipped in ('"users_user"', '"payments_refund"', '"billing_address"', '"services_service"'):
+            self.assertNotIn(skipped, query)
+
+        response = self.client.get(url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
@@ -1,9 +1,11 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from django.db import models
+from levi_backend.query_shaping import EagerLoadingViewMixin
 from .models import Payment, Refund
 from .serializers import PaymentSerializer, RefundSerializer
 
-class PaymentListView(generics.ListAPIView):
+class PaymentListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     View for listing all payments (admin only)
     """
@@ -11,7 +13,7 @@ class PaymentListView(generics.ListAPIView):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAdminUser]
 
-class PaymentDetailView(generics.RetrieveUpdateAPIView):
+class PaymentDetailView(EagerLoadingViewMixin, generics.RetrieveUpdateAPIView):
     """
     View for retrieving or updating a specific payment
     """
@@ -19,7 +21,7 @@ class PaymentDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class UserPaymentListView(generics.ListAPIView):
+class UserPaymentListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     View for listing all payments for the current user's bookings
     """
@@ -33,12 +35,13 @@ class UserPaymentListView(generics.ListAPIView):
             models.Q(booking__provider=self.request.user)
         )
 
-class BookingPaymentDetailView(generics.RetrieveAPIView):
+class BookingPaymentDetailView(EagerLoadingViewMixin, generics.RetrieveAPIView):
     """
     View for retrieving the payment for a specific booking
     """
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'booking_id'
     
     def get_queryset(self):
         # Filter by booking ID from URL parameters
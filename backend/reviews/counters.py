@@ -0,0 +1,33 @@
+"""
+Maintenance of the denormalized helpful vote counter on Review.
+
+``Review.helpful_count`` is the number of votes with is_helpful=True. Vote
+signals adjust it with single F() UPDATE statements inside the vote's
+transaction, so listing reviews never has to count votes.
+"""
+from django.db.models import Count, F, Q
+
+from .models import Review
+
+
+def apply_helpful_change(review_id, delta):
+    """
+    Add (delta=1) or remove (delta=-1) one helpful vote from a review
+    """
+    Review.objects.filter(pk=review_id).update(helpful_count=F('helpful_count') + delta)
+
+
+def rebuild_helpful_counts(review_ids=None, batch_size=1000):
+    """
+    Recompute helpful_count from the votes, returning the number of reviews updated
+    """
+    reviews = Review.objects.all()
+    if review_ids:
+        reviews = reviews.filter(pk__in=review_ids)
+    counted = reviews.annotate(
+        counted=Count('helpful_votes', filter=Q(helpful_votes__is_helpful=True))
+    ).exclude(helpful_count=F('counted')).values_list('pk', 'counted')
+
+    stale = [Review(pk=pk, helpful_count=count) for pk, count in counted.iterator()]
+    Review.objects.bulk_update(stale, ['helpful_count'], batch_size=batch_size)
+    return len(stale)
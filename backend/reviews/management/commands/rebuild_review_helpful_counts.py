@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from reviews.counters import rebuild_helpful_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized helpful vote counts on reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--review', type=int, action='append', dest='review_ids',
+                            help='Only rebuild the given review id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_helpful_counts(
+            review_ids=options['review_ids'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Corrected helpful counts on {rebuilt} reviews'))
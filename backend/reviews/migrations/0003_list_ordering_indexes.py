@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 04:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_list_ordering_indexes'),
+        ('media_files', '0002_initial'),
+        ('reviews', '0002_initial'),
+        ('services', '0004_list_ordering_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['status', '-created_at'], name='reviews_rev_status_70a1f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewer', '-created_at'], name='reviews_rev_reviewe_5e332e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['service', 'status', '-created_at'], name='reviews_rev_service_e9c52f_idx'),
+        ),
+    ]
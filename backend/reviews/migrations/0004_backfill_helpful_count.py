@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import Count, F, Q
+
+
+def backfill_helpful_count(apps, schema_editor):
+    # helpful_count was never maintained before; compute it from the votes
+    Review = apps.get_model('reviews', 'Review')
+    counted = Review.objects.annotate(
+        counted=Count('helpful_votes', filter=Q(helpful_votes__is_helpful=True))
+    ).exclude(helpful_count=F('counted')).values_list('pk', 'counted')
+    stale = [Review(pk=pk, helpful_count=count) for pk, count in counted.iterator()]
+    Review.objects.bulk_update(stale, ['helpful_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_list_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_helpful_count, migrations.RunPython.noop),
+    ]
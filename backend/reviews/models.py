@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from users.models import User
 from bookings.models import Booking
 
@@ -36,6 +36,11 @@ class Review(models.Model):
     def __str__(self):
         return f'Review {self.id} - {self.rating} stars'
 
+    def save(self, *args, **kwargs):
+        # Commit together with what post_save handlers write: rating counters and outbox events
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -43,6 +48,9 @@ class Review(models.Model):
             models.Index(fields=['reviewee']),
             models.Index(fields=['rating']),
             models.Index(fields=['status']),
+            models.Index(fields=['status', '-created_at']),
+            models.Index(fields=['reviewer', '-created_at']),
+            models.Index(fields=['service', 'status', '-created_at']),
         ]
 
 class ReviewComment(models.Model):
@@ -70,6 +78,15 @@ class ReviewHelpfulVote(models.Model):
     is_helpful = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        # Commit together with the Review.helpful_count change the vote signals make
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     class Meta:
         unique_together = ['review', 'user']
         ordering = ['-created_at']
\ No newline at end of file
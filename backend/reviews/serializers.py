@@ -1,4 +1,7 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
+from levi_backend.query_shaping import EagerLoadingMixin
 from .models import Review, ReviewComment, ReviewHelpfulVote
 
 class ReviewHelpfulVoteSerializer(serializers.ModelSerializer):
@@ -23,16 +26,18 @@ class ReviewCommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_name', 'content', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Review model
     """
+    select_related_fields = ('reviewer', 'reviewee', 'service')
+    prefetch_related_fields = ('images', 'helpful_votes__user', 'comments__user')
+
     reviewer_name = serializers.CharField(source='reviewer.get_full_name', read_only=True)
     reviewee_name = serializers.CharField(source='reviewee.get_full_name', read_only=True)
     service_title = serializers.CharField(source='service.title', read_only=True)
     helpful_votes = ReviewHelpfulVoteSerializer(many=True, read_only=True)
     comments = ReviewCommentSerializer(many=True, read_only=True)
-    helpful_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Review
@@ -47,9 +52,38 @@ class ReviewSerializer(serializers.ModelSerializer):
             'reported_count', 'created_at', 'updated_at', 'approved_at', 'rejected_at',
             'helpful_votes', 'comments'
         ]
-    
-    def get_helpful_count(self, obj):
-        """
-        Get the count of helpful votes for this review
-        """
-        return obj.helpful_votes.filter(is_helpful=True).count()
\ No newline at end of file
+
+
+class ReviewListSerializer(ReviewSerializer):
+    """
+    Compact Review serializer for list endpoints
+
+    Leaves out the nested votes and comments, which grow without bound, and
+    reports the number of comments from a query annotation instead.
+    """
+    prefetch_related_fields = ('images',)
+    # comment_count reads the annotation added in setup_eager_loading
+    field_dependencies = {'comment_count': ()}
+
+    comment_count = serializers.IntegerField(read_only=True)
+
+    class Meta(ReviewSerializer.Meta):
+        fields = [
+            field for field in ReviewSerializer.Meta.fields
+            if field not in ('helpful_votes', 'comments')
+        ] + ['comment_count']
+        read_only_fields = ReviewSerializer.Meta.read_only_fields + ['comment_count']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, keep=()):
+        queryset = super().setup_eager_loading(queryset, fields=fields, keep=keep)
+        if fields is not None and 'comment_count' not in fields:
+            return queryset
+        # A correlated subquery rather than JOIN + GROUP BY, so the database
+        # can stop at the page limit instead of grouping every review first
+        comments = ReviewComment.objects.filter(review=OuterRef('pk')).order_by().values('review').annotate(
+            total=Count('pk')
+        ).values('total')
+        return queryset.annotate(
+            comment_count=Coalesce(Subquery(comments, output_field=IntegerField()), 0)
+        )
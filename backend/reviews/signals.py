@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from events.outbox import emit
+from levi_backend.conditional import touch
+from services.ratings import apply_rating_change
+from .counters import apply_helpful_change
+from .models import Review, ReviewComment, ReviewHelpfulVote, ReviewStatus
+
+
+def counted_rating(status, rating, service_id):
+    """
+    Return the (service_id, rating) a review contributes, or None if it doesn't count
+    """
+    if status == ReviewStatus.APPROVED:
+        return service_id, rating
+    return None
+
+
+@receiver(pre_save, sender=Review)
+def remember_counted_rating(sender, instance, raw=False, **kwargs):
+    # Snapshot what the stored row contributes before it is overwritten. Review.save
+    # runs in a transaction, so the lock holds the row until the counters are applied.
+    instance._counted_rating = None
+    if instance.pk and not raw:
+        previous = Review.objects.select_for_update().filter(pk=instance.pk).values(
+            'status', 'rating', 'service_id',
+        ).first()
+        if previous:
+            instance._counted_rating = counted_rating(**previous)
+
+
+@receiver(post_save, sender=Review)
+def update_service_rating_on_save(sender, instance, raw=False, **kwargs):
+    # Fixtures carry their own aggregates; rebuild_service_ratings fixes any drift
+    if raw:
+        return
+    previous = getattr(instance, '_counted_rating', None)
+    current = counted_rating(instance.status, instance.rating, instance.service_id)
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous:
+            apply_rating_change(previous[0], previous[1], -1)
+        if current:
+            apply_rating_change(current[0], current[1], 1)
+    instance._counted_rating = current
+
+
+@receiver(post_save, sender=Review)
+def emit_review_saved(sender, instance, created, raw=False, **kwargs):
+    # Runs inside Review.save's transaction, so the event commits with the change
+    if raw:
+        return
+    emit('review.saved', instance.pk, {
+        'review': instance.pk,
+        'created': created,
+        'reviewer': instance.reviewer_id,
+        'reviewee': instance.reviewee_id,
+        'service': instance.service_id,
+        'rating': instance.rating,
+        'status': instance.status,
+    })
+
+
+@receiver(post_delete, sender=Review)
+def update_service_rating_on_delete(sender, instance, **kwargs):
+    current = counted_rating(instance.status, instance.rating, instance.service_id)
+    if current:
+        apply_rating_change(current[0], current[1], -1)
+
+
+@receiver(pre_save, sender=ReviewHelpfulVote)
+def remember_counted_vote(sender, instance, **kwargs):
+    # Snapshot the review the stored vote counts towards, if it is helpful. ReviewHelpfulVote.save
+    # runs in a transaction, so the lock holds the row until the count is applied.
+    instance._counted_review = None
+    if instance.pk:
+        previous = ReviewHelpfulVote.objects.select_for_update().filter(pk=instance.pk).values(
+            'review_id', 'is_helpful',
+        ).first()
+        if previous and previous['is_helpful']:
+            instance._counted_review = previous['review_id']
+
+
+@receiver(post_save, sender=ReviewHelpfulVote)
+def update_helpful_count_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_counted_review', None)
+    current = instance.review_id if instance.is_helpful else None
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous:
+            apply_helpful_change(previous, -1)
+        if current:
+            apply_helpful_change(current, 1)
+    instance._counted_review = current
+
+
+@receiver(post_delete, sender=ReviewHelpfulVote)
+def update_helpful_count_on_delete(sender, instance, **kwargs):
+    if instance.is_helpful:
+        apply_helpful_change(instance.review_id, -1)
+
+
+@receiver(post_save, sender=ReviewComment)
+@receiver(post_delete, sender=ReviewComment)
+@receiver(post_save, sender=ReviewHelpfulVote)
+@receiver(post_delete, sender=ReviewHelpfulVote)
+def touch_review(sender, instance, **kwargs):
+    # Comments and votes are nested in the review, so its ETag has to change
+    touch(Review, instance.review_id)
+
+
+@receiver(m2m_changed, sender=Review.images.through)
+def touch_review_on_images_change(sender, instance, action, reverse, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        touch(Review, instance.pk)
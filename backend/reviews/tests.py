@@ -1,3 +1,218 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core import serializers
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from bookings.models import Booking
+from levi_backend.testing import QueryCountAssertionsMixin
+from services.models import Category, Service
+from users.models import User
+from .models import Review, ReviewComment, ReviewHelpfulVote, ReviewStatus
+
+
+class ReviewTestMixin:
+    """
+    Fixtures shared by the review test cases
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.voter = User.objects.create_user(username='voter', email='voter@example.com', password='pass')
+        self.client.force_authenticate(self.voter)
+        category = Category.objects.create(name='Plumbing')
+        self.service = Service.objects.create(
+            provider=self.provider, category=category, title='Pipe Repair', description='Description',
+            price='50.00', duration=60,
+        )
+        self.reviewers = 0
+
+    def create_reviews(self, count, rating=5, status=ReviewStatus.APPROVED):
+        reviews = []
+        for _ in range(count):
+            self.reviewers += 1
+            reviewer = User.objects.create_user(
+                username=f'reviewer{self.reviewers}', email=f'reviewer{self.reviewers}@example.com', password='pass',
+            )
+            start = timezone.now() - timedelta(days=self.reviewers)
+            booking = Booking.objects.create(
+                client=reviewer, provider=self.provider, service=self.service, start_time=start,
+                end_time=start + timedelta(hours=1), duration=60, price='50.00', location_type='in_person',
+                status='completed',
+            )
+            review = Review.objects.create(
+                booking=booking, reviewer=reviewer, reviewee=self.provider, service=self.service,
+                rating=rating, title='Great', comment='Fixed it', status=status,
+            )
+            ReviewComment.objects.create(review=review, user=self.provider, content='Thanks')
+            ReviewHelpfulVote.objects.create(review=review, user=self.voter)
+            reviews.append(review)
+        return reviews
+
+
+class ReviewQueryCountTests(ReviewTestMixin, QueryCountAssertionsMixin, APITestCase):
+    """
+    Query budgets and payload shape of the review list endpoints
+    """
+
+    def test_service_review_list_queries_do_not_scale(self):
+        url = reverse('service-review-list', args=[self.service.pk])
+        self.assertQueriesDoNotScale(url, self.create_reviews)
+
+    def test_review_list_queries_do_not_scale(self):
+        self.assertQueriesDoNotScale(reverse('review-list'), self.create_reviews)
+
+    def test_list_is_compact(self):
+        self.create_reviews(1)
+        review = self.client.get(reverse('service-review-list', args=[self.service.pk])).json()['results'][0]
+        self.assertNotIn('helpful_votes', review)
+        self.assertNotIn('comments', review)
+        self.assertEqual(review['comment_count'], 1)
+        self.assertEqual(review['helpful_count'], 1)
+
+
+class HelpfulCountTests(ReviewTestMixin, APITestCase):
+    """
+    Maintenance of the denormalized Review.helpful_count
+    """
+
+    def helpful_count(self, review):
+        review.refresh_from_db(fields=['helpful_count'])
+        return review.helpful_count
+
+    def test_votes_update_helpful_count(self):
+        review, = self.create_reviews(1)
+        self.assertEqual(self.helpful_count(review), 1)
+
+        vote = ReviewHelpfulVote.objects.get(review=review, user=self.voter)
+        vote.is_helpful = False
+        vote.save()
+        self.assertEqual(self.helpful_count(review), 0)
+
+        vote.is_helpful = True
+        vote.save()
+        ReviewHelpfulVote.objects.create(review=review, user=self.provider, is_helpful=False)
+        self.assertEqual(self.helpful_count(review), 1)
+
+        vote.delete()
+        self.assertEqual(self.helpful_count(review), 0)
+
+    def test_vote_and_count_commit_together(self):
+        review, = self.create_reviews(1)
+        vote = ReviewHelpfulVote.objects.get(review=review, user=self.voter)
+        with mock.patch('reviews.signals.apply_helpful_change', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ReviewHelpfulVote.objects.create(review=review, user=self.provider)
+            vote.is_helpful = False
+            with self.assertRaises(RuntimeError):
+                vote.save()
+        self.assertFalse(ReviewHelpfulVote.objects.filter(user=self.provider).exists())
+        vote.refresh_from_db()
+        self.assertTrue(vote.is_helpful)
+        self.assertEqual(self.helpful_count(review), 1)
+
+    def test_voting_again_replaces_the_vote(self):
+        review, = self.create_reviews(1)
+        url = reverse('review-helpful-vote-list', args=[review.pk])
+
+        response = self.client.post(url, {'user': self.voter.pk, 'is_helpful': False})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(ReviewHelpfulVote.objects.filter(review=review).count(), 1)
+        self.assertEqual(self.helpful_count(review), 0)
+
+        self.client.post(url, {'user': self.voter.pk, 'is_helpful': True})
+        self.assertEqual(self.helpful_count(review), 1)
+
+    def test_concurrent_first_votes_replace_each_other(self):
+        review, = self.create_reviews(1)
+        url = reverse('review-helpful-vote-list', args=[review.pk])
+        first = QuerySet.first
+        missed = []
+
+        def first_misses_once(queryset):
+            # The other request's vote commits after this one looked for it
+            if queryset.model is ReviewHelpfulVote and not missed:
+                missed.append(queryset)
+                return None
+            return first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', first_misses_once):
+            response = self.client.post(url, {'user': self.voter.pk, 'is_helpful': False})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(ReviewHelpfulVote.objects.filter(review=review).count(), 1)
+        self.assertEqual(self.helpful_count(review), 0)
+
+
+class ServiceRatingTests(ReviewTestMixin, APITestCase):
+    """
+    Maintenance of the denormalized rating aggregates on Service
+    """
+
+    def ratings(self):
+        self.service.refresh_from_db()
+        return (
+            self.service.rating_count, self.service.average_rating,
+            [getattr(self.service, f'rating_{rating}_count') for rating in range(1, 6)],
+        )
+
+    def test_only_approved_reviews_count(self):
+        review, = self.create_reviews(1, rating=4, status=ReviewStatus.PENDING)
+        review.refresh_from_db()
+        self.assertEqual(self.ratings(), (0, 0, [0, 0, 0, 0, 0]))
+
+        review.status = ReviewStatus.APPROVED
+        review.save()
+        self.create_reviews(1, rating=2)
+        self.assertEqual(self.ratings(), (2, 3.0, [0, 1, 0, 1, 0]))
+
+        review.rating = 5
+        review.save()
+        self.assertEqual(self.ratings(), (2, 3.5, [0, 1, 0, 0, 1]))
+
+        review.status = ReviewStatus.REJECTED
+        review.save()
+        self.assertEqual(self.ratings(), (1, 2.0, [0, 1, 0, 0, 0]))
+
+        review.status = ReviewStatus.APPROVED
+        review.save()
+        review.delete()
+        self.assertEqual(self.ratings(), (1, 2.0, [0, 1, 0, 0, 0]))
+
+    def test_loading_fixtures_leaves_the_aggregates_alone(self):
+        review, = self.create_reviews(1, rating=3)
+        review.refresh_from_db()
+        data = serializers.serialize('json', [review])
+        review.rating = 1
+        review.save()
+
+        for fixture in serializers.deserialize('json', data):
+            fixture.save()
+        self.assertEqual(self.ratings(), (1, 1.0, [1, 0, 0, 0, 0]))
+
+    def test_rebuild_recomputes_the_aggregates(self):
+        self.create_reviews(2, rating=4)
+        self.create_reviews(1, rating=1, status=ReviewStatus.PENDING)
+        Service.objects.filter(pk=self.service.pk).update(rating_count=7, rating_sum=3, average_rating=0.5)
+
+        call_command('rebuild_service_ratings', stdout=io.StringIO())
+        self.assertEqual(self.ratings(), (2, 4.0, [0, 0, 0, 2, 0]))
+
+    def test_migration_counts_reviews_approved_before_it(self):
+        migration = import_module('services.migrations.0008_backfill_rating_aggregates')
+        review, _ = self.create_reviews(2, rating=4)
+        # The state 0003 left behind: approved reviews, aggregates still at zero
+        Service.objects.filter(pk=self.service.pk).update(
+            rating_sum=0, rating_count=0, average_rating=0, rating_4_count=0,
+        )
+        migration.backfill_rating_aggregates(django_apps, None)
+        self.assertEqual(self.ratings(), (2, 4.0, [0, 0, 0, 2, 0]))
+
+        review.delete()
+        self.assertEqual(self.ratings(), (1, 4.0, [0, 0, 0, 1, 0]))
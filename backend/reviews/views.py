@@ -1,19 +1,30 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from .models import Review, ReviewComment, ReviewHelpfulVote
-from .serializers import ReviewSerializer, ReviewCommentSerializer, ReviewHelpfulVoteSerializer
+from django.db import IntegrityError, models, transaction
+from levi_backend.conditional import ConditionalRequestMixin
+from levi_backend.query_shaping import EagerLoadingViewMixin
+from .models import Review, ReviewComment, ReviewHelpfulVote, ReviewStatus
+from .serializers import (
+    ReviewSerializer, ReviewListSerializer, ReviewCommentSerializer, ReviewHelpfulVoteSerializer
+)
 
-class ReviewListView(generics.ListCreateAPIView):
+class ReviewListView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     """
     View for listing all reviews or creating a new review
     """
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_serializer_class(self):
+        # Lists use the compact representation, creation the full one
+        if self.request.method == 'GET':
+            return ReviewListSerializer
+        return ReviewSerializer
+    
     def get_queryset(self):
         # Users can see all approved reviews, but only their own pending ones
         return Review.objects.filter(
-            models.Q(status=Review.ReviewStatus.APPROVED) |
+            models.Q(status=ReviewStatus.APPROVED) |
             models.Q(reviewer=self.request.user)
         )
     
@@ -21,36 +32,37 @@ class ReviewListView(generics.ListCreateAPIView):
         # Set reviewer to current user when creating a review
         serializer.save(reviewer=self.request.user)
 
-class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ReviewDetailView(ConditionalRequestMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View for retrieving, updating or deleting a specific review
     """
     queryset = Review.objects.all()
+    validator_fields = ('updated_at', 'reviewer__updated_at', 'reviewee__updated_at', 'service__updated_at')
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class UserReviewListView(generics.ListAPIView):
+class UserReviewListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     View for listing all reviews written by the current user
     """
-    serializer_class = ReviewSerializer
+    serializer_class = ReviewListSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         # Return reviews where the current user is the reviewer
         return Review.objects.filter(reviewer=self.request.user)
 
-class ServiceReviewListView(generics.ListAPIView):
+class ServiceReviewListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     View for listing all reviews for a specific service
     """
-    serializer_class = ReviewSerializer
+    serializer_class = ReviewListSerializer
     permission_classes = [permissions.AllowAny]
     
     def get_queryset(self):
         # Filter reviews by service ID from URL parameters
         service_id = self.kwargs['service_id']
-        return Review.objects.filter(service_id=service_id, status=Review.ReviewStatus.APPROVED)
+        return Review.objects.filter(service_id=service_id, status=ReviewStatus.APPROVED)
 
 class ReviewCommentListView(generics.ListCreateAPIView):
     """
@@ -72,6 +84,8 @@ class ReviewCommentListView(generics.ListCreateAPIView):
 class ReviewHelpfulVoteListView(generics.ListCreateAPIView):
     """
     View for listing all helpful votes for a review or adding a new vote
+
+    Voting again on the same review replaces the user's previous vote.
     """
     serializer_class = ReviewHelpfulVoteSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -79,9 +93,22 @@ class ReviewHelpfulVoteListView(generics.ListCreateAPIView):
     def get_queryset(self):
         # Filter helpful votes by review ID from URL parameters
         review_id = self.kwargs['review_id']
-        return ReviewHelpfulVote.objects.filter(review_id=review_id)
+        return ReviewHelpfulVote.objects.filter(review_id=review_id).select_related('user')
     
     def perform_create(self, serializer):
         # Set the review and user when creating a helpful vote
         review_id = self.kwargs['review_id']
-        serializer.save(review_id=review_id, user=self.request.user)
\ No newline at end of file
+        try:
+            self.save_vote(serializer, review_id)
+        except IntegrityError:
+            # A concurrent request created the vote between our lookup and insert; replace it
+            self.save_vote(serializer, review_id)
+
+    def save_vote(self, serializer, review_id):
+        with transaction.atomic():
+            # Update an existing vote in place; the vote signals keep
+            # Review.helpful_count in step within this transaction
+            serializer.instance = ReviewHelpfulVote.objects.select_for_update().filter(
+                review_id=review_id, user=self.request.user
+            ).first()
+            serializer.save(review_id=review_id, user=self.request.user)
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Read-through cache of the active category tree.
+
+The tree is rendered once into a JSON blob together with its ETag and kept
+in the default cache under a version number. Saving or deleting a category
+bumps the version once the transaction commits, so the next read rebuilds
+the blob with a single query. Each process also remembers the last blob it
+used, so while the version is unchanged a read costs one cache lookup and
+no decoding. As with the principal cache, invalidation only reaches other
+processes when the default cache is shared (memcached or Redis).
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+
+VERSION_KEY = 'services:category_tree:version'
+# Seconds a blob is kept; versions make it safe to keep them long
+CATEGORY_TREE_CACHE_TTL = getattr(settings, 'CATEGORY_TREE_CACHE_TTL', 24 * 60 * 60)
+NODE_FIELDS = ('id', 'name', 'description', 'icon')
+
+# (version, blob) last served by this process
+_memo = (None, None)
+
+
+def blob_cache_key(version):
+    return f'services:category_tree:{version}'
+
+
+def new_version():
+    # Versions start from the clock so a cleared or evicted counter can never
+    # come back to a number a process still has memoized
+    return time.time_ns()
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_category_tree():
+    """
+    Move to a new version so the next read rebuilds the tree
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Nothing cached yet, or the version was evicted
+        cache.add(VERSION_KEY, new_version(), None)
+
+
+def build_tree():
+    """
+    Nest the active categories under their parents
+
+    A category whose parent is inactive is hidden together with its parent.
+    """
+    children = {}
+    for category in Category.objects.filter(is_active=True).values(*NODE_FIELDS, 'parent_id'):
+        children.setdefault(category.pop('parent_id'), []).append(category)
+
+    def nest(parent_id):
+        nodes = children.get(parent_id, [])
+        for node in nodes:
+            node['children'] = nest(node['id'])
+        return nodes
+
+    return nest(None)
+
+
+def render_tree():
+    """
+    Render the tree into a blob dict with the JSON body and its ETag
+    """
+    body = json.dumps({'categories': build_tree()}, separators=(',', ':')).encode()
+    return {'body': body, 'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"'}
+
+
+def get_category_tree():
+    """
+    Return the cached tree blob, building it on a miss
+    """
+    global _memo
+    version = current_version()
+    memo_version, blob = _memo
+    if memo_version == version:
+        return blob
+    key = blob_cache_key(version)
+    blob = cache.get(key)
+    if blob is None:
+        blob = render_tree()
+        cache.set(key, blob, CATEGORY_TREE_CACHE_TTL)
+    _memo = (version, blob)
+    return blob
@@ -0,0 +1,111 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.settings import api_settings
+from . import geo
+from .models import Category
+from .search import search_services, tokenize
+
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 200
+TRUE_VALUES = {'1', 'true', 'yes'}
+
+
+def search_query(request):
+    return request.query_params.get(api_settings.SEARCH_PARAM, '')
+
+
+def near_point(request):
+    """
+    Parse ?near=lat,lng&radius=km, returning None when no point was given
+    """
+    near = request.query_params.get('near')
+    if not near:
+        return None
+    try:
+        latitude, longitude = (float(value) for value in near.split(','))
+        radius = float(request.query_params.get('radius', DEFAULT_RADIUS_KM))
+    except ValueError:
+        raise ValidationError({'near': 'Expected near=<latitude>,<longitude> and a numeric radius in km.'})
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': 'Coordinates out of range.'})
+    if not 0 < radius <= MAX_RADIUS_KM:
+        raise ValidationError({'radius': f'Radius must be between 0 and {MAX_RADIUS_KM} km.'})
+    return latitude, longitude, radius
+
+
+class ServiceSearchFilter(BaseFilterBackend):
+    """
+    Full-text ?search= over services, annotating each match with search_rank
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return search_services(queryset, search_query(request))
+
+
+class ServiceCategoryFilter(BaseFilterBackend):
+    """
+    ?category=<id> for services in a category, with &include_descendants=1
+    for its whole subtree
+
+    The subtree is a prefix range on the indexed Category.path, so it takes a
+    primary key lookup for the path and one range query however deep it goes.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        category_id = request.query_params.get('category')
+        if not category_id:
+            return queryset
+        try:
+            category_id = int(category_id)
+        except ValueError:
+            raise ValidationError({'category': 'Expected a category id.'})
+        if request.query_params.get('include_descendants', '').lower() not in TRUE_VALUES:
+            return queryset.filter(category_id=category_id)
+        path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if not path:
+            return queryset.none()
+        return queryset.filter(category__path__startswith=path)
+
+
+class ServiceDistanceFilter(BaseFilterBackend):
+    """
+    ?near=lat,lng&radius=km for in-person services, annotating ``distance`` in km
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        point = near_point(request)
+        if point is None:
+            return queryset
+        queryset = queryset.filter(location_type__in=['in_person', 'both'])
+        return geo.filter_within(queryset, *point)
+
+
+class ServiceOrderingFilter(OrderingFilter):
+    """
+    ?ordering= for services, defaulting to relevance while searching and to
+    distance for ?near= queries
+
+    Accepts ``rating`` as an alias for best-rated first, which is what the
+    Discover screen sends. ``distance`` is only valid together with ?near=.
+    """
+    ordering_fields = ['price', 'average_rating', 'rating_count', 'created_at', 'id', 'distance']
+    ordering_aliases = {
+        'rating': '-average_rating',
+        '-rating': 'average_rating',
+    }
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if params:
+            fields = [self.ordering_aliases.get(param.strip(), param.strip()) for param in params.split(',')]
+            ordering = self.remove_invalid_fields(queryset, fields, view, request)
+            if near_point(request) is None:
+                ordering = [field for field in ordering if field.lstrip('-') != 'distance']
+            if ordering:
+                return ordering
+
+        if tokenize(search_query(request)):
+            return ['-search_rank']
+        if near_point(request) is not None:
+            return ['distance']
+        return self.get_default_ordering(view)
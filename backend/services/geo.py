@@ -0,0 +1,112 @@
+"""
+Geohash spatial index for in-person services.
+
+Services store a 12 character geohash next to their coordinates. A radius
+query picks the geohash precision whose cells are at least as large as the
+radius, so the search circle is always covered by the centre cell and its
+eight neighbours. Those nine prefixes become indexed range scans on the
+geohash column, and the exact haversine distance is only evaluated for the
+rows inside them.
+"""
+import math
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_LENGTH = 12
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=GEOHASH_LENGTH):
+    """
+    Encode a coordinate as a geohash string
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def cell_size(precision):
+    """
+    Return the (latitude, longitude) size in degrees of a geohash cell
+    """
+    lng_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision - lng_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def precision_for_radius(radius_km, latitude):
+    """
+    Return the finest precision whose cells span at least radius_km each way
+    """
+    for precision in range(GEOHASH_LENGTH, 0, -1):
+        lat_size, lng_size = cell_size(precision)
+        height_km = lat_size * KM_PER_DEGREE
+        width_km = lng_size * KM_PER_DEGREE * math.cos(math.radians(min(abs(latitude), 89.0)))
+        if height_km >= radius_km and width_km >= radius_km:
+            return precision
+    return 1
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Return the geohash prefixes of the cell containing a point and its neighbours
+    """
+    precision = precision_for_radius(radius_km, latitude)
+    lat_size, lng_size = cell_size(precision)
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        cell_lat = latitude + lat_step * lat_size
+        if not -90 <= cell_lat <= 90:
+            continue
+        for lng_step in (-1, 0, 1):
+            cell_lng = (longitude + lng_step * lng_size + 180) % 360 - 180
+            cells.add(encode(cell_lat, cell_lng, precision))
+    return sorted(cells)
+
+
+def distance_expression(latitude, longitude):
+    """
+    Haversine distance in km from a point to the row's latitude/longitude
+    """
+    lat = math.radians(latitude)
+    lng = math.radians(longitude)
+    half_chord = (
+        Power(Sin((Radians(F('latitude')) - lat) / 2), 2) +
+        math.cos(lat) * Cos(Radians(F('latitude'))) * Power(Sin((Radians(F('longitude')) - lng) / 2), 2)
+    )
+    return ExpressionWrapper(2 * EARTH_RADIUS_KM * ASin(Sqrt(half_chord)), output_field=FloatField())
+
+
+def filter_within(queryset, latitude, longitude, radius_km):
+    """
+    Restrict a queryset to rows within radius_km, annotated with ``distance`` in km
+    """
+    cells = Q()
+    for prefix in covering_cells(latitude, longitude, radius_km):
+        # '~' sorts after every geohash character, so this is a prefix range scan
+        cells |= Q(geohash__gte=prefix, geohash__lt=prefix + '~')
+    return queryset.filter(cells).annotate(
+        distance=distance_expression(latitude, longitude)
+    ).filter(distance__lte=radius_km)
@@ -0,0 +1,232 @@
+import json
+import logging
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from bookings.models import Booking
+from payments.models import Payment
+from reviews.models import Review
+from services.models import Category, Service
+from users import tokens
+from users.models import User
+
+# (name, url name, kwargs from fixtures, query params, who calls it)
+ENDPOINTS = [
+    ('users.list', 'user-list', {}, {}, 'admin'),
+    ('users.profile', 'user-profile', {}, {}, 'client'),
+    ('categories.list', 'category-list', {}, {}, 'client'),
+    ('categories.tree', 'category-tree', {}, {}, 'client'),
+    ('categories.detail', 'category-detail', {'pk': 'category'}, {}, 'client'),
+    ('services.list', 'service-list', {}, {}, 'client'),
+    ('services.list.search', 'service-list', {}, {'search': 'plumbing rep'}, 'client'),
+    ('services.list.near', 'service-list', {}, {'near': '5.6037,-0.1870', 'radius': 25}, 'client'),
+    ('services.list.top_rated', 'service-list', {}, {'ordering': 'rating'}, 'client'),
+    ('services.detail', 'service-detail', {'pk': 'service'}, {}, 'client'),
+    ('services.by_provider', 'provider-service-list', {'provider_id': 'provider'}, {}, 'client'),
+    ('services.images', 'service-image-list', {'service_id': 'service'}, {}, 'client'),
+    ('services.availability', 'service-availability-list', {'service_id': 'service'}, {}, 'client'),
+    ('services.slots', 'service-slot-list', {'service_id': 'service'}, {}, 'client'),
+    ('bookings.list', 'booking-list', {}, {}, 'client'),
+    ('bookings.list.sparse', 'booking-list', {}, {'fields': 'id,status,start_time,service_title'}, 'client'),
+    ('bookings.detail', 'booking-detail', {'pk': 'booking'}, {}, 'client'),
+    ('bookings.as_client', 'client-booking-list', {'client_id': 'client'}, {}, 'client'),
+    ('bookings.as_provider', 'provider-booking-list', {'provider_id': 'provider'}, {}, 'provider'),
+    ('bookings.change_logs', 'booking-change-log-list', {'booking_id': 'booking'}, {}, 'client'),
+    ('reviews.list', 'review-list', {}, {}, 'client'),
+    ('reviews.detail', 'review-detail', {'pk': 'review'}, {}, 'client'),
+    ('reviews.by_service', 'service-review-list', {'service_id': 'service'}, {}, 'client'),
+    ('reviews.by_user', 'user-review-list', {'user_id': 'client'}, {}, 'client'),
+    ('reviews.comments', 'review-comment-list', {'review_id': 'review'}, {}, 'client'),
+    ('reviews.helpful_votes', 'review-helpful-vote-list', {'review_id': 'review'}, {}, 'client'),
+    ('notifications.list', 'notification-list', {}, {}, 'client'),
+    ('notifications.unread', 'unread-notification-list', {}, {}, 'client'),
+    ('notifications.unread_count', 'unread-notification-count', {}, {}, 'client'),
+    ('notifications.preferences', 'user-notification-preferences', {}, {}, 'client'),
+    ('payments.list', 'payment-list', {}, {}, 'admin'),
+    ('payments.list.sparse', 'payment-list', {}, {'fields': 'id,amount,status,created_at'}, 'admin'),
+    ('payments.detail', 'payment-detail', {'pk': 'payment'}, {}, 'client'),
+    ('payments.by_user', 'user-payment-list', {'user_id': 'client'}, {}, 'client'),
+    ('payments.by_booking', 'booking-payment-detail', {'booking_id': 'booking'}, {}, 'client'),
+    ('payments.refunds', 'refund-list', {'payment_id': 'payment'}, {}, 'client'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the API endpoints through the test client, recording latency '
+        'percentiles, query counts and response sizes to a JSON baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per endpoint')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run endpoints whose name starts with this (repeatable)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Compare against a JSON baseline written by --output')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='p95 ratio against the baseline that counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--as-user', metavar='USERNAME',
+                            help='Staff user to call the admin endpoints as (default: the first staff user)')
+
+    def handle(self, *args, **options):
+        # 4xx responses are recorded in the results; don't log each request
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        fixtures = self.fixtures(options['as_user'])
+        results = {}
+        for name, url_name, kwargs, params, role in ENDPOINTS:
+            if options['endpoints'] and not any(name.startswith(prefix) for prefix in options['endpoints']):
+                continue
+            try:
+                url = reverse(url_name, kwargs={
+                    key: getattr(fixtures[value], 'pk', fixtures[value]) for key, value in kwargs.items()
+                })
+                user = fixtures[role]
+            except KeyError as missing:
+                self.stdout.write(f'{name:28} skipped, no {missing} in the database')
+                continue
+            results[name] = self.measure(url, params, user, options['warmup'], options['requests'])
+            self.stdout.write(self.format_result(name, results[name]))
+
+        report = {
+            'commit': self.commit(),
+            'database': connection.vendor,
+            'rows': {
+                model.__name__: model.objects.count()
+                for model in (User, Service, Booking, Review, Payment)
+            },
+            'requests': options['requests'],
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} endpoint results to {options["output"]}'))
+        if options['compare']:
+            regressions = self.compare(report, options['compare'], options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} endpoints regressed: {", ".join(regressions)}')
+
+    def fixtures(self, as_user=None):
+        """
+        Pick the users and objects the endpoints are called with
+
+        Nothing is written: without a staff user the admin endpoints are skipped.
+        """
+        fixtures = {}
+        staff = User.objects.filter(is_staff=True)
+        if as_user:
+            admin = staff.filter(username=as_user).first()
+            if admin is None:
+                raise CommandError(f'No staff user named "{as_user}"')
+        else:
+            admin = staff.order_by('pk').first()
+        if admin is not None:
+            fixtures['admin'] = admin
+
+        # The busiest client and provider make for the heaviest pages
+        booked = Booking.objects.all()
+        if Payment.objects.exists():
+            # Someone with a payment, so the payment endpoints have data too
+            booked = booked.filter(client__bookings_as_client__payment__isnull=False)
+        client_id = (
+            booked.values('client').annotate(total=Count('pk')).order_by('-total')
+            .values_list('client', flat=True).first()
+        )
+        bookings = Booking.objects.filter(client_id=client_id)
+        booking = bookings.filter(payment__isnull=False).first() or bookings.first()
+        if booking is not None:
+            fixtures.update(
+                client=booking.client, provider=booking.provider, booking=booking.pk, service=booking.service_id
+            )
+        elif admin is not None:
+            fixtures['client'] = admin
+        review = Review.objects.filter(service_id=fixtures.get('service')).first() or Review.objects.first()
+        payment = Payment.objects.filter(booking__client_id=client_id).first()
+        category = Category.objects.first()
+        for key, instance in (('review', review), ('payment', payment), ('category', category)):
+            if instance is not None:
+                fixtures[key] = instance.pk
+        return fixtures
+
+    def measure(self, url, params, user, warmup, requests):
+        # Record server errors as a status instead of aborting the run
+        client = APIClient(raise_request_exception=False, HTTP_HOST=self.host())
+        # Real bearer tokens, so authentication is part of what is measured
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens.issue(user, tokens.ACCESS)}')
+        for _ in range(warmup):
+            client.get(url, params)
+
+        timings = []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        return {
+            'url': url,
+            'params': params,
+            'status': response.status_code,
+            'p50_ms': round(quantiles[49], 3),
+            'p95_ms': round(quantiles[94], 3),
+            'p99_ms': round(quantiles[98], 3),
+            'max_ms': round(timings[-1], 3),
+            'queries': len(context),
+            'bytes': len(response.content),
+        }
+
+    def host(self):
+        # A host the site accepts; 'localhost' is allowed by default when DEBUG is on
+        for host in settings.ALLOWED_HOSTS:
+            if host != '*':
+                return host.lstrip('.')
+        return 'localhost'
+
+    def format_result(self, name, result):
+        return (
+            f'{name:28} {result["status"]} p50={result["p50_ms"]:8.2f}ms p95={result["p95_ms"]:8.2f}ms '
+            f'p99={result["p99_ms"]:8.2f}ms queries={result["queries"]:3} bytes={result["bytes"]}'
+        )
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, report, path, threshold):
+        """
+        Print the change against a baseline and return the regressed endpoints
+        """
+        with open(path) as handle:
+            baseline = json.load(handle)
+        self.stdout.write(f'\nAgainst {path} (commit {baseline.get("commit")}):')
+        regressions = []
+        for name, result in report['endpoints'].items():
+            before = baseline['endpoints'].get(name)
+            if before is None:
+                continue
+            ratio = result['p95_ms'] / max(before['p95_ms'], 1e-9)
+            regressed = ratio > threshold or result['queries'] > before['queries']
+            if regressed:
+                regressions.append(name)
+            self.stdout.write(
+                f'{name:28} p95 {before["p95_ms"]:8.2f} -> {result["p95_ms"]:8.2f}ms ({ratio:5.2f}x) '
+                f'queries {before["queries"]:3} -> {result["queries"]:3} '
+                f'bytes {before["bytes"]} -> {result["bytes"]}'
+                + ('  REGRESSED' if regressed else '')
+            )
+        return regressions
@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from services import search
+from services.models import Category, Service
+from users.models import User
+
+WORDS = [
+    'plumbing', 'leak', 'pipe', 'drain', 'electrical', 'wiring', 'outlet', 'lighting',
+    'cleaning', 'deep', 'carpet', 'window', 'garden', 'lawn', 'hedge', 'landscaping',
+    'moving', 'furniture', 'boxes', 'painting', 'interior', 'exterior', 'carpentry',
+    'cabinet', 'repair', 'install', 'heating', 'cooling', 'ventilation', 'emergency',
+    'licensed', 'certified', 'affordable', 'weekend', 'same', 'day', 'residential',
+    'commercial', 'inspection', 'maintenance',
+]
+FIRST_NAMES = ['John', 'Jane', 'Mike', 'Sarah', 'Ama', 'Kofi', 'Lena', 'Omar', 'Priya', 'Tomas']
+LAST_NAMES = ['Doe', 'Smith', 'Green', 'Clean', 'Mensah', 'Owusu', 'Novak', 'Haddad', 'Rao', 'Silva']
+
+
+class Command(BaseCommand):
+    help = 'Measure service search latency, optionally populating synthetic services first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--populate', type=int, default=0,
+                            help='Create synthetic services until at least this many exist')
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['populate']:
+            self.populate(options['populate'], rng)
+
+        total = Service.objects.count()
+        queries = [self.random_query(rng) for _ in range(options['queries'])]
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            queryset = search.search_services(Service.objects.filter(is_available=True), query)
+            list(queryset.order_by('-search_rank', '-pk').values_list('pk', flat=True)[:options['page_size']])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        quantiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'{len(timings)} queries over {total} services ({search.get_backend().__class__.__name__}): '
+            f'p50={quantiles[49]:.2f}ms p95={quantiles[94]:.2f}ms p99={quantiles[98]:.2f}ms '
+            f'max={timings[-1]:.2f}ms'
+        )
+
+    def random_query(self, rng):
+        words = rng.sample(WORDS, rng.choice([1, 1, 2]))
+        # Half the queries simulate type-ahead with a partially typed last word
+        if rng.random() < 0.5:
+            words[-1] = words[-1][:rng.randint(2, max(2, len(words[-1]) - 1))]
+        return ' '.join(words)
+
+    def populate(self, target, rng):
+        missing = target - Service.objects.count()
+        if missing <= 0:
+            return
+
+        categories = [
+            Category.objects.get_or_create(name=f'Benchmark {word.title()}')[0]
+            for word in WORDS[:20]
+        ]
+        providers = []
+        for index in range(200):
+            provider, _ = User.objects.get_or_create(
+                email=f'benchmark-provider-{index}@example.com',
+                defaults={
+                    'username': f'benchmark_provider_{index}',
+                    'first_name': rng.choice(FIRST_NAMES),
+                    'last_name': rng.choice(LAST_NAMES),
+                    'is_provider': True,
+                },
+            )
+            providers.append(provider)
+
+        # Dilute descriptions with a long tail of rare words like real listings
+        filler = [f'word{index}' for index in range(5000)]
+        self.stdout.write(f'Creating {missing} services...')
+        with transaction.atomic():
+            batch = []
+            for _ in range(missing):
+                batch.append(Service(
+                    provider=rng.choice(providers),
+                    category=rng.choice(categories),
+                    title=' '.join(rng.sample(WORDS, 3)).title(),
+                    description=' '.join(rng.choices(WORDS, k=5) + rng.choices(filler, k=20)),
+                    price=rng.randint(20, 200),
+                    duration=rng.choice([30, 60, 90, 120]),
+                ))
+                if len(batch) == 5000:
+                    Service.objects.bulk_create(batch)
+                    batch = []
+            Service.objects.bulk_create(batch)
+            # bulk_create bypasses the post_save signal, so index in one pass
+            search.rebuild_index()
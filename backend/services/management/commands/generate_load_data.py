@@ -0,0 +1,430 @@
+import random
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from bookings.models import (
+    BLOCKING_STATUSES, Booking, BookingChangeLog, BookingSlot, BookingStatus, PaymentStatus as BookingPaymentStatus,
+)
+from media_files.models import MediaFile
+from notifications.counters import rebuild_unread_counts
+from notifications.models import (
+    Notification, NotificationChannel, NotificationStatus, NotificationType, UserNotificationPreference,
+)
+from payments.models import Payment, PaymentMethod, PaymentStatus, Refund
+from reviews.models import Review, ReviewComment, ReviewHelpfulVote, ReviewStatus
+from services import geo, search
+from services.models import Availability, Category, Service, ServiceImage
+from services.ratings import rebuild_rating_aggregates
+from users.models import User, UserProfile
+from .benchmark_search import FIRST_NAMES, LAST_NAMES, WORDS
+
+CATEGORY_TREE = {
+    'Home Repair': ['Plumbing', 'Electrical', 'Carpentry', 'HVAC', 'Painting'],
+    'Cleaning': ['House Cleaning', 'Carpet Cleaning', 'Window Cleaning'],
+    'Outdoors': ['Gardening', 'Landscaping', 'Pest Control'],
+    'Moving': ['Local Moving', 'Packing', 'Furniture Assembly'],
+    'Lessons': ['Music Lessons', 'Tutoring', 'Fitness Training'],
+}
+# Centres services are scattered around: Accra, Kumasi, London, New York, Lagos
+CITIES = [(5.6037, -0.1870), (6.6885, -1.6244), (51.5072, -0.1276), (40.7128, -74.0060), (6.5244, 3.3792)]
+DURATIONS = [30, 45, 60, 90, 120, 180]
+# Bookings of one provider are at least this far apart, so they never overlap
+BOOKING_SPACING = timedelta(hours=3)
+PAST_DAYS = 365
+FUTURE_DAYS = 90
+# Share of users who saved notification preferences, and the odds of each switch being on
+PREFERENCE_SHARE = 0.3
+PREFERENCE_ODDS = {
+    'email_notifications_enabled': 0.8,
+    'sms_notifications_enabled': 0.2,
+    'push_notifications_enabled': 0.7,
+    'in_app_notifications_enabled': 0.95,
+    'booking_notifications': 0.95,
+    'review_notifications': 0.8,
+    'promotion_notifications': 0.4,
+    'system_notifications': 0.98,
+}
+# Shares of reviews with a provider reply and with photos, and the most helpful votes per review
+REPLY_SHARE = 0.4
+PHOTO_SHARE = 0.1
+MAX_VOTES = 6
+# Share of completed payments partly refunded
+REFUND_SHARE = 0.05
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill every model but the outbox with synthetic data using bulk inserts, e.g. '
+        '--users 1000000 --services 200000 --bookings 5000000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Client users to create')
+        parser.add_argument('--providers', type=int, default=1000, help='Provider users to create')
+        parser.add_argument('--services', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=50000)
+        parser.add_argument('--reviews', type=int, default=20000,
+                            help='Reviews of completed bookings (at most one per booking)')
+        parser.add_argument('--payments', type=int, default=30000,
+                            help='Payments of confirmed or completed bookings (at most one per booking)')
+        parser.add_argument('--notifications', type=int, default=50000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='load',
+                            help='Prefix of generated emails and usernames; must be unused')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        if User.objects.filter(email__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f'Users with the prefix "{self.prefix}" already exist; pick another --prefix')
+        if options['providers'] < 1 and options['services']:
+            raise CommandError('Services need at least one provider')
+
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        self.password = make_password('password')
+        started = time.perf_counter()
+
+        categories = self.create_categories()
+        clients = self.create_users('user', options['users'], is_provider=False)
+        providers = self.create_users('provider', options['providers'], is_provider=True)
+        services = self.create_services(options['services'], providers, categories)
+        if services and clients:
+            self.create_bookings(options, clients, services)
+        if clients:
+            self.create_notifications(options['notifications'], clients)
+
+        self.stdout.write('Rebuilding rating aggregates, unread counters and the search index...')
+        rebuild_rating_aggregates()
+        rebuild_unread_counts()
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Generated load data in {time.perf_counter() - started:.1f}s'))
+
+    def report(self, model, count, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {count} {model} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s)')
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def create_categories(self):
+        categories = []
+        for parent_name, children in CATEGORY_TREE.items():
+            parent, _ = Category.objects.get_or_create(name=parent_name)
+            for name in children:
+                category, _ = Category.objects.get_or_create(name=name, defaults={'parent': parent})
+                categories.append(category.pk)
+        return categories
+
+    def create_users(self, kind, total, is_provider):
+        """
+        Create users and profiles, returning their ids in creation order
+        """
+        started = time.perf_counter()
+        ids = array('q')
+        for start, size in self.batches(total):
+            users = []
+            for index in range(start, start + size):
+                first_name, last_name = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                users.append(User(
+                    email=self.email(kind, index),
+                    username=f'{self.prefix}_{kind}_{index}',
+                    first_name=first_name,
+                    last_name=last_name,
+                    password=self.password,
+                    is_provider=is_provider,
+                ))
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                UserProfile.objects.bulk_create([
+                    UserProfile(user=user, location=self.rng.choice(['Accra', 'Kumasi', 'London', 'Lagos']))
+                    for user in users
+                ])
+                # The rest fall back to the preference defaults, as in production
+                UserNotificationPreference.objects.bulk_create([
+                    UserNotificationPreference(
+                        user=user, **{name: self.rng.random() < odds for name, odds in PREFERENCE_ODDS.items()}
+                    )
+                    for user in users if self.rng.random() < PREFERENCE_SHARE
+                ])
+            ids.extend(user.pk for user in users)
+        self.report(f'{kind}s', total, started)
+        return ids
+
+    def email(self, kind, index):
+        return f'{self.prefix}-{kind}-{index}@example.com'
+
+    def create_services(self, total, providers, categories):
+        """
+        Create services with weekday availability, returning (id, provider, price, duration) rows
+        """
+        started = time.perf_counter()
+        services = []
+        for start, size in self.batches(total):
+            batch = []
+            for _ in range(size):
+                latitude, longitude = self.rng.choice(CITIES)
+                latitude += self.rng.uniform(-0.3, 0.3)
+                longitude += self.rng.uniform(-0.3, 0.3)
+                words = self.rng.sample(WORDS, 4)
+                batch.append(Service(
+                    provider_id=providers[self.rng.randrange(len(providers))],
+                    category_id=self.rng.choice(categories),
+                    title=' '.join(words[:2]).title(),
+                    description=' '.join(self.rng.choices(WORDS, k=20)),
+                    price=Decimal(self.rng.randrange(2000, 30000)) / 100,
+                    duration=self.rng.choice(DURATIONS),
+                    location_type=self.rng.choice(['in_person', 'in_person', 'online', 'both']),
+                    latitude=latitude,
+                    longitude=longitude,
+                    # bulk_create skips Service.save, which normally sets this
+                    geohash=geo.encode(latitude, longitude),
+                    is_featured=self.rng.random() < 0.05,
+                ))
+            with transaction.atomic():
+                Service.objects.bulk_create(batch)
+                Availability.objects.bulk_create([
+                    Availability(service=service, day_of_week=day, start_time='09:00', end_time='17:00')
+                    for service in batch for day in range(5)
+                ])
+                ServiceImage.objects.bulk_create([
+                    ServiceImage(
+                        service=service, image=f'service_images/{self.prefix}-{service.pk}.jpg', is_primary=True,
+                    )
+                    for service in batch
+                ])
+            services.extend((service.pk, service.provider_id, service.price, service.duration) for service in batch)
+        self.report('services', total, started)
+        return services
+
+    def create_bookings(self, options, clients, services):
+        """
+        Create bookings together with their reviews, payments and slot claims
+
+        Each provider's bookings are spread evenly over the past year and the
+        next quarter, at least BOOKING_SPACING apart so they never overlap.
+        """
+        started = time.perf_counter()
+        total = options['bookings']
+        # Pick every booking's service up front to know each provider's load
+        picks = array('q', (self.rng.randrange(len(services)) for _ in range(total)))
+        per_provider = {}
+        for pick in picks:
+            provider_id = services[pick][1]
+            per_provider[provider_id] = per_provider.get(provider_id, 0) + 1
+        window = timedelta(days=PAST_DAYS + FUTURE_DAYS)
+        quarter_hour = timedelta(minutes=15)
+        spacing = {
+            provider_id: max(BOOKING_SPACING, window / count // quarter_hour * quarter_hour)
+            for provider_id, count in per_provider.items()
+        }
+        first_start = self.now - timedelta(days=PAST_DAYS)
+        next_slot = {}
+        counts = dict.fromkeys(['reviews', 'comments', 'votes', 'photos', 'payments', 'refunds', 'change_logs'], 0)
+        claim_slots = connection.vendor != 'postgresql'
+
+        for start, size in self.batches(total):
+            bookings = []
+            for pick in picks[start:start + size]:
+                service_id, provider_id, price, duration = services[pick]
+                slot = next_slot.get(provider_id, 0)
+                next_slot[provider_id] = slot + 1
+                start_time = first_start + slot * spacing[provider_id]
+                client_index = self.rng.randrange(len(clients))
+                booking = Booking(
+                    client_id=clients[client_index],
+                    provider_id=provider_id,
+                    service_id=service_id,
+                    status=self.booking_status(start_time),
+                    start_time=start_time,
+                    end_time=start_time + timedelta(minutes=duration),
+                    duration=duration,
+                    price=price,
+                    location_type=self.rng.choice(['in_person', 'online']),
+                )
+                if booking.status == BookingStatus.COMPLETED:
+                    booking.payment_status = BookingPaymentStatus.PAID
+                # Remembered for the payment's customer email
+                booking.client_index = client_index
+                bookings.append(booking)
+
+            with transaction.atomic():
+                Booking.objects.bulk_create(bookings)
+                if claim_slots:
+                    self.claim_slots(bookings)
+                self.create_change_logs(bookings, counts)
+                self.create_reviews(bookings, options['reviews'], clients, counts)
+                self.create_payments(bookings, options['payments'], counts)
+        self.report('bookings', total, started)
+        self.stdout.write(
+            f'  {counts["reviews"]} reviews with {counts["comments"]} comments, {counts["votes"]} helpful votes '
+            f'and {counts["photos"]} photos, {counts["payments"]} payments with {counts["refunds"]} refunds, '
+            f'{counts["change_logs"]} change logs'
+        )
+
+    def claim_slots(self, bookings):
+        """
+        Insert the BookingSlot rows Booking.save would have claimed
+
+        There are many slots per booking, so they skip model instances and go
+        straight to executemany.
+        """
+        table = connection.ops.quote_name(BookingSlot._meta.db_table)
+        adapt = connection.ops.adapt_datetimefield_value
+        rows = [
+            (booking.pk, booking.provider_id, adapt(slot_start))
+            for booking in bookings if booking.status in BLOCKING_STATUSES
+            for slot_start in BookingSlot.slot_starts(booking.start_time, booking.end_time)
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} (booking_id, provider_id, slot_start) VALUES (%s, %s, %s)', rows
+            )
+
+    def create_change_logs(self, bookings, counts):
+        """
+        Log the move out of pending of every booking that left it
+        """
+        logs = []
+        for booking in bookings:
+            if booking.status == BookingStatus.PENDING:
+                continue
+            by_client = booking.status == BookingStatus.CANCELLED and self.rng.random() < 0.7
+            logs.append(BookingChangeLog(
+                booking=booking,
+                previous_status=BookingStatus.PENDING,
+                new_status=booking.status,
+                changed_by_id=booking.client_id if by_client else booking.provider_id,
+                reason='Plans changed' if by_client else '',
+            ))
+        BookingChangeLog.objects.bulk_create(logs)
+        counts['change_logs'] += len(logs)
+
+    def booking_status(self, start_time):
+        roll = self.rng.random()
+        if start_time > self.now:
+            if roll < 0.1:
+                return BookingStatus.CANCELLED
+            return BookingStatus.CONFIRMED if roll < 0.6 else BookingStatus.PENDING
+        if roll < 0.8:
+            return BookingStatus.COMPLETED
+        return BookingStatus.CANCELLED if roll < 0.95 else BookingStatus.NO_SHOW
+
+    def create_reviews(self, bookings, target, clients, counts):
+        """
+        Create reviews of completed bookings with their replies, helpful votes and photos
+        """
+        reviews, votes = [], []
+        for booking in bookings:
+            if counts['reviews'] + len(reviews) >= target:
+                break
+            if booking.status != BookingStatus.COMPLETED or self.rng.random() < 0.3:
+                continue
+            words = self.rng.sample(WORDS, 3)
+            review = Review(
+                booking=booking,
+                reviewer_id=booking.client_id,
+                reviewee_id=booking.provider_id,
+                service_id=booking.service_id,
+                rating=self.rng.choices(range(1, 6), weights=[1, 1, 3, 8, 12])[0],
+                title=' '.join(words).capitalize(),
+                comment=' '.join(self.rng.choices(WORDS, k=15)),
+                status=ReviewStatus.APPROVED if self.rng.random() < 0.9 else ReviewStatus.PENDING,
+            )
+            voters = self.rng.sample(range(len(clients)), min(len(clients), self.rng.randrange(MAX_VOTES)))
+            review_votes = [
+                ReviewHelpfulVote(review=review, user_id=clients[voter], is_helpful=self.rng.random() < 0.8)
+                for voter in voters
+            ]
+            # bulk_create skips the vote signals that keep this in step
+            review.helpful_count = sum(vote.is_helpful for vote in review_votes)
+            reviews.append(review)
+            votes.extend(review_votes)
+        Review.objects.bulk_create(reviews)
+        ReviewHelpfulVote.objects.bulk_create(votes)
+
+        comments = ReviewComment.objects.bulk_create([
+            ReviewComment(review=review, user_id=review.reviewee_id, content=' '.join(self.rng.choices(WORDS, k=10)))
+            for review in reviews if self.rng.random() < REPLY_SHARE
+        ])
+        photographed = [review for review in reviews if self.rng.random() < PHOTO_SHARE]
+        photos = MediaFile.objects.bulk_create([
+            MediaFile(
+                title=f'Review {review.pk} photo', file=f'media/{self.prefix}-review-{review.pk}.jpg',
+                file_type='image', mime_type='image/jpeg', size=self.rng.randrange(50000, 2000000),
+                uploaded_by_id=review.reviewer_id,
+            )
+            for review in photographed
+        ])
+        Review.images.through.objects.bulk_create([
+            Review.images.through(review_id=review.pk, mediafile_id=photo.pk)
+            for review, photo in zip(photographed, photos)
+        ])
+        counts['reviews'] += len(reviews)
+        counts['comments'] += len(comments)
+        counts['votes'] += len(votes)
+        counts['photos'] += len(photos)
+
+    def create_payments(self, bookings, target, counts):
+        payments = []
+        for booking in bookings:
+            if counts['payments'] + len(payments) >= target:
+                break
+            if booking.status not in (BookingStatus.COMPLETED, BookingStatus.CONFIRMED):
+                continue
+            fee = (booking.price * Decimal('0.05')).quantize(Decimal('0.01'))
+            paid = booking.status == BookingStatus.COMPLETED
+            payments.append(Payment(
+                booking=booking,
+                amount=booking.price,
+                payment_method=self.rng.choice(PaymentMethod.values),
+                status=PaymentStatus.COMPLETED if paid else PaymentStatus.PENDING,
+                transaction_id=f'{self.prefix}-txn-{booking.pk}',
+                customer_email=self.email('user', booking.client_index),
+                customer_name='Load Test Client',
+                service_fee=fee,
+                total_amount=booking.price + fee,
+                processed_at=booking.start_time if paid else None,
+            ))
+        Payment.objects.bulk_create(payments)
+        refunds = Refund.objects.bulk_create([
+            Refund(
+                payment=payment,
+                amount=(payment.amount * Decimal(self.rng.choice(['0.25', '0.5', '1']))).quantize(Decimal('0.01')),
+                reason='Service partly delivered',
+                status=PaymentStatus.COMPLETED,
+                processed_at=payment.processed_at,
+            )
+            for payment in payments
+            if payment.status == PaymentStatus.COMPLETED and self.rng.random() < REFUND_SHARE
+        ])
+        counts['payments'] += len(payments)
+        counts['refunds'] += len(refunds)
+
+    def create_notifications(self, total, clients):
+        started = time.perf_counter()
+        for start, size in self.batches(total):
+            notifications = []
+            for _ in range(size):
+                is_read = self.rng.random() < 0.6
+                notifications.append(Notification(
+                    recipient_id=clients[self.rng.randrange(len(clients))],
+                    type=self.rng.choice(NotificationType.values),
+                    channel=self.rng.choice(NotificationChannel.values),
+                    status=NotificationStatus.READ if is_read else NotificationStatus.DELIVERED,
+                    title=' '.join(self.rng.sample(WORDS, 3)).capitalize(),
+                    message=' '.join(self.rng.choices(WORDS, k=12)),
+                    is_read=is_read,
+                    read_at=self.now if is_read else None,
+                    sent_at=self.now,
+                ))
+            Notification.objects.bulk_create(notifications)
+        self.report('notifications', total, started)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from services.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized rating aggregates on services from approved reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--service', type=int, action='append', dest='service_ids',
+                            help='Only rebuild the given service id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_rating_aggregates(
+            service_ids=options['service_ids'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {rebuilt} rated services'))
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 10:02
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from services import search
+
+    backend = search.get_backend(schema_editor.connection)
+    with schema_editor.connection.cursor() as cursor:
+        backend.create_index(cursor)
+        backend.reindex(cursor, '1 = 1', [])
+
+
+def drop_search_index(apps, schema_editor):
+    from services import search
+
+    with schema_editor.connection.cursor() as cursor:
+        search.get_backend(schema_editor.connection).drop_index(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0004_list_ordering_indexes'),
+        ('users', '0002_list_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
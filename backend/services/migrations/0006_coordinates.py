@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0005_service_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 14:40
+
+from django.db import migrations, models
+
+
+def backfill_category_paths(apps, schema_editor):
+    # Walk down from the roots so every parent's path is known before its children
+    Category = apps.get_model('services', 'Category')
+    children = {}
+    for pk, parent_id in Category.objects.values_list('pk', 'parent_id').iterator():
+        children.setdefault(parent_id, []).append(pk)
+    paths = {}
+    pending = [(pk, '/') for pk in children.get(None, [])]
+    while pending:
+        pk, parent_path = pending.pop()
+        paths[pk] = f'{parent_path}{pk}/'
+        pending.extend((child, paths[pk]) for child in children.get(pk, []))
+    Category.objects.bulk_update(
+        [Category(pk=pk, path=path) for pk, path in paths.items()], ['path'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0006_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
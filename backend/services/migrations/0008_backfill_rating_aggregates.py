@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-17 21:05
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+RATINGS = range(1, 6)
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    # 0003 added the aggregates at zero; count the reviews approved before they were maintained
+    Review = apps.get_model('reviews', 'Review')
+    Service = apps.get_model('services', 'Service')
+    counted = Review.objects.filter(status='approved').order_by().values('service_id').annotate(
+        total=Sum('rating'),
+        count=Count('pk'),
+        **{f'count_{rating}': Count('pk', filter=Q(rating=rating)) for rating in RATINGS}
+    )
+    services = [
+        Service(
+            pk=row['service_id'], rating_sum=row['total'], rating_count=row['count'],
+            average_rating=row['total'] / row['count'],
+            **{f'rating_{rating}_count': row[f'count_{rating}'] for rating in RATINGS}
+        )
+        for row in counted.iterator()
+    ]
+    fields = ['rating_sum', 'rating_count', 'average_rating', *(f'rating_{rating}_count' for rating in RATINGS)]
+    Service.objects.bulk_update(services, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0007_category_path'),
+        ('reviews', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
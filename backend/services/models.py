@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from users.models import User
+from . import geo
 
 class Category(models.Model):
     """
@@ -9,6 +12,8 @@ class Category(models.Model):
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, blank=True)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children')
+    # Materialized ids from the root down, e.g. '/1/5/12/'; a subtree is a prefix range
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -16,6 +21,38 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Keep the materialized paths of this category and its subtree in step with parent
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'parent', 'parent_id'} & set(update_fields):
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self.pk:
+                # The in-memory path may predate a move of an ancestor
+                self.path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+            parent_path = '/'
+            if self.parent_id:
+                parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+                if self.path and parent_path.startswith(self.path):
+                    raise ValueError('A category cannot be moved under itself or its subcategories')
+            super().save(*args, **kwargs)
+            path = f'{parent_path}{self.pk}/'
+            if path != self.path:
+                Category.move_subtree(self.path, path, pk=self.pk)
+                self.path = path
+
+    @staticmethod
+    def move_subtree(old_path, new_path, pk=None):
+        """
+        Replace the old_path prefix with new_path for a category and its descendants
+        """
+        if not old_path:
+            Category.objects.filter(pk=pk).update(path=new_path)
+            return
+        Category.objects.filter(path__startswith=old_path).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+        )
+
     class Meta:
         verbose_name_plural = 'categories'
         ordering = ['name']
@@ -40,16 +77,50 @@ class Service(models.Model):
         default='both'
     )
     service_area = models.CharField(max_length=200, blank=True, help_text="Service area for in-person services")
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     is_available = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
+    # Denormalized aggregates over approved reviews, maintained by services.ratings
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Keep the spatial index in step with the coordinates
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+    @property
+    def rating_histogram(self):
+        """
+        Number of approved reviews per star rating
+        """
+        return {str(rating): getattr(self, f'rating_{rating}_count') for rating in range(1, 6)}
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_available', '-created_at']),
+            models.Index(fields=['provider', '-created_at']),
+        ]
 
 class ServiceImage(models.Model):
     """
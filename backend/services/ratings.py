@@ -0,0 +1,78 @@
+"""
+Maintenance of the denormalized rating aggregates on Service.
+
+Only approved reviews count towards a service's rating. Changes are applied
+incrementally with single UPDATE statements built from F() expressions, so
+concurrent reviews of the same service never lose an update.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .models import Service
+
+RATINGS = range(1, 6)
+
+
+def apply_rating_change(service_id, rating, delta):
+    """
+    Add (delta=1) or remove (delta=-1) one approved rating from a service
+    """
+    rating_sum = F('rating_sum') + rating * delta
+    rating_count = F('rating_count') + delta
+    Service.objects.filter(pk=service_id).update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        average_rating=Coalesce(
+            Cast(rating_sum, FloatField()) / NullIf(rating_count, 0),
+            Value(0.0),
+        ),
+        updated_at=timezone.now(),
+        **{f'rating_{rating}_count': F(f'rating_{rating}_count') + delta},
+    )
+
+
+def rebuild_rating_aggregates(service_ids=None, batch_size=1000):
+    """
+    Recompute the rating aggregates from the reviews table in bulk
+
+    Returns the number of services that have at least one approved review.
+    """
+    from reviews.models import Review, ReviewStatus
+
+    services = Service.objects.all()
+    reviews = Review.objects.filter(status=ReviewStatus.APPROVED)
+    if service_ids is not None:
+        services = services.filter(pk__in=service_ids)
+        reviews = reviews.filter(service_id__in=service_ids)
+
+    aggregates = reviews.values('service_id').order_by().annotate(
+        total=Sum('rating'),
+        count=Count('id'),
+        **{f'count_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS}
+    )
+
+    fields = ['rating_sum', 'rating_count', 'average_rating']
+    fields += [f'rating_{rating}_count' for rating in RATINGS]
+    rebuilt = 0
+    with transaction.atomic():
+        services.update(**{field: 0 for field in fields})
+        batch = []
+        for row in aggregates.iterator(chunk_size=batch_size):
+            service = Service(
+                pk=row['service_id'],
+                rating_sum=row['total'],
+                rating_count=row['count'],
+                average_rating=row['total'] / row['count'],
+                **{f'rating_{rating}_count': row[f'count_{rating}'] for rating in RATINGS}
+            )
+            batch.append(service)
+            if len(batch) >= batch_size:
+                Service.objects.bulk_update(batch, fields)
+                rebuilt += len(batch)
+                batch = []
+        if batch:
+            Service.objects.bulk_update(batch, fields)
+            rebuilt += len(batch)
+    return rebuilt
@@ -0,0 +1,276 @@
+"""
+Full-text search over services.
+
+Every service has one document in an inverted index built from its title,
+description, category name and provider name. SQLite keeps the index in an
+FTS5 virtual table ranked with BM25; PostgreSQL keeps a weighted tsvector in
+a GIN-indexed side table ranked with ts_rank_cd (PostgreSQL has no BM25).
+Other databases fall back to unranked substring matching.
+
+The last search term is matched as a prefix so partially typed words work
+for type-ahead. Documents are refreshed set-based from the services,
+categories and users tables whenever one of them changes (see signals.py).
+"""
+import re
+
+from django.db import connection as default_connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'services_service_search'
+MAX_TERMS = 8
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """
+    Split a raw search string into lower-cased terms
+    """
+    return TERM_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+def _tables():
+    from users.models import User
+    from .models import Category, Service
+    return {
+        'search': SEARCH_TABLE,
+        'service': Service._meta.db_table,
+        'category': Category._meta.db_table,
+        'user': User._meta.db_table,
+    }
+
+
+class SQLiteSearchBackend:
+    """
+    FTS5 index keyed by service id (the FTS rowid)
+    """
+    # bm25() weights for the title, description, category and provider columns
+    column_weights = (4.0, 1.0, 2.0, 2.0)
+
+    def create_index(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "title, description, category, provider, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def reindex(self, cursor, where, params):
+        tables = _tables()
+        cursor.execute(
+            f"DELETE FROM {tables['search']} WHERE rowid IN "
+            f"(SELECT s.id FROM {tables['service']} s WHERE {where})",
+            params,
+        )
+        cursor.execute(
+            f"INSERT INTO {tables['search']} (rowid, title, description, category, provider) "
+            f"SELECT s.id, s.title, s.description, c.name, u.first_name || ' ' || u.last_name "
+            f"FROM {tables['service']} s "
+            f"JOIN {tables['category']} c ON c.id = s.category_id "
+            f"JOIN {tables['user']} u ON u.id = s.provider_id "
+            f"WHERE {where}",
+            params,
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def remove(self, cursor, service_ids):
+        placeholders = ', '.join(['%s'] * len(service_ids))
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', service_ids)
+
+    def match_expression(self, terms):
+        # Quote every term so FTS5 operators in user input are treated as text
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, queryset, terms):
+        match = self.match_expression(terms)
+        service_table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.column_weights)
+        # Join the FTS table so the MATCH drives the query and bm25() is
+        # computed once per hit; bm25() is lower-is-better, so negate it to
+        # rank descending like the other backends
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f'{SEARCH_TABLE} MATCH %s', f'{SEARCH_TABLE}.rowid = {service_table}.id'],
+            params=[match],
+        ).annotate(
+            search_rank=RawSQL(f'-bm25({SEARCH_TABLE}, {weights})', (), output_field=FloatField())
+        )
+
+
+class PostgresSearchBackend:
+    """
+    Weighted tsvector per service in a GIN-indexed side table
+    """
+    config = 'simple'
+
+    def create_index(self, cursor):
+        tables = _tables()
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            f"service_id bigint PRIMARY KEY REFERENCES {tables['service']} (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)'
+        )
+
+    def drop_index(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def reindex(self, cursor, where, params):
+        tables = _tables()
+        cursor.execute(
+            f"INSERT INTO {tables['search']} (service_id, document) "
+            f"SELECT s.id, "
+            f"setweight(to_tsvector('{self.config}', s.title), 'A') || "
+            f"setweight(to_tsvector('{self.config}', c.name), 'B') || "
+            f"setweight(to_tsvector('{self.config}', concat_ws(' ', u.first_name, u.last_name)), 'B') || "
+            f"setweight(to_tsvector('{self.config}', s.description), 'C') "
+            f"FROM {tables['service']} s "
+            f"JOIN {tables['category']} c ON c.id = s.category_id "
+            f"JOIN {tables['user']} u ON u.id = s.provider_id "
+            f"WHERE {where} "
+            f"ON CONFLICT (service_id) DO UPDATE SET document = EXCLUDED.document",
+            params,
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {SEARCH_TABLE}')
+
+    def remove(self, cursor, service_ids):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE service_id = ANY(%s)', (list(service_ids),))
+
+    def match_expression(self, terms):
+        return ' & '.join(terms) + ':*'
+
+    def search(self, queryset, terms):
+        match = self.match_expression(terms)
+        service_table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[
+                f"{SEARCH_TABLE}.document @@ to_tsquery('{self.config}', %s)",
+                f'{SEARCH_TABLE}.service_id = {service_table}.id',
+            ],
+            params=[match],
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank_cd({SEARCH_TABLE}.document, to_tsquery('{self.config}', %s))",
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+
+
+class FallbackSearchBackend:
+    """
+    Unranked substring matching for databases without a full-text index
+    """
+
+    def create_index(self, cursor):
+        pass
+
+    def drop_index(self, cursor):
+        pass
+
+    def reindex(self, cursor, where, params):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+    def remove(self, cursor, service_ids):
+        pass
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) |
+                Q(description__icontains=term) |
+                Q(category__name__icontains=term) |
+                Q(provider__first_name__icontains=term) |
+                Q(provider__last_name__icontains=term)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    """
+    Return the search backend for a database connection
+    """
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def search_services(queryset, query):
+    """
+    Filter a Service queryset to matches for ``query`` annotated with ``search_rank``
+
+    Higher ranks are better matches. Returns the queryset unchanged when the
+    query has no searchable terms.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+    return get_backend().search(queryset, terms)
+
+
+def index_services(service_ids):
+    """
+    Refresh the search documents of the given services
+    """
+    service_ids = list(service_ids)
+    with default_connection.cursor() as cursor:
+        backend = get_backend()
+        for start in range(0, len(service_ids), 500):
+            chunk = service_ids[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            backend.reindex(cursor, f's.id IN ({placeholders})', chunk)
+
+
+def index_category(category_id):
+    """
+    Refresh the search documents of every service in a category
+    """
+    with default_connection.cursor() as cursor:
+        get_backend().reindex(cursor, 's.category_id = %s', [category_id])
+
+
+def index_provider(provider_id):
+    """
+    Refresh the search documents of every service offered by a provider
+    """
+    with default_connection.cursor() as cursor:
+        get_backend().reindex(cursor, 's.provider_id = %s', [provider_id])
+
+
+def remove_services(service_ids):
+    """
+    Drop the search documents of deleted services
+    """
+    service_ids = list(service_ids)
+    if service_ids:
+        with default_connection.cursor() as cursor:
+            get_backend().remove(cursor, service_ids)
+
+
+def rebuild_index():
+    """
+    Rebuild the whole search index from the services table
+    """
+    with default_connection.cursor() as cursor:
+        backend = get_backend()
+        backend.clear(cursor)
+        backend.reindex(cursor, '1 = 1', [])
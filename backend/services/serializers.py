@@ -1,10 +1,13 @@
 from rest_framework import serializers
+from levi_backend.query_shaping import EagerLoadingMixin
 from .models import Category, Service, ServiceImage, Availability
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Category model
     """
+    select_related_fields = ('parent',)
+
     parent_name = serializers.CharField(source='parent.name', read_only=True, allow_null=True)
     
     class Meta:
@@ -15,6 +18,11 @@ class CategorySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate_parent(self, parent):
+        if parent and self.instance and self.instance.path and parent.path.startswith(self.instance.path):
+            raise serializers.ValidationError('A category cannot be moved under itself or its subcategories.')
+        return parent
+
 
 class ServiceImageSerializer(serializers.ModelSerializer):
     """
@@ -36,37 +44,44 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Service model
     """
+    select_related_fields = ('provider', 'category')
+    prefetch_related_fields = ('images', 'availability')
+    # distance is annotated by the ?near= filter
+    field_dependencies = {
+        'distance': (),
+        'rating_histogram': tuple(f'rating_{rating}_count' for rating in range(1, 6)),
+    }
+
     category_name = serializers.CharField(source='category.name', read_only=True)
     provider_name = serializers.CharField(source='provider.get_full_name', read_only=True)
     images = ServiceImageSerializer(many=True, read_only=True)
     availability = AvailabilitySerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
-    review_count = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    distance = serializers.SerializerMethodField()
     
     class Meta:
         model = Service
         fields = [
             'id', 'provider', 'provider_name', 'category', 'category_name',
             'title', 'description', 'price', 'duration', 'location_type',
-            'service_area', 'is_available', 'is_featured', 'images',
-            'availability', 'average_rating', 'review_count', 'created_at', 'updated_at'
+            'service_area', 'latitude', 'longitude', 'distance', 'is_available', 'is_featured',
+            'images', 'availability', 'average_rating', 'review_count', 'rating_histogram',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'provider_name', 'category_name', 'distance', 'images', 'availability',
+            'average_rating', 'review_count', 'rating_histogram', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'provider_name', 'category_name', 'images', 'availability', 'average_rating', 'review_count', 'created_at', 'updated_at']
-    
-    def get_average_rating(self, obj):
-        """
-        Get the average rating for this service
-        """
-        # This will be implemented when we add reviews
-        return 0
     
-    def get_review_count(self, obj):
+    def get_distance(self, obj):
         """
-        Get the number of reviews for this service
+        Distance in km from the ?near= point, when the list was filtered by one
         """
-        # This will be implemented when we add reviews
-        return 0
\ No newline at end of file
+        distance = getattr(obj, 'distance', None)
+        return round(distance, 2) if distance is not None else None
\ No newline at end of file
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from levi_backend.conditional import touch
+from users.models import User
+from . import search
+from .category_tree import invalidate_category_tree
+from .models import Availability, Category, Service, ServiceImage
+
+SERVICE_SEARCH_FIELDS = {'title', 'description', 'category', 'category_id', 'provider', 'provider_id'}
+PROVIDER_SEARCH_FIELDS = {'first_name', 'last_name'}
+
+
+def touches(update_fields, fields):
+    # A save restricted to update_fields only matters if it writes an indexed field
+    return update_fields is None or bool(set(update_fields) & fields)
+
+
+@receiver(post_save, sender=Service)
+def index_service(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and touches(update_fields, SERVICE_SEARCH_FIELDS):
+        search.index_services([instance.pk])
+
+
+@receiver(post_delete, sender=Service)
+def unindex_service(sender, instance, **kwargs):
+    search.remove_services([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_services(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if not raw and not created and touches(update_fields, {'name'}):
+        search.index_category(instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def promote_orphaned_subcategories(sender, instance, **kwargs):
+    # Deleting a category sets its children's parent to NULL; make them roots
+    if instance.path:
+        Category.move_subtree(instance.path, '/')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_cached_category_tree(sender, **kwargs):
+    # After commit, so a concurrent read can't cache the tree from before the change
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=User)
+def index_provider_services(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if not raw and not created and touches(update_fields, PROVIDER_SEARCH_FIELDS):
+        search.index_provider(instance.pk)
+
+
+@receiver(post_save, sender=ServiceImage)
+@receiver(post_delete, sender=ServiceImage)
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def touch_service(sender, instance, **kwargs):
+    # Images and availability are nested in the service, so its ETag has to change
+    touch(Service, instance.service_id)
@@ -1,3 +1,320 @@
+import io
+import json
+import os
+import tempfile
+from datetime import time
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import Count, F, Q
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bookings.models import Booking, BookingChangeLog
+
+from levi_backend.testing import QueryCountAssertionsMixin
+from notifications.models import UserNotificationPreference
+from reviews.models import Review, ReviewHelpfulVote
+from users.models import User
+from .models import Category, Service, ServiceImage, Availability
+
+
+class ServiceQueryCountTests(QueryCountAssertionsMixin, APITestCase):
+    """
+    Query budgets for the services endpoints
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='pass')
+        self.client.force_authenticate(self.user)
+        self.parent = Category.objects.create(name='Home Repair')
+        self.providers = 0
+
+    def create_services(self, count):
+        for _ in range(count):
+            self.providers += 1
+            provider = User.objects.create_user(
+                username=f'provider{self.providers}',
+                email=f'provider{self.providers}@example.com',
+                password='pass',
+                is_provider=True,
+            )
+            category = Category.objects.create(name=f'Category {self.providers}', parent=self.parent)
+            service = Service.objects.create(
+                provider=provider, category=category, title='Service', description='Description',
+                price='50.00', duration=60,
+            )
+            ServiceImage.objects.create(service=service, image='service_images/example.jpg')
+            Availability.objects.create(service=service, day_of_week=0, start_time=time(9), end_time=time(17))
+
+    def test_service_list_queries_do_not_scale(self):
+        self.assertQueriesDoNotScale(reverse('service-list'), self.create_services)
+
+    def test_category_list_queries_do_not_scale(self):
+        self.assertQueriesDoNotScale(reverse('category-list'), self.create_services)
+
+
+class CategoryTreeTests(APITestCase):
+    """
+    The cached category tree and its ETag revalidation
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(
+            User.objects.create_user(username='client', email='client@example.com', password='pass')
+        )
+        self.home = Category.objects.create(name='Home Repair', icon='home')
+        self.plumbing = Category.objects.create(name='Plumbing', parent=self.home)
+        Category.objects.create(name='Retired', is_active=False)
+
+    def test_tree_is_nested_and_served_from_cache(self):
+        response = self.client.get(reverse('category-tree'))
+        self.assertEqual(response.status_code, 200)
+        tree = response.json()['categories']
+        self.assertEqual([node['name'] for node in tree], ['Home Repair'])
+        self.assertEqual(tree[0]['icon'], 'home')
+        self.assertEqual([node['name'] for node in tree[0]['children']], ['Plumbing'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('category-tree')).content, response.content)
+
+    def test_if_none_match_returns_304_until_a_category_changes(self):
+        etag = self.client.get(reverse('category-tree'))['ETag']
+        response = self.client.get(reverse('category-tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plumbing.icon = 'wrench'
+            self.plumbing.save()
+        response = self.client.get(reverse('category-tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['categories'][0]['children'][0]['icon'], 'wrench')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plumbing.delete()
+        self.assertEqual(self.client.get(reverse('category-tree')).json()['categories'][0]['children'], [])
+
+
+class CategoryHierarchyTests(APITestCase):
+    """
+    Materialized category paths and subtree filtering of services
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.client.force_authenticate(self.provider)
+        self.home = Category.objects.create(name='Home Repair')
+        self.plumbing = Category.objects.create(name='Plumbing', parent=self.home)
+        self.drains = Category.objects.create(name='Drains', parent=self.plumbing)
+        self.cleaning = Category.objects.create(name='Cleaning')
+        for category in (self.home, self.plumbing, self.drains, self.cleaning):
+            Service.objects.create(
+                provider=self.provider, category=category, title=f'{category.name} service',
+                description='Description', price='50.00', duration=60,
+            )
+
+    def paths(self):
+        return dict(Category.objects.values_list('name', 'path'))
+
+    def list_titles(self, **params):
+        response = self.client.get(reverse('service-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(service['title'] for service in response.json()['results'])
+
+    def test_paths_follow_moves_and_deletes(self):
+        self.assertEqual(self.paths()['Drains'], f'/{self.home.pk}/{self.plumbing.pk}/{self.drains.pk}/')
+
+        self.plumbing.parent = self.cleaning
+        self.plumbing.save()
+        self.assertEqual(self.paths()['Drains'], f'/{self.cleaning.pk}/{self.plumbing.pk}/{self.drains.pk}/')
+
+        self.cleaning.delete()
+        self.assertEqual(self.paths()['Plumbing'], f'/{self.plumbing.pk}/')
+        self.assertEqual(self.paths()['Drains'], f'/{self.plumbing.pk}/{self.drains.pk}/')
+
+    def test_category_cannot_move_under_its_subtree(self):
+        url = reverse('category-detail', kwargs={'pk': self.home.pk})
+        response = self.client.patch(url, {'parent': self.drains.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.json())
+
+    def test_filter_by_category_subtree(self):
+        self.assertEqual(self.list_titles(category=self.plumbing.pk), ['Plumbing service'])
+        self.assertEqual(
+            self.list_titles(category=self.home.pk, include_descendants=1),
+            ['Drains service', 'Home Repair service', 'Plumbing service'],
+        )
+        self.assertEqual(self.list_titles(category=0, include_descendants=1), [])
+        self.assertEqual(self.client.get(reverse('service-list'), {'category': 'x'}).status_code, 400)
+
+
+class ServicePaginationTests(APITestCase):
+    """
+    Cursor pagination on the service list
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.client.force_authenticate(self.provider)
+        self.category = Category.objects.create(name='Plumbing')
+
+    def create_service(self, title):
+        return Service.objects.create(
+            provider=self.provider, category=self.category, title=title, description='Description',
+            price='50.00', duration=60,
+        )
+
+    def test_cursor_is_stable_under_inserts(self):
+        for index in range(5):
+            self.create_service(f'Service {index}')
+
+        first_page = self.client.get(reverse('service-list'), {'page_size': 2}).json()
+        self.assertEqual([service['title'] for service in first_page['results']], ['Service 4', 'Service 3'])
+
+        # Rows inserted ahead of the cursor must not shift the next page
+        self.create_service('Service 5')
+        second_page = self.client.get(first_page['next']).json()
+        self.assertEqual([service['title'] for service in second_page['results']], ['Service 2', 'Service 1'])
+
+
+class ServiceSearchTests(APITestCase):
+    """
+    Ranked full-text search on the service list
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(
+            username='provider', email='provider@example.com', password='pass',
+            first_name='Kofi', last_name='Mensah',
+        )
+        self.client.force_authenticate(self.provider)
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.cleaning = Category.objects.create(name='Cleaning')
+
+    def create_service(self, title, description, category):
+        return Service.objects.create(
+            provider=self.provider, category=category, title=title, description=description,
+            price='50.00', duration=60,
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('service-list'), {'search': query, **params})
+        return [service['title'] for service in response.json()['results']]
+
+    def test_ranks_title_matches_first_and_matches_prefixes(self):
+        self.create_service('Deep Cleaning', 'Also fixes a leaking pipe now and then', self.cleaning)
+        self.create_service('Emergency Pipe Repair', 'Burst pipes fixed fast', self.plumbing)
+        self.create_service('Window Washing', 'Streak free windows', self.cleaning)
+
+        self.assertEqual(self.search('pipe'), ['Emergency Pipe Repair', 'Deep Cleaning'])
+        self.assertEqual(self.search('emerg'), ['Emergency Pipe Repair'])
+        self.assertEqual(self.search('plumb'), ['Emergency Pipe Repair'])
+        self.assertEqual(self.search('mensah wind'), ['Window Washing'])
+
+    def test_index_follows_updates(self):
+        service = self.create_service('Lawn Mowing', 'Weekly mowing', self.cleaning)
+        service.title = 'Hedge Trimming'
+        service.save()
+        self.assertEqual(self.search('lawn'), [])
+        self.assertEqual(self.search('hedge'), ['Hedge Trimming'])
+
+        self.plumbing.name = 'Gardening'
+        self.plumbing.save()
+        self.cleaning.name = 'Gardening Extras'
+        self.cleaning.save()
+        self.assertEqual(self.search('extras'), ['Hedge Trimming'])
+
+        service.delete()
+        self.assertEqual(self.search('hedge'), [])
+
+    def test_explicit_ordering_overrides_relevance(self):
+        self.create_service('Pipe Repair', 'pipe pipe pipe', self.plumbing)
+        cheap = self.create_service('Budget Pipes', 'pipe', self.plumbing)
+        cheap.price = '10.00'
+        cheap.save()
+        self.assertEqual(self.search('pipe', ordering='price'), ['Budget Pipes', 'Pipe Repair'])
+
+
+class ServiceDistanceTests(APITestCase):
+    """
+    Radius filtering and distance ordering on the service list
+    """
+
+    def setUp(self):
+        self.provider = User.objects.create_user(username='provider', email='provider@example.com', password='pass')
+        self.client.force_authenticate(self.provider)
+        self.category = Category.objects.create(name='Plumbing')
+
+    def create_service(self, title, latitude, longitude, location_type='in_person'):
+        return Service.objects.create(
+            provider=self.provider, category=self.category, title=title, description='Description',
+            price='50.00', duration=60, location_type=location_type, latitude=latitude, longitude=longitude,
+        )
+
+    def test_near_filters_by_radius_and_orders_by_distance(self):
+        # Around San Francisco
+        self.create_service('Oakland', 37.8044, -122.2712)
+        self.create_service('Mission', 37.7599, -122.4148)
+        self.create_service('San Jose', 37.3382, -121.8863)
+        self.create_service('Online only', 37.7749, -122.4194, location_type='online')
+
+        response = self.client.get(reverse('service-list'), {'near': '37.7749,-122.4194', 'radius': 20})
+        results = response.json()['results']
+        self.assertEqual([service['title'] for service in results], ['Mission', 'Oakland'])
+        self.assertLess(results[0]['distance'], results[1]['distance'])
+        self.assertAlmostEqual(results[1]['distance'], 13.4, delta=0.5)
+
+    def test_invalid_point_is_rejected(self):
+        for near in ('somewhere', '91,0', '-90.5,10', '45,180.1', '45,-181', 'nan,0', '45,inf'):
+            response = self.client.get(reverse('service-list'), {'near': near})
+            self.assertEqual(response.status_code, 400, near)
+        self.assertEqual(self.client.get(reverse('service-list'), {'near': '90,-180'}).status_code, 200)
+
+
+class LoadDataBenchmarkTests(TestCase):
+    """
+    Smoke test of the load data generator and the API benchmark harness
+    """
+
+    def test_generate_and_benchmark(self):
+        call_command(
+            'generate_load_data', users=20, providers=4, services=8, bookings=60, reviews=10, payments=10,
+            notifications=30, batch_size=16, stdout=io.StringIO(),
+        )
+        self.assertEqual(Booking.objects.count(), 60)
+        self.assertEqual(Review.objects.count(), 10)
+        self.assertTrue(Service.objects.filter(rating_count__gt=0).exists())
+        for model in (BookingChangeLog, ReviewHelpfulVote, UserNotificationPreference, ServiceImage):
+            self.assertTrue(model.objects.exists(), model.__name__)
+        # Generated votes arrive through bulk_create, so the counts are set alongside them
+        self.assertFalse(Review.objects.annotate(
+            counted=Count('helpful_votes', filter=Q(helpful_votes__is_helpful=True)),
+        ).exclude(helpful_count=F('counted')).exists())
+
+        users = User.objects.count()
+        stdout = io.StringIO()
+        call_command('benchmark_api', requests=1, warmup=0, endpoint=['users.list'], stdout=stdout)
+        # Without a staff user the admin endpoints are skipped rather than a user created
+        self.assertIn("users.list                   skipped, no 'admin' in the database", stdout.getvalue())
+        self.assertEqual(User.objects.count(), users)
+        with self.assertRaisesMessage(CommandError, 'No staff user named "nobody"'):
+            call_command('benchmark_api', requests=1, warmup=0, as_user='nobody', stdout=io.StringIO())
+
+        User.objects.create_user(username='ops', email='ops@example.com', password='pass', is_staff=True)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'baseline.json')
+            call_command('benchmark_api', requests=2, warmup=0, output=output, as_user='ops', stdout=io.StringIO())
+            with open(output) as handle:
+                report = json.load(handle)
+            call_command('benchmark_api', requests=2, warmup=0, compare=output, threshold=1000,
+                         fail_on_regression=True, stdout=io.StringIO())
 
-# Create your tests here.
+        self.assertEqual(report['rows']['Booking'], 60)
+        self.assertIn('users.list', report['endpoints'])
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['status'], 200, (name, result))
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
@@ -1,8 +1,16 @@
+from django.http import HttpResponse
+from django.utils.http import parse_etags
 from rest_framework import generics, permissions
+from rest_framework.views import APIView
+from levi_backend.conditional import ConditionalRequestMixin
+from levi_backend.query_shaping import EagerLoadingViewMixin
+from users.models import UserProfile
+from .category_tree import get_category_tree
+from .filters import ServiceCategoryFilter, ServiceDistanceFilter, ServiceOrderingFilter, ServiceSearchFilter
 from .models import Category, Service, ServiceImage, Availability
 from .serializers import CategorySerializer, ServiceSerializer, ServiceImageSerializer, AvailabilitySerializer
 
-class CategoryListView(generics.ListCreateAPIView):
+class CategoryListView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     """
     View for listing all categories or creating a new category
     """
@@ -10,7 +18,28 @@ class CategoryListView(generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CategoryTreeView(APIView):
+    """
+    View for the whole active category tree, served from cache
+
+    Honours If-None-Match, so clients that already have the current tree
+    get an empty 304.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        tree = get_category_tree()
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if tree['etag'] in etags or '*' in etags:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(tree['body'], content_type='application/json')
+        response['ETag'] = tree['etag']
+        # Cacheable by the client, but revalidated on every use
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class CategoryDetailView(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View for retrieving, updating or deleting a specific category
     """
@@ -18,27 +47,39 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class ServiceListView(generics.ListCreateAPIView):
+class ServiceListView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     """
     View for listing all services or creating a new service
+
+    Supports ?search= (ranked full-text), ?near=lat,lng&radius=km,
+    ?category=id&include_descendants=1 and
+    ?ordering=price|rating|created_at|distance.
     """
     queryset = Service.objects.filter(is_available=True)
     serializer_class = ServiceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [ServiceCategoryFilter, ServiceSearchFilter, ServiceDistanceFilter, ServiceOrderingFilter]
     
     def perform_create(self, serializer):
         # Set the provider to the current user when creating a service
-        serializer.save(provider=self.request.user)
+        extra = {}
+        if serializer.validated_data.get('latitude') is None:
+            # Default in-person services to the provider's own coordinates
+            profile = UserProfile.objects.filter(user=self.request.user).values('latitude', 'longitude').first()
+            if profile and profile['latitude'] is not None:
+                extra = profile
+        serializer.save(provider=self.request.user, **extra)
 
-class ServiceDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ServiceDetailView(ConditionalRequestMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     View for retrieving, updating or deleting a specific service
     """
     queryset = Service.objects.all()
+    validator_fields = ('updated_at', 'provider__updated_at', 'category__updated_at')
     serializer_class = ServiceSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class ProviderServiceListView(generics.ListAPIView):
+class ProviderServiceListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     View for listing all services by a specific provider
     """
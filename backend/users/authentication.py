@@ -0,0 +1,76 @@
+"""
+Bearer token authentication backed by a cached principal.
+
+Tokens are verified in memory (see ``users.tokens``) and the user they name
+is read from a short-lived cache entry that is dropped whenever the user is
+saved or deleted, so an authenticated request normally runs no auth queries.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import authentication, exceptions
+
+from . import tokens
+from .models import User
+
+# Seconds a principal stays cached; bounds staleness on per-process caches
+PRINCIPAL_CACHE_TTL = getattr(settings, 'AUTH_PRINCIPAL_CACHE_TTL', 60)
+
+
+def principal_cache_key(user_id):
+    return f'users:principal:{user_id}'
+
+
+def get_principal(user_id):
+    """
+    Return the user with user_id from the principal cache, or None
+    """
+    key = principal_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, PRINCIPAL_CACHE_TTL)
+    return user
+
+
+def invalidate_principal(user_id):
+    cache.delete(principal_cache_key(user_id))
+
+
+def user_for_token(token, token_type):
+    """
+    Return the active user a token of token_type was issued to
+
+    Raises InvalidToken for bad tokens, unknown or inactive users and tokens
+    issued before the user's last password change.
+    """
+    claims = tokens.verify(token, token_type)
+    user = get_principal(claims.get('sub'))
+    if user is None or not user.is_active:
+        raise tokens.InvalidToken('User not found or inactive')
+    if claims.get('pwd') != tokens.password_fingerprint(user):
+        raise tokens.InvalidToken('Token has been revoked')
+    return user
+
+
+class BearerTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticate ``Authorization: Bearer <access token>`` requests
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid Authorization header.')
+
+        try:
+            user = user_for_token(header[1].decode(), tokens.ACCESS)
+        except (tokens.InvalidToken, UnicodeDecodeError) as exc:
+            raise exceptions.AuthenticationFailed(str(exc))
+        return user, None
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,242 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.contrib.auth.hashers import identify_hasher
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from users.models import User, UserProfile
+from users.passwords import hash_passwords, setup_worker, worker_initargs
+
+USER_FIELDS = ('first_name', 'last_name', 'phone_number')
+PROFILE_FIELDS = ('bio', 'location', 'website')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+# Batches hashing ahead of the one being inserted
+PREFETCH_BATCHES = 2
+
+
+class Checkpoint:
+    """
+    Number of input records already imported, kept in a small JSON file
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self):
+        try:
+            with open(self.path) as handle:
+                state = json.load(handle)
+        except FileNotFoundError:
+            return 0
+        if state.get('source') != self.source:
+            raise CommandError(f'Checkpoint {self.path} belongs to {state.get("source")}')
+        return state['records']
+
+    def save(self, records):
+        # Write then rename so a crash never leaves a torn checkpoint
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({'source': self.source, 'records': records}, handle)
+        os.replace(temporary, self.path)
+
+
+class Command(BaseCommand):
+    help = 'Import users and their profiles from a CSV or JSONL file in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or JSONL with one user object per line')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing passwords (0 hashes inline)')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <path>.checkpoint)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and start from the first record')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint = Checkpoint(options['checkpoint'] or f'{path}.checkpoint', path)
+        start = 0 if options['restart'] else checkpoint.load()
+        if start:
+            self.stdout.write(f'Resuming after record {start}')
+
+        # Emails and usernames are unique; everything already taken is known up front
+        self.emails = {email.lower() for email in User.objects.values_list('email', flat=True).iterator()}
+        self.usernames = set(User.objects.values_list('username', flat=True).iterator())
+        self.stats = {'read': 0, 'created': 0, 'duplicate': 0, 'invalid': 0}
+        self.started = time.perf_counter()
+
+        pool = None
+        if options['workers']:
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'], initializer=setup_worker, initargs=worker_initargs()
+            )
+        try:
+            # Keep the next batches hashing on every worker while the oldest one is inserted
+            pending = deque()
+            for position, batch in self.batches(path, input_format, start, options['batch_size']):
+                rows = self.prepare(batch)
+                raw_passwords = [password for _, _, password in rows]
+                pending.append((position, rows, self.hash(pool, raw_passwords, options['workers'])))
+                if len(pending) > PREFETCH_BATCHES:
+                    self.insert(*pending.popleft(), checkpoint)
+            while pending:
+                self.insert(*pending.popleft(), checkpoint)
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.stats["created"]} users from {self.stats["read"]} records in {elapsed:.1f}s '
+            f'({self.stats["read"] / max(elapsed, 1e-9):.0f} rows/s); '
+            f'skipped {self.stats["duplicate"]} duplicates and {self.stats["invalid"]} invalid records'
+        ))
+
+    def records(self, path, input_format):
+        """
+        Stream the input file as dicts, yielding None for unparseable lines
+        """
+        with open(path, newline='', encoding='utf-8') as handle:
+            if input_format == 'csv':
+                yield from csv.DictReader(handle)
+                return
+            for line in handle:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield record if isinstance(record, dict) else None
+
+    def batches(self, path, input_format, start, batch_size):
+        """
+        Yield (records consumed so far, batch) after skipping the first start records
+        """
+        batch = []
+        for position, record in enumerate(self.records(path, input_format), 1):
+            if position <= start:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield position, batch
+                batch = []
+        if batch:
+            yield position, batch
+
+    def prepare(self, batch):
+        """
+        Validate and dedupe a batch into (user, profile, raw password) tuples
+        """
+        rows = []
+        for record in batch:
+            self.stats['read'] += 1
+            try:
+                row = self.build(record or {})
+            except (ValidationError, ValueError):
+                self.stats['invalid'] += 1
+                continue
+            if row is None:
+                self.stats['duplicate'] += 1
+                continue
+            rows.append(row)
+        return rows
+
+    def build(self, record):
+        email = User.objects.normalize_email(str(record.get('email') or '').strip())
+        validate_email(email)
+        if email.lower() in self.emails:
+            return None
+
+        password = record.get('password') or None
+        password_hash = record.get('password_hash') or None
+        if password_hash:
+            # Already hashed by the partner; the hasher must be one we support
+            identify_hasher(password_hash)
+
+        latitude = self.coordinate(record.get('latitude'), 90)
+        longitude = self.coordinate(record.get('longitude'), 180)
+        date_of_birth = parse_date(str(record.get('date_of_birth') or '')) or None
+
+        user = User(
+            email=email,
+            username=self.unique_username(str(record.get('username') or email.split('@')[0])),
+            is_provider=str(record.get('is_provider', '')).strip().lower() in TRUE_VALUES,
+            date_of_birth=date_of_birth,
+            password=password_hash or '',
+            **{field: str(record.get(field) or '')[:User._meta.get_field(field).max_length] for field in USER_FIELDS},
+        )
+        profile = UserProfile(
+            latitude=latitude,
+            longitude=longitude,
+            **{field: str(record.get(field) or '') for field in PROFILE_FIELDS},
+        )
+        self.emails.add(email.lower())
+        return user, profile, None if password_hash else password
+
+    def unique_username(self, username):
+        username = username.strip()[:140] or 'user'
+        candidate, suffix = username, 1
+        while candidate in self.usernames:
+            suffix += 1
+            candidate = f'{username}_{suffix}'
+        self.usernames.add(candidate)
+        return candidate
+
+    @staticmethod
+    def coordinate(value, limit):
+        if value in (None, ''):
+            return None
+        value = float(value)
+        if not -limit <= value <= limit:
+            raise ValueError('Coordinate out of range')
+        return value
+
+    @staticmethod
+    def hash(pool, passwords, workers):
+        """
+        Hash a batch inline, or start it as one pool task per worker, returning hashes or futures
+        """
+        if pool is None:
+            return hash_passwords(passwords)
+        size = -(-len(passwords) // workers) or 1
+        return [pool.submit(hash_passwords, passwords[index:index + size]) for index in range(0, len(passwords), size)]
+
+    def insert(self, position, rows, hashed, checkpoint):
+        """
+        Insert a prepared batch, then record it in the checkpoint
+        """
+        if hashed and isinstance(hashed[0], Future):
+            # Chunk results, joined back in submission order
+            hashed = [encoded for future in hashed for encoded in future.result()]
+        with transaction.atomic():
+            users = []
+            for (user, _, _), encoded in zip(rows, hashed):
+                if not user.password:
+                    user.password = encoded
+                users.append(user)
+            User.objects.bulk_create(users)
+            profiles = []
+            for user, (_, profile, _) in zip(users, rows):
+                profile.user = user
+                profiles.append(profile)
+            UserProfile.objects.bulk_create(profiles)
+        checkpoint.save(position)
+
+        self.stats['created'] += len(users)
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f'{self.stats["read"]} records, {self.stats["created"]} created '
+            f'({self.stats["read"] / max(elapsed, 1e-9):.0f} rows/s)'
+        )
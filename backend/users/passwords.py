@@ -0,0 +1,146 @@
+"""
+Password verification off the request threads.
+
+Checking a password means running a deliberately slow hasher (PBKDF2 by
+default). Login requests hand that work to a small process pool, so a burst
+of login attempts saturates at most LOGIN_HASH_WORKERS cores and leaves the
+web workers' CPU and GIL free for other requests. At most
+LOGIN_HASH_QUEUE_DEPTH checks may wait for a pool slot; beyond that logins
+are refused straight away with LoginBusy instead of piling up.
+
+If a pool process dies the pool is replaced and the check retried once;
+should the new pool break as well, the check runs inline.
+
+Setting LOGIN_HASH_WORKERS to 0 verifies inline, e.g. for tests.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.utils.crypto import get_random_string
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+_dummy_hash = None
+
+
+class LoginBusy(Exception):
+    """
+    Raised when too many password checks are already queued
+    """
+
+
+def setup_worker(settings_module):
+    """
+    Process pool initializer; pool processes may be spawned rather than forked
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def worker_initargs():
+    return (os.environ.get('DJANGO_SETTINGS_MODULE', 'levi_backend.settings'),)
+
+
+def _verify(password, encoded):
+    return check_password(password, encoded)
+
+
+def hash_passwords(passwords):
+    """
+    Hash a list of raw passwords (None for an unusable password), in a pool worker
+    """
+    return [make_password(password) for password in passwords]
+
+
+def _get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            workers = settings.LOGIN_HASH_WORKERS
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=setup_worker,
+                initargs=worker_initargs(),
+            )
+            _slots = threading.BoundedSemaphore(workers + settings.LOGIN_HASH_QUEUE_DEPTH)
+        return _pool, _slots
+
+
+def _discard_pool(pool):
+    """
+    Drop a broken pool so the next check starts a new one
+    """
+    global _pool, _slots
+    with _pool_lock:
+        # Another thread may already have replaced it
+        if _pool is pool:
+            _pool, _slots = None, None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def verify_password(password, encoded):
+    """
+    Check password against an encoded hash, in the pool when one is configured
+
+    Raises LoginBusy when the pool's queue is full.
+    """
+    if not settings.LOGIN_HASH_WORKERS:
+        return _verify(password, encoded)
+
+    for _ in range(2):
+        pool, slots = _get_pool()
+        if not slots.acquire(blocking=False):
+            raise LoginBusy('Too many login attempts in progress')
+        try:
+            future = pool.submit(_verify, password, encoded)
+        except BrokenProcessPool:
+            slots.release()
+            _discard_pool(pool)
+            continue
+        except Exception:
+            slots.release()
+            raise
+        # Hold the slot until the check finishes, even if this request gives up
+        future.add_done_callback(lambda _, slots=slots: slots.release())
+        try:
+            return future.result(timeout=settings.LOGIN_HASH_TIMEOUT)
+        except FutureTimeout:
+            raise LoginBusy('Timed out waiting for a password check')
+        except BrokenProcessPool:
+            _discard_pool(pool)
+    logger.warning('Password check pool keeps breaking; verifying inline')
+    return _verify(password, encoded)
+
+
+def authenticate_credentials(email, password):
+    """
+    Return the active user with email and password, or None
+
+    Unknown emails are still checked against a dummy hash so response times
+    do not reveal which accounts exist.
+    """
+    global _dummy_hash
+    user = User.objects.filter(email=email).first()
+    if user is None:
+        if _dummy_hash is None:
+            _dummy_hash = make_password(get_random_string(32))
+        verify_password(password, _dummy_hash)
+        return None
+    if not verify_password(password, user.password) or not user.is_active:
+        return None
+    if identify_hasher(user.password).must_update(user.password):
+        # Hasher settings changed since this hash was made; upgrade it
+        user.set_password(password)
+        user.save(update_fields=['password'])
+    return user
@@ -24,7 +24,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = [
-            'id', 'user', 'bio', 'location', 'website',
+            'id', 'user', 'bio', 'location', 'latitude', 'longitude', 'website',
             'social_media_links', 'preferred_categories', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
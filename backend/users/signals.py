@@ -0,0 +1,19 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from levi_backend.conditional import touch
+from .authentication import invalidate_principal
+from .models import User, UserProfile
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_principal(sender, instance, **kwargs):
+    # Drop the cached user so permission or password changes apply at once
+    invalidate_principal(instance.pk)
+
+
+@receiver(m2m_changed, sender=UserProfile.preferred_categories.through)
+def touch_profile_on_categories_change(sender, instance, action, reverse, **kwargs):
+    # The categories are part of the profile, so its ETag has to change
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        touch(UserProfile, instance.pk)
@@ -1,3 +1,209 @@
+import io
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from . import passwords, tokens
+from .management.commands.import_users import Command as ImportCommand
+from .models import User
+
+
+class TokenAuthenticationTests(APITestCase):
+    """
+    Signed bearer tokens and the cached principal behind them
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret-pass')
+
+    def login(self, password='secret-pass'):
+        return self.client.post(reverse('user-login'), {'email': 'client@example.com', 'password': password})
+
+    def test_login_issues_tokens(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['email'], 'client@example.com')
+        self.assertEqual(tokens.verify(response.data['token'], tokens.ACCESS)['sub'], self.user.pk)
+        self.assertEqual(tokens.verify(response.data['refresh'], tokens.REFRESH)['sub'], self.user.pk)
+
+    def test_registration_issues_tokens(self):
+        response = self.client.post(reverse('user-register'), {
+            'username': 'new', 'email': 'new@example.com', 'password': 'secret-pass',
+            'confirm_password': 'secret-pass',
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["token"]}')
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 200)
+
+    def test_authenticated_reads_run_no_auth_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.login().data["token"]}')
+        self.client.get(reverse('user-profile'))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('user-profile'))
+        self.assertEqual(response.status_code, 200)
+        auth_queries = [
+            query['sql'] for query in context.captured_queries
+            if '"users_user"' in query['sql'] or '"django_session"' in query['sql']
+        ]
+        self.assertEqual(auth_queries, [])
+
+    def test_rejects_tampered_and_wrong_type_tokens(self):
+        data = self.login().data
+        payload, signature = data['token'].split('.')
+        for token in (f'{payload}.{signature[::-1]}', data['refresh'], 'garbage'):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+    def test_expired_token_is_rejected(self):
+        token = tokens.issue(self.user, tokens.ACCESS, ttl=-1)
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.verify(token, tokens.ACCESS)
+
+    def test_password_change_revokes_tokens(self):
+        data = self.login().data
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {data["token"]}')
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 200)
+
+        self.user.set_password('new-secret-pass')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+        response = self.client.post(reverse('token-refresh'), {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_issues_a_new_pair(self):
+        refresh = self.login().data['refresh']
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(tokens.verify(response.data['token'], tokens.ACCESS)['sub'], self.user.pk)
+
+
+class LoginThrottlingTests(APITestCase):
+    """
+    Login throttling and the bounded password check pool
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='client', email='client@example.com', password='secret-pass')
+
+    def login(self, email='client@example.com', password='wrong-pass'):
+        return self.client.post(reverse('user-login'), {'email': email, 'password': password})
+
+    def test_login_runs_in_the_pool(self):
+        self.assertEqual(self.login(password='secret-pass').status_code, 200)
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login(email='nobody@example.com').status_code, 401)
+
+    def test_attempts_are_throttled_per_email(self):
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, 401)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Other accounts from the same address are still allowed
+        self.assertEqual(self.login(email='other@example.com').status_code, 401)
+
+    def test_full_queue_refuses_logins(self):
+        pool, slots = passwords._get_pool()
+        held = 0
+        while slots.acquire(blocking=False):
+            held += 1
+        try:
+            response = self.login(password='secret-pass')
+        finally:
+            for _ in range(held):
+                slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.login(password='secret-pass').status_code, 200)
+
+    def test_a_crashed_worker_is_replaced(self):
+        self.assertEqual(self.login(password='secret-pass').status_code, 200)
+        pool, _ = passwords._get_pool()
+        for process in list(pool._processes.values()):
+            process.kill()
+            process.join()
+        self.assertEqual(self.login(password='secret-pass').status_code, 200)
+        self.assertIsNot(passwords._get_pool()[0], pool)
+
+    def test_checks_run_inline_when_the_pool_keeps_breaking(self):
+        with mock.patch.object(passwords, '_get_pool') as get_pool, self.assertLogs('users.passwords', 'WARNING'):
+            get_pool.return_value = (mock.Mock(submit=mock.Mock(side_effect=BrokenProcessPool)), threading.Semaphore())
+            self.assertTrue(passwords.verify_password('secret-pass', self.user.password))
+        self.assertEqual(get_pool.call_count, 2)
+
+
+class ImportUsersTests(TestCase):
+    """
+    The import_users management command
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        User.objects.create_user(username='taken', email='existing@example.com', password='pass')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        output = io.StringIO()
+        call_command('import_users', path, workers=0, stdout=output, **options)
+        return output.getvalue()
+
+    def test_csv_import_dedupes_and_creates_profiles(self):
+        path = self.write('users.csv', (
+            'email,username,password,first_name,is_provider,latitude,longitude\n'
+            'ama@example.com,taken,secret-1,Ama,yes,5.6,-0.2\n'
+            'EXISTING@example.com,,secret-2,,,,\n'
+            'kofi@example.com,,,Kofi,no,,\n'
+            'Kofi@example.com,,secret-3,,,,\n'
+            'not-an-email,,secret-4,,,,\n'
+        ))
+        output = self.run_import(path)
+        self.assertIn('Imported 2 users from 5 records', output)
+        self.assertIn('skipped 2 duplicates and 1 invalid records', output)
+
+        ama = User.objects.get(email='ama@example.com')
+        self.assertEqual(ama.username, 'taken_2')
+        self.assertTrue(ama.is_provider)
+        self.assertTrue(ama.check_password('secret-1'))
+        self.assertEqual((ama.profile.latitude, ama.profile.longitude), (5.6, -0.2))
+        self.assertFalse(User.objects.get(email='kofi@example.com').has_usable_password())
+
+    def test_jsonl_import_resumes_from_checkpoint(self):
+        lines = [json.dumps({'email': f'user{index}@example.com', 'password': 'secret'}) for index in range(5)]
+        path = self.write('users.jsonl', '\n'.join(lines[:3]) + '\n')
+        self.run_import(path, batch_size=2)
+
+        with open(path, 'a') as handle:
+            handle.write('\n'.join(lines[3:]) + '\n')
+        output = self.run_import(path, batch_size=2)
+        self.assertIn('Resuming after record 3', output)
+        self.assertIn('Imported 2 users from 2 records', output)
+        self.assertEqual(User.objects.filter(email__startswith='user').count(), 5)
 
-# Create your tests here.
+    def test_batches_are_split_across_every_worker(self):
+        with ThreadPoolExecutor(max_workers=3) as pool, mock.patch(
+            'users.management.commands.import_users.hash_passwords', side_effect=lambda chunk: [f'h:{p}' for p in chunk],
+        ):
+            futures = ImportCommand.hash(pool, [str(index) for index in range(7)], 3)
+            self.assertEqual([len(future.result()) for future in futures], [3, 3, 1])
+            self.assertEqual([encoded for future in futures for encoded in future.result()],
+                             [f'h:{index}' for index in range(7)])
@@ -0,0 +1,75 @@
+"""
+Token-bucket throttling for the login endpoint.
+
+Every login attempt takes one token from a bucket keyed by the submitted
+email and one from a bucket keyed by the client IP. Buckets refill
+continuously at their rate and hold at most one period's worth of tokens,
+so brief bursts are allowed while sustained guessing is not. Buckets live
+in the default cache, which is shared between processes when it is backed
+by memcached or Redis. Updates are read-modify-write, so two simultaneous
+attempts may occasionally share the last token.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+def parse_rate(rate):
+    """
+    Turn '5/min' into (capacity, seconds per full refill)
+    """
+    count, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(count), seconds
+
+
+class TokenBucket:
+    """
+    A token bucket whose state is stored in the cache under key
+    """
+
+    def __init__(self, key, rate):
+        self.key = key
+        self.capacity, self.period = parse_rate(rate)
+        self.refill_per_second = self.capacity / self.period
+
+    def take(self, now=None):
+        """
+        Take a token, returning 0 on success or the seconds until one is available
+        """
+        now = time.time() if now is None else now
+        tokens, updated = cache.get(self.key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+        if tokens < 1:
+            cache.set(self.key, (tokens, now), self.period)
+            return (1 - tokens) / self.refill_per_second
+        cache.set(self.key, (tokens - 1, now), self.period)
+        return 0
+
+
+class LoginRateThrottle(BaseThrottle):
+    """
+    Throttle login attempts per submitted email and per client IP
+
+    Rates come from the LOGIN_THROTTLE_RATES setting, e.g.
+    {'email': '5/min', 'ip': '30/min'}.
+    """
+
+    def buckets(self, request):
+        rates = settings.LOGIN_THROTTLE_RATES
+        buckets = [TokenBucket(f'throttle:login:ip:{self.get_ident(request)}', rates['ip'])]
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if email:
+            digest = hashlib.sha256(str(email).strip().lower().encode()).hexdigest()
+            buckets.append(TokenBucket(f'throttle:login:email:{digest}', rates['email']))
+        return buckets
+
+    def allow_request(self, request, view):
+        self.wait_seconds = max(bucket.take() for bucket in self.buckets(request))
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
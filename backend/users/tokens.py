@@ -0,0 +1,107 @@
+"""
+Signed access and refresh tokens.
+
+A token is ``<payload>.<signature>``: the payload is URL-safe base64 JSON
+and the signature an HMAC-SHA256 of it keyed from SECRET_KEY, so verifying
+a token is pure CPU work with no database or external service involved.
+
+Each token also carries a fingerprint of the user's password hash.
+Changing the password therefore revokes every outstanding token, and this
+is checked against the cached principal rather than the database.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.utils.crypto import salted_hmac
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+KEY_SALT = 'users.tokens'
+# Lifetimes in seconds, overridable from settings
+ACCESS_TOKEN_TTL = getattr(settings, 'AUTH_ACCESS_TOKEN_TTL', 15 * 60)
+REFRESH_TOKEN_TTL = getattr(settings, 'AUTH_REFRESH_TOKEN_TTL', 14 * 24 * 60 * 60)
+
+
+class InvalidToken(Exception):
+    """
+    Raised for a token that is malformed, forged, expired or of the wrong type
+    """
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _signature(payload):
+    key = salted_hmac(KEY_SALT, 'signing-key').digest()
+    return _b64encode(hmac.new(key, payload.encode(), hashlib.sha256).digest())
+
+
+def password_fingerprint(user):
+    """
+    Short digest of the user's password hash, changing whenever the password does
+    """
+    return salted_hmac(KEY_SALT, user.password).hexdigest()[:16]
+
+
+def issue(user, token_type, ttl=None, now=None):
+    """
+    Return a signed token of token_type for a user
+    """
+    if ttl is None:
+        ttl = ACCESS_TOKEN_TTL if token_type == ACCESS else REFRESH_TOKEN_TTL
+    now = int(now if now is not None else time.time())
+    claims = {
+        'sub': user.pk,
+        'typ': token_type,
+        'iat': now,
+        'exp': now + ttl,
+        'pwd': password_fingerprint(user),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{payload}.{_signature(payload)}'
+
+
+def issue_pair(user):
+    """
+    Return the access and refresh tokens handed out at login and registration
+    """
+    return {
+        'token': issue(user, ACCESS),
+        'refresh': issue(user, REFRESH),
+        'expires_in': ACCESS_TOKEN_TTL,
+    }
+
+
+def verify(token, token_type, now=None):
+    """
+    Return the claims of a valid token of token_type
+
+    Raises InvalidToken otherwise. Only the signature and expiry are checked
+    here; callers compare ``pwd`` with the user's current fingerprint.
+    """
+    try:
+        payload, signature = token.split('.')
+    except (AttributeError, ValueError):
+        raise InvalidToken('Malformed token')
+    if not hmac.compare_digest(signature.encode(), _signature(payload).encode()):
+        raise InvalidToken('Invalid token signature')
+    try:
+        claims = json.loads(_b64decode(payload))
+    except (binascii.Error, ValueError):
+        raise InvalidToken('Malformed token')
+    if not isinstance(claims, dict) or claims.get('typ') != token_type:
+        raise InvalidToken('Wrong token type')
+    if claims.get('exp', 0) <= (now if now is not None else time.time()):
+        raise InvalidToken('Token has expired')
+    return claims
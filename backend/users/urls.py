@@ -7,4 +7,5 @@ urlpatterns = [
     path('profile/', views.UserProfileDetailView.as_view(), name='user-profile'),
     path('register/', views.UserRegistrationView.as_view(), name='user-register'),
     path('login/', views.LoginView.as_view(), name='user-login'),
+    path('token/refresh/', views.TokenRefreshView.as_view(), name='token-refresh'),
 ]
\ No newline at end of file
@@ -1,15 +1,19 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth import authenticate
+from levi_backend.conditional import ConditionalRequestMixin
+from . import tokens
+from .authentication import user_for_token
 from .models import User, UserProfile
+from .passwords import LoginBusy, authenticate_credentials
 from .serializers import UserSerializer, UserProfileSerializer, UserRegistrationSerializer
+from .throttling import LoginRateThrottle
 
 class UserListView(generics.ListCreateAPIView):
     """
     View for listing all users or creating a new user
     """
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('-created_at')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
 
@@ -21,16 +25,25 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
 
-class UserProfileDetailView(generics.RetrieveUpdateAPIView):
+class UserProfileDetailView(ConditionalRequestMixin, generics.RetrieveUpdateAPIView):
     """
     View for retrieving or updating the current user's profile
     """
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+    def get_validator_queryset(self):
+        return UserProfile.objects.filter(user=self.request.user)
+
+    def get_loaded_timestamps(self):
+        # The nested user is the authenticated principal, no need to join it
+        return (self.request.user.updated_at,)
     
     def get_object(self):
         # Get or create profile for the current user
         profile, created = UserProfile.objects.get_or_create(user=self.request.user)
+        # Reuse the authenticated user instead of loading it again
+        profile.user = self.request.user
         return profile
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -40,12 +53,27 @@ class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.save()
+        
+        # Sign the new user in straight away
+        return Response(
+            {'user': UserSerializer(user).data, **tokens.issue_pair(user)},
+            status=status.HTTP_201_CREATED
+        )
 
 class LoginView(APIView):
     """
     View for user login
+
+    Attempts are throttled per email and per IP, and passwords are checked
+    in the login process pool (see users.passwords).
     """
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginRateThrottle]
     
     def post(self, request):
         email = request.data.get('email')
@@ -57,7 +85,14 @@ class LoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user = authenticate(email=email, password=password)
+        try:
+            user = authenticate_credentials(email, password)
+        except LoginBusy:
+            return Response(
+                {'error': 'Too many login attempts, please try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'}
+            )
         
         if not user:
             return Response(
@@ -65,7 +100,31 @@ class LoginView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        # Here you would typically generate a token or session
-        # For now, we'll just return user data
         serializer = UserSerializer(user)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response({'user': serializer.data, **tokens.issue_pair(user)})
+
+class TokenRefreshView(APIView):
+    """
+    View for exchanging a refresh token for a new access/refresh pair
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    
+    def post(self, request):
+        refresh = request.data.get('refresh')
+        
+        if not refresh:
+            return Response(
+                {'error': 'Please provide a refresh token'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            user = user_for_token(refresh, tokens.REFRESH)
+        except tokens.InvalidToken as exc:
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        
+        return Response(tokens.issue_pair(user))
\ No newline at end of file
@@ -25,7 +25,8 @@ const apiCall = async <T>(
     endpoint: string,
     options: RequestInit = {}
 ): Promise<T> => {
-    const url = `${API_BASE_URL}${endpoint}`;
+    // Pagination links come back as absolute URLs
+    const url = endpoint.startsWith('http') ? endpoint : `${API_BASE_URL}${endpoint}`;
     const config: RequestInit = {
         ...options,
         headers: {
@@ -51,6 +52,25 @@ const apiCall = async <T>(
     }
 };
 
+// List endpoints return cursor pages: { next, previous, results }
+interface Page<T> {
+    next: string | null;
+    previous: string | null;
+    results: T[];
+}
+
+// Helper that follows a list endpoint's next links and returns every item
+const apiList = async <T>(endpoint: string): Promise<T[]> => {
+    const items: T[] = [];
+    let next: string | null = endpoint;
+    while (next) {
+        const page: Page<T> = await apiCall<Page<T>>(next);
+        items.push(...page.results);
+        next = page.next;
+    }
+    return items;
+};
+
 // Authentication
 export const auth = {
     async login(email: string, password: string): Promise<{ user: any; token: string }> {
@@ -154,7 +174,9 @@ class ApiService {
             if (query) params.append('search', query);
             if (sortBy) params.append('ordering', sortBy === 'distance' ? 'id' : sortBy);
 
-            const services = await apiCall<any[]>(`/services/services/?${params.toString()}`);
+            params.append('page_size', '100');
+
+            const services = await apiList<any>(`/services/services/?${params.toString()}`);
             return services.map(service => transformServiceToProvider(service, null));
         } catch (error) {
             console.warn("API Error: fetching providers. Falling back to mock data.");
@@ -185,7 +207,9 @@ class ApiService {
             params.append('status', status);
         }
 
-        const bookings = await apiCall<any[]>(`/bookings/bookings/?${params.toString()}`);
+        params.append('page_size', '100');
+
+        const bookings = await apiList<any>(`/bookings/bookings/?${params.toString()}`);
         return bookings.map(transformBooking);
     }
 
@@ -401,7 +425,7 @@ class ApiService {
     // --- Categories ---
 
     async getCategories(): Promise<any[]> {
-        return apiCall<any[]>('/services/categories/');
+        return apiList<any>('/services/categories/?page_size=100');
     }
 
     // --- Share functionality ---